@@ -1,10 +1,11 @@
 from __future__ import annotations
 
+import itertools
 import os
 import re
 import sys
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional
 
 import streamlit as st
 from dotenv import load_dotenv
@@ -12,13 +13,12 @@ from dotenv import load_dotenv
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
-from rag.vectorstore import get_vectorstore
-from rag.qa_chain import answer_question as rag_answer_question
+from rag.warmup import BUILDING, FAILED, IDLE, LOADING, IndexWarmup, get_index_warmup
+from rag.qa_chain import RAGResult, answer_question_stream as rag_answer_question_stream
+from rag.metrics import get_metrics
 from rag.config import (
-    DEFAULT_MAX_DISTANCE,
     DEFAULT_TOP_K,
     NO_ANSWER,
-    DEFAULT_PDF_DIR
 )
 
 load_dotenv()
@@ -130,9 +130,9 @@ def render_user(content: str):
         unsafe_allow_html=True,
     )
 
-def render_assistant(content: str):
+def render_assistant(content: str, container=None):
     safe = (content or "").replace("\n", "<br>")
-    st.markdown(
+    (container or st).markdown(
         f"""
         <div class="assistant-plain">
           <div class="assistant-label">Assistant</div>
@@ -153,44 +153,38 @@ def render_empty_state():
         unsafe_allow_html=True,
     )
 
-def list_documents(pdf_dir: str) -> list[str]:
-    base = Path(pdf_dir)
-    return sorted([p.name for p in base.glob("*.pdf")]) if base.exists() else []
+def start_warmup(api_key: Optional[str]) -> IndexWarmup:
+    """
+    Starts loading (or building) the index on a background thread, once per process,
+    so the page renders immediately; a failed warm-up is only retried from the sidebar.
+    """
+    warmup = get_index_warmup()
+    if api_key and warmup.status().state == IDLE:
+        warmup.start()
+    return warmup
 
 
-def get_chunk_count(vectorstore) -> Optional[int]:
+def render_index_status(warmup: IndexWarmup):
     """
-    Returns the number of chunks stored in the FAISS docstore (if available).
-    Safe for missing/older FAISS formats.
+    Index readiness in the sidebar; polls every second until the index is ready,
+    then reruns the whole app so the chat picks up the vectorstore.
     """
-    if vectorstore is None:
-        return None
-    try:
-        store = getattr(vectorstore, "docstore", None)
-        if store is None:
-            return None
-        d = getattr(store, "_dict", None)
-        if isinstance(d, dict):
-            return len(d)
-        return None
-    except Exception:
-        return None
-
-
-def kb_stats(pdf_dir: str, vectorstore) -> Tuple[int, Optional[int]]:
-    num_docs = len(list_documents(pdf_dir))
-    num_chunks = get_chunk_count(vectorstore)
-    return num_docs, num_chunks
-
-
-@st.cache_resource(show_spinner=False)
-def cached_vectorstore():
-    return get_vectorstore(rebuild=False)
-
-def get_vs_if_ready(api_key: Optional[str]):
-    if not api_key:
-        return None
-    return cached_vectorstore()
+    status = warmup.status()
+    if status.ready:
+        if not st.session_state.index_ready:
+            st.session_state.index_ready = True
+            st.rerun()
+        st.caption(f"Index ready ({status.elapsed:.1f}s)")
+    elif status.state == LOADING:
+        st.info(f"Loading the index... {status.elapsed:.0f}s")
+    elif status.state == BUILDING:
+        text = f"Building the index: {status.files_done}/{status.files_total or '?'} PDFs, {status.chunks} chunks"
+        st.progress(status.progress or 0.0, text=text)
+    elif status.state == FAILED:
+        st.error(f"{status.message}. {status.error or ''}".strip())
+        if st.button("Retry", use_container_width=True):
+            warmup.start()
+            st.rerun()
 
 
 if "messages" not in st.session_state:
@@ -211,24 +205,52 @@ if "last_answer" not in st.session_state:
 if "memory_history" not in st.session_state:
     st.session_state.memory_history = []
 
+if "last_timings" not in st.session_state:
+    st.session_state.last_timings = None
+
+if "index_ready" not in st.session_state:
+    st.session_state.index_ready = False
+
 api_key = os.getenv("OPENAI_API_KEY")
-vectorstore = get_vs_if_ready(api_key)
+warmup = start_warmup(api_key)
+vectorstore = warmup.vectorstore
+st.session_state.index_ready = vectorstore is not None
+corpus = warmup.corpus()
 
 with st.sidebar:
     st.header("Settings")
 
     if not api_key:
         st.warning("OPENAI_API_KEY missing.")
+    else:
+        polling = warmup.status().running
+        st.fragment(run_every=1.0 if polling else None)(render_index_status)(warmup)
 
     st.divider()
 
     with st.expander("Knowledge base stats", expanded=True):
-        num_docs, num_chunks = kb_stats(DEFAULT_PDF_DIR, vectorstore)
-        st.caption(f"Documents: **{num_docs}**")
-        if num_chunks is not None:
-            st.caption(f"Chunks: **{num_chunks}**")
+        if corpus["documents"]:
+            st.caption(f"Documents: **{len(corpus['documents'])}**")
+            st.caption(f"Pages: **{corpus['pages']}**")
+            st.caption(f"Chunks: **{corpus['chunks']}**")
         else:
-            st.caption("Chunks: **—** (index not loaded)")
+            st.caption("Documents: **—** (index not built yet)")
+
+    with st.expander("Latency (recent requests)", expanded=False):
+        breakdown = get_metrics().recent_breakdown()
+        if breakdown:
+            st.dataframe(breakdown, hide_index=True, use_container_width=True)
+        else:
+            st.caption("No questions answered yet.")
+
+        last = st.session_state.last_timings
+        if last is not None:
+            st.caption(
+                f"Last question: **{last.total * 1000:.0f} ms**"
+                f" · fallback: **{'yes' if last.fallback else 'no'}**"
+                f" · cache hit: **{'yes' if last.cache_hit else 'no'}**"
+                f" · prompt: **{last.prompt_tokens}** tokens ({last.prompt_chars} chars)"
+            )
 
     st.divider()
 
@@ -244,7 +266,7 @@ with st.sidebar:
         st.session_state.memory_history = []
         st.rerun()
 
-    docs = ["All documents"] + list_documents(DEFAULT_PDF_DIR)
+    docs = ["All documents"] + corpus["documents"]
     selected_doc = st.selectbox("Filter by document", docs, index=0, key="doc_filter")
 
     if "prev_doc_filter" not in st.session_state:
@@ -279,23 +301,38 @@ if pending_q:
     st.session_state.pending_question = None
 
     if not api_key or vectorstore is None:
-        st.session_state.messages.append(
-            {"role": "assistant", "content": "Knowledge base is not ready.", "citations": []}
+        status = warmup.status()
+        reply = (
+            "The knowledge base is still loading. Please ask again in a moment."
+            if status.state in (LOADING, BUILDING)
+            else "Knowledge base is not ready."
         )
+        st.session_state.messages.append({"role": "assistant", "content": reply, "citations": []})
         st.rerun()
 
+    MEMORY_TURNS = 3
+    memory_text = "\n".join(st.session_state.memory_history[-MEMORY_TURNS:]).strip()
+
+    stream = rag_answer_question_stream(
+        question=pending_q,
+        vectorstore=vectorstore,
+        k=DEFAULT_TOP_K,
+        source_filter=st.session_state.source_filter,
+        memory_text=memory_text,
+    )
+
     with st.spinner("Searching documents..."):
-        MEMORY_TURNS = 3
-        memory_text = "\n".join(st.session_state.memory_history[-MEMORY_TURNS:]).strip()
-
-        res = rag_answer_question(
-            question=pending_q,
-            vectorstore=vectorstore,
-            k=DEFAULT_TOP_K,
-            max_distance=DEFAULT_MAX_DISTANCE,
-            source_filter=st.session_state.source_filter,
-            memory_text=memory_text,
-        )
+        first = next(stream)
+
+    placeholder = st.empty()
+    streamed = ""
+    res = None
+    for item in itertools.chain([first], stream):
+        if isinstance(item, RAGResult):
+            res = item
+            break
+        streamed += item
+        render_assistant(streamed, container=placeholder)
 
     answer = (res.answer or "").strip()
     citations = res.citations or []
@@ -304,6 +341,7 @@ if pending_q:
 
     st.session_state.last_question = pending_q
     st.session_state.last_answer = answer
+    st.session_state.last_timings = res.timings
 
     if answer != NO_ANSWER:
         st.session_state.memory_history.append(f"Q: {pending_q}\nA: {answer}")
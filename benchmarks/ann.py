@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from langchain_core.documents import Document
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.fakes import sample_queries, scale_corpus
+from benchmarks.run import git_commit, read_pages, summarize, write_pages
+from rag.ann import IndexSpec, build_index, configure_search, ivf_nlist
+from rag.chunking import chunk_documents
+from rag.config import DEFAULT_PDF_DIR, DEFAULT_TOP_K
+from rag.loaders import clean_text, list_pdfs, parse_pdf
+from rag.local_embeddings import HashingNgramEmbeddings
+
+HNSW_M = (16, 32)
+HNSW_EF_SEARCH = (16, 32, 64, 128, 256)
+IVF_NPROBE = (1, 4, 8, 16, 32, 64)
+
+
+def load_chunks(pdf_dir: str, pages_path: Optional[str], scale: int, seed: int) -> List[Document]:
+    """
+    Cleaned, chunked corpus (`scale` times the real one). Parsed pages are read from /
+    written to `pages_path` when given, since parsing dominates the setup time.
+    """
+    if pages_path and Path(pages_path).exists():
+        pages = read_pages(Path(pages_path))
+    else:
+        pages = [d for path in list_pdfs(pdf_dir) for d in parse_pdf(path)]
+        if pages_path:
+            write_pages(Path(pages_path), pages)
+
+    by_source: Dict[str, List[Document]] = {}
+    for d in scale_corpus(pages, scale, seed=seed):
+        d = Document(page_content=clean_text(d.page_content), metadata=d.metadata)
+        by_source.setdefault(d.metadata.get("source", "unknown"), []).append(d)
+    return [c for docs in by_source.values() for c in chunk_documents(docs)]
+
+
+def time_queries(index: Any, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, List[float]]:
+    """
+    One search call per query (as the app issues them); returns (distances, positions, latencies).
+    """
+    distances = np.empty((len(queries), k), dtype=np.float32)
+    positions = np.empty((len(queries), k), dtype=np.int64)
+    samples: List[float] = []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        d, p = index.search(queries[i:i + 1], k)
+        samples.append(time.perf_counter() - start)
+        distances[i], positions[i] = d[0], p[0]
+    return distances, positions, samples
+
+
+def compare_to_exact(
+    exact: Tuple[np.ndarray, np.ndarray],
+    found: Tuple[np.ndarray, np.ndarray],
+    max_distance: float,
+) -> Dict[str, float]:
+    """
+    recall@k against the flat results, how often the distance gate keeps exactly the
+    same chunks, and the largest distance difference on chunks both returned (0 = same scores).
+    """
+    (d_exact, p_exact), (d_found, p_found) = exact, found
+    recall, gate_same, max_err = 0.0, 0, 0.0
+    for de, pe, df, pf in zip(d_exact, p_exact, d_found, p_found):
+        truth = {int(p) for p in pe if p >= 0}
+        recall += len(truth & {int(p) for p in pf if p >= 0}) / max(len(truth), 1)
+
+        kept_exact = {int(p) for d, p in zip(de, pe) if p >= 0 and d <= max_distance}
+        kept_found = {int(p) for d, p in zip(df, pf) if p >= 0 and d <= max_distance}
+        gate_same += kept_exact == kept_found
+
+        exact_by_pos = {int(p): float(d) for d, p in zip(de, pe)}
+        for d, p in zip(df, pf):
+            if int(p) in exact_by_pos:
+                max_err = max(max_err, abs(float(d) - exact_by_pos[int(p)]))
+    n = max(len(p_exact), 1)
+    return {
+        "recall_at_k": round(recall / n, 4),
+        "gate_agreement": round(gate_same / n, 4),
+        "max_distance_error": max_err,
+    }
+
+
+def settings(n_vectors: int) -> List[IndexSpec]:
+    specs = [IndexSpec(type="hnsw", hnsw_m=m, ef_search=ef) for m in HNSW_M for ef in HNSW_EF_SEARCH]
+    nlist = ivf_nlist(IndexSpec(type="ivf"), n_vectors)
+    specs += [IndexSpec(type="ivf", ivf_nlist=nlist, ivf_nprobe=p) for p in IVF_NPROBE if p <= nlist]
+    return specs
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    chunks = load_chunks(args.pdf_dir, args.pages, args.scale, args.seed)
+    embeddings = HashingNgramEmbeddings(dim=args.dim)
+    if args.max_distance is None:
+        args.max_distance = embeddings.max_distance
+    vectors = np.asarray(embeddings.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+    queries = np.asarray(
+        embeddings.embed_documents([q.page_content for q in sample_queries(chunks, args.queries, seed=args.seed)]),
+        dtype=np.float32,
+    )
+
+    faiss = dependable_faiss_import()
+    start = time.perf_counter()
+    flat = build_index(vectors, IndexSpec(type="flat"), faiss.METRIC_L2)
+    flat_build = time.perf_counter() - start
+    d_exact, p_exact, samples = time_queries(flat, queries, args.k)
+
+    rows: List[Dict[str, Any]] = [{
+        "index": "flat",
+        "build_s": round(flat_build, 4),
+        **{f"search_{name}": v for name, v in summarize(samples).items() if name.startswith("p")},
+        **compare_to_exact((d_exact, p_exact), (d_exact, p_exact), args.max_distance),
+    }]
+
+    built: Dict[Tuple[str, int, int], Tuple[Any, float]] = {}
+    for spec in settings(len(vectors)):
+        key = (spec.type, spec.hnsw_m, spec.ivf_nlist)
+        if key not in built:
+            # Build once per structure; efSearch / nprobe are search-time knobs.
+            start = time.perf_counter()
+            built[key] = (build_index(vectors, spec, faiss.METRIC_L2), time.perf_counter() - start)
+        index, build_s = built[key]
+        configure_search(index, spec)
+
+        d, p, samples = time_queries(index, queries, args.k)
+        rows.append({
+            "index": spec.label(),
+            "build_s": round(build_s, 4),
+            **{f"search_{name}": v for name, v in summarize(samples).items() if name.startswith("p")},
+            **compare_to_exact((d_exact, p_exact), (d, p), args.max_distance),
+        })
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "chunks": len(chunks),
+            "dim": args.dim,
+            "queries": len(queries),
+            "k": args.k,
+            "scale": args.scale,
+            "max_distance": args.max_distance,
+        },
+        "results": rows,
+    }
+
+
+def print_table(report: Dict[str, Any]) -> None:
+    m = report["meta"]
+    print(f"\nchunks={m['chunks']} dim={m['dim']} queries={m['queries']} k={m['k']}", file=sys.stderr)
+    print(
+        f"  {'index':<34}{'build s':>9}{'p50 ms':>9}{'p99 ms':>9}{'recall@k':>10}{'gate same':>11}",
+        file=sys.stderr,
+    )
+    for r in report["results"]:
+        print(
+            f"  {r['index']:<34}{r['build_s']:>9.2f}{r['search_p50_ms']:>9.3f}{r['search_p99_ms']:>9.3f}"
+            f"{r['recall_at_k']:>10.3f}{r['gate_agreement']:>11.3f}",
+            file=sys.stderr,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.ann",
+        description="recall@k vs. search latency of HNSW/IVF settings against the flat index.",
+    )
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    parser.add_argument("--pages", help="parsed-pages JSON cache (written on first use)")
+    parser.add_argument("--scale", type=int, default=10, help="synthetic corpus multiplier")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--max-distance", type=float, default=None,
+                        help="relevance gate (default: the local embedder's)")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_table(report)
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
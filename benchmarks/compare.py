@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def load(path: str) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare(
+    base: Dict[str, Any],
+    head: Dict[str, Any],
+    metric: str = "p50_ms",
+    threshold: float = 1.10,
+) -> List[Dict[str, Any]]:
+    """
+    Stage-by-stage ratios head/base for every (scale, stage) present in both runs.
+    A row is a regression when the ratio exceeds `threshold`.
+    """
+    rows: List[Dict[str, Any]] = []
+    for scale, head_scale in head.get("scales", {}).items():
+        base_scale = base.get("scales", {}).get(scale)
+        if base_scale is None:
+            continue
+
+        for stage, h in head_scale["stages"].items():
+            b = base_scale["stages"].get(stage)
+            if b is None:
+                continue
+            ratio = h[metric] / b[metric] if b[metric] > 0 else float("inf")
+            rows.append({
+                "scale": scale,
+                "stage": stage,
+                "base": b[metric],
+                "head": h[metric],
+                "ratio": ratio,
+                "regression": ratio > threshold,
+            })
+
+        b_rss, h_rss = base_scale.get("peak_rss_mb"), head_scale.get("peak_rss_mb")
+        if b_rss and h_rss:
+            ratio = h_rss / b_rss
+            rows.append({
+                "scale": scale,
+                "stage": "peak_rss_mb",
+                "base": b_rss,
+                "head": h_rss,
+                "ratio": ratio,
+                "regression": ratio > threshold,
+            })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compare",
+        description="Compare two benchmarks.run JSON results (e.g. from two commits).",
+    )
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms", "total_s"])
+    parser.add_argument("--threshold", type=float, default=1.10, help="ratio above which a stage counts as a regression")
+    parser.add_argument("--fail", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args(argv)
+
+    base, head = load(args.base), load(args.head)
+    rows = compare(base, head, metric=args.metric, threshold=args.threshold)
+
+    print(f"{base['meta'].get('commit')} -> {head['meta'].get('commit')} ({args.metric})")
+    print(f"  {'scale':<7}{'stage':<24}{'base':>12}{'head':>12}{'ratio':>8}")
+    for r in rows:
+        flag = "  REGRESSION" if r["regression"] else ""
+        print(f"  {r['scale']:<7}{r['stage']:<24}{r['base']:>12.3f}{r['head']:>12.3f}{r['ratio']:>8.2f}{flag}")
+
+    if args.fail and any(r["regression"] for r in rows):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.run import git_commit
+from rag.clients import RegistryEmbeddings, configure_clients
+from rag.config import DEFAULT_EMBED_BATCH_SIZE
+from rag.embeddings import EmbeddingCheckpoint, EmbeddingJob, EmbeddingJobStats
+from rag.stubs import StubOpenAIServer
+
+MODEL = "stub-embedding"
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def corpus(n: int) -> List[str]:
+    return [f"chunk {i}: discharge planning and readmission risk, cohort {i % 97}" for i in range(n)]
+
+
+def job_row(stats: EmbeddingJobStats, server: StubOpenAIServer) -> Dict[str, Any]:
+    return {
+        "vectors_per_second": round(stats.vectors_per_second, 1),
+        "seconds": round(stats.seconds, 3),
+        "embedded": stats.embedded,
+        "resumed": stats.resumed,
+        "requests": stats.requests,
+        "server_requests": server.requests,
+        "retries": stats.retries,
+        "rate_limited": stats.rate_limited,
+        "final_window": stats.concurrency,
+        "server_peak_in_flight": server.peak_in_flight,
+        "server_429": server.rate_limited,
+        "server_500": server.errors,
+    }
+
+
+def stub_server(args: argparse.Namespace) -> StubOpenAIServer:
+    server = StubOpenAIServer(
+        latency_seconds=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        max_in_flight=args.server_max_in_flight,
+        retry_after=args.retry_after,
+        seed=0,
+    ).start()
+    # Default retry settings: the job embeds through the registry's build client, as index builds do.
+    configure_clients(base_url=server.base_url, api_key="stub", tokenize_embeddings=False)
+    return server
+
+
+def run_concurrency(args: argparse.Namespace, texts: List[str], concurrency: int) -> Dict[str, Any]:
+    server = stub_server(args)
+    try:
+        job = EmbeddingJob(RegistryEmbeddings(MODEL), batch_size=args.batch_size, concurrency=concurrency)
+        job.run(texts)
+        return {"concurrency": concurrency, **job_row(job.stats, server)}
+    finally:
+        server.stop()
+
+
+def run_resume(args: argparse.Namespace, texts: List[str], concurrency: int) -> Dict[str, Any]:
+    """
+    Interrupts a checkpointed job half-way, then reruns it on the same checkpoint.
+    """
+    server = stub_server(args)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "checkpoint.sqlite3")
+
+            def interrupt(stats: EmbeddingJobStats) -> None:
+                if stats.embedded >= len(texts) // 2:
+                    raise _Interrupted()
+
+            checkpoint = EmbeddingCheckpoint(path, MODEL)
+            first = EmbeddingJob(RegistryEmbeddings(MODEL), args.batch_size, concurrency,
+                                 checkpoint=checkpoint, progress=interrupt)
+            try:
+                first.run(texts)
+            except _Interrupted:
+                pass
+            saved = len(checkpoint)
+            checkpoint.close()
+
+            checkpoint = EmbeddingCheckpoint(path, MODEL)
+            second = EmbeddingJob(RegistryEmbeddings(MODEL), args.batch_size, concurrency, checkpoint=checkpoint)
+            start = time.perf_counter()
+            second.run(texts)
+            resume_s = time.perf_counter() - start
+            checkpoint.close()
+        return {
+            "concurrency": concurrency,
+            "checkpointed_before_interrupt": saved,
+            "resume_seconds": round(resume_s, 3),
+            **job_row(second.stats, server),
+        }
+    finally:
+        server.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.embed_job",
+        description="Bulk embedding job against a local stub server with injected rate limits and errors.",
+    )
+    parser.add_argument("--texts", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_EMBED_BATCH_SIZE)
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="comma-separated request windows")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="stub latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="fraction of requests answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.02, help="fraction of requests answered 429")
+    parser.add_argument("--server-max-in-flight", type=int, default=6, help="concurrent requests before 429 (0 = none)")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Retry-After seconds sent with 429")
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    texts = corpus(args.texts)
+    windows = [int(c) for c in args.concurrency.split(",")]
+    rows = [run_concurrency(args, texts, c) for c in windows]
+    resume = run_resume(args, texts, max(windows))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "texts": args.texts,
+            "batch_size": args.batch_size,
+            "latency_ms": args.latency_ms,
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+            "server_max_in_flight": args.server_max_in_flight,
+        },
+        "concurrency": rows,
+        "resume": resume,
+    }
+
+    print(
+        f"\n{'window':>7}{'vectors/s':>11}{'requests':>10}{'retries':>9}{'429s':>6}{'500s':>6}"
+        f"{'final':>7}{'peak':>6}",
+        file=sys.stderr,
+    )
+    for r in rows:
+        print(
+            f"{r['concurrency']:>7}{r['vectors_per_second']:>11.1f}{r['requests']:>10}{r['retries']:>9}"
+            f"{r['server_429']:>6}{r['server_500']:>6}{r['final_window']:>7}{r['server_peak_in_flight']:>6}",
+            file=sys.stderr,
+        )
+    print(
+        f"resume: {resume['checkpointed_before_interrupt']} vectors checkpointed before the interrupt, "
+        f"{resume['resumed']} resumed, {resume['embedded']} embedded in {resume['resume_seconds']:.2f}s",
+        file=sys.stderr,
+    )
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
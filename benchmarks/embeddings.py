@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.ann import load_chunks
+from benchmarks.run import git_commit, summarize
+from rag.clients import configure_clients
+from rag.config import DEFAULT_HASHING_EMBEDDING_DIM, DEFAULT_PDF_DIR, DEFAULT_TOP_K
+from rag.embeddings import get_embeddings
+from rag.stubs import StubOpenAIServer
+
+
+def window_queries(chunks: List[Document], n: int, seed: int = 0) -> List[tuple]:
+    """
+    (query, chunk index) pairs: 4-10 word windows cut from random chunks, with one
+    word dropped and one misspelled (a letter removed) so exact matching is not enough.
+    """
+    rng = random.Random(seed)
+    out = []
+    while len(out) < n:
+        i = rng.randrange(len(chunks))
+        words = chunks[i].page_content.split()
+        if len(words) < 12:
+            continue
+        size = rng.randint(4, 10)
+        start = rng.randrange(len(words) - size)
+        window = words[start:start + size + 1]
+        del window[rng.randrange(len(window))]
+        j = max(range(len(window)), key=lambda w: len(window[w]))
+        if len(window[j]) > 4:
+            cut = rng.randrange(1, len(window[j]) - 1)
+            window[j] = window[j][:cut] + window[j][cut + 1:]
+        out.append((" ".join(window), i))
+    return out
+
+
+def hit_rate(embeddings: Embeddings, chunks: List[Document], queries: List[tuple], k: int) -> float:
+    """
+    Fraction of queries whose source chunk (or a chunk with the same text) is in the top k.
+    """
+    import faiss
+
+    docs = np.asarray(embeddings.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+    index = faiss.IndexFlatL2(docs.shape[1])
+    index.add(docs)
+    q = np.asarray(embeddings.embed_documents([text for text, _ in queries]), dtype=np.float32)
+    _, ids = index.search(q, k)
+    hits = 0
+    for (_, i), row in zip(queries, ids):
+        hits += any(chunks[j].page_content == chunks[i].page_content for j in row if j >= 0)
+    return round(hits / max(1, len(queries)), 4)
+
+
+def time_backend(embeddings: Embeddings, chunks: List[Document], queries: List[tuple], batch: int) -> Dict[str, Any]:
+    samples = []
+    for text, _ in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(text)
+        samples.append(time.perf_counter() - start)
+
+    texts = [c.page_content for c in chunks]
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch):
+        embeddings.embed_documents(texts[i:i + batch])
+    seconds = time.perf_counter() - start
+    return {"query": summarize(samples), "documents_per_second": round(len(texts) / seconds, 1)}
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    chunks = load_chunks(args.pdf_dir, args.pages, args.scale, seed=0)
+    queries = window_queries(chunks, args.queries, seed=1)
+
+    server = StubOpenAIServer(dim=args.stub_dim, latency_seconds=args.latency_ms / 1000).start()
+    configure_clients(base_url=server.base_url, api_key="stub", tokenize_embeddings=False)
+    try:
+        backends = {
+            "hashing": get_embeddings(backend="hashing"),
+            # Remote model stand-in: the stub serves n-gram vectors of --stub-dim over HTTP.
+            "openai (stub, %gms)" % args.latency_ms: get_embeddings("stub-embedding", backend="openai"),
+        }
+        results: Dict[str, Any] = {}
+        for name, embeddings in backends.items():
+            row = time_backend(embeddings, chunks, queries, args.batch_size)
+            row["hit_rate"] = hit_rate(embeddings, chunks, queries, args.k)
+            results[name] = row
+    finally:
+        server.stop()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "chunks": len(chunks),
+            "queries": len(queries),
+            "k": args.k,
+            "stub_latency_ms": args.latency_ms,
+        },
+        "backends": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.embeddings",
+        description="Embedding backends: query latency, document throughput and window hit rate@k.",
+    )
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    parser.add_argument("--pages", help="parsed-pages JSON cache (written on first use)")
+    parser.add_argument("--scale", type=int, default=1, help="synthetic corpus multiplier")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="stub server latency per request")
+    parser.add_argument("--stub-dim", type=int, default=DEFAULT_HASHING_EMBEDDING_DIM)
+    parser.add_argument("-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    meta = report["meta"]
+    print(f"\nchunks={meta['chunks']} queries={meta['queries']} k={meta['k']}", file=sys.stderr)
+    print(f"  {'backend':<24}{'query p50':>11}{'query p99':>11}{'docs/s':>10}{'hit@k':>8}", file=sys.stderr)
+    for name, r in report["backends"].items():
+        hit = f"{r['hit_rate']:.1%}" if "hit_rate" in r else "-"
+        print(
+            f"  {name:<24}{r['query']['p50_ms'] * 1000:>9.0f}us{r['query']['p99_ms'] * 1000:>9.0f}us"
+            f"{r['documents_per_second']:>10.0f}{hit:>8}",
+            file=sys.stderr,
+        )
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
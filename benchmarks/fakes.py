@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import random
+import re
+from typing import List
+
+from langchain_core.documents import Document
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def scale_corpus(pages: List[Document], factor: int, seed: int = 0) -> List[Document]:
+    """
+    Synthetic corpus `factor` times the size of `pages`: the originals plus factor - 1
+    copies under new source names, each with its sentences deterministically shuffled
+    per page so copies are not exact duplicates.
+    """
+    out = list(pages)
+    for copy in range(1, factor):
+        rng = random.Random(seed * 1_000_003 + copy)
+        for d in pages:
+            sentences = _SENTENCE.split(d.page_content)
+            rng.shuffle(sentences)
+            meta = dict(d.metadata)
+            meta["source"] = f"synthetic{copy:03d}_{meta.get('source', 'unknown')}"
+            out.append(Document(page_content=" ".join(sentences), metadata=meta))
+    return out
+
+
+def sample_queries(chunks: List[Document], n: int, seed: int = 0) -> List[Document]:
+    """
+    Deterministic query set: short word windows cut from random chunks.
+    The query's metadata keeps the source it was cut from (for filtered searches).
+    """
+    rng = random.Random(seed)
+    queries: List[Document] = []
+    for _ in range(n):
+        chunk = chunks[rng.randrange(len(chunks))]
+        words = chunk.page_content.split()
+        size = min(len(words), rng.randint(6, 14))
+        start = rng.randrange(max(1, len(words) - size + 1))
+        text = " ".join(words[start:start + size]) or "healthcare"
+        queries.append(Document(page_content=text, metadata={"source": chunk.metadata.get("source")}))
+    return queries
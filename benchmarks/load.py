@@ -0,0 +1,395 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_community.vectorstores import FAISS
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.ann import load_chunks
+from benchmarks.run import git_commit, summarize
+from rag.answer_cache import get_answer_cache
+from rag.clients import RegistryEmbeddings, configure_clients
+from rag.config import DEFAULT_LLM_CONCURRENCY, DEFAULT_PDF_DIR, DEFAULT_TOP_K, NO_ANSWER
+from rag.local_embeddings import HashingNgramEmbeddings
+from rag.qa_chain import answer_question
+from rag.rewrite import get_rewrite_memo, needs_rewrite
+from rag.stubs import StubOpenAIServer, default_reply, lognormal_latency
+
+MODEL = "stub-embedding"
+# Chat memory kept per session, as in the Streamlit app.
+MEMORY_TURNS = 3
+
+OPENERS = (
+    "What does the literature say about {topic}?",
+    "What are the main challenges of {topic} in hospitals?",
+    "How do health systems approach {topic}?",
+)
+# Follow-ups that refer back to the conversation (rewritten before retrieval).
+FOLLOW_UPS = (
+    "What are its limitations?",
+    "How is it measured?",
+    "Why does that matter?",
+    "And for smaller hospitals?",
+    "What about the costs?",
+    "Can you give an example?",
+)
+# Self-contained follow-ups (the rewrite LLM call is skipped).
+STANDALONE = (
+    "Which outcomes are used to evaluate {topic}?",
+    "What barriers slow the adoption of {topic}?",
+)
+OFF_TOPIC = (
+    "What is the best pizza place in Naples?",
+    "Who won the 1998 football world cup?",
+    "How do I change a bicycle tyre?",
+)
+_GENERIC = {"ai", "review", "healthcare", "health", "systematic", "and", "of", "the"}
+
+
+def topic(source: str) -> str:
+    words = [w for w in Path(source).stem.replace("-", "_").split("_") if w]
+    kept = [w for w in words if w.lower() not in _GENERIC] or words
+    return " ".join(kept).lower()
+
+
+def stub_reply(messages: Sequence[Dict[str, Any]]) -> str:
+    """
+    Canned chat behaviour with a plausible rewrite: the follow-up plus the last
+    self-contained question of the chat history. Answers as in default_reply.
+    """
+    prompt = str(messages[-1].get("content", "")) if messages else ""
+    question = default_reply(messages)
+    if "Standalone retrieval query:" not in prompt:
+        return question
+
+    history = prompt.split("CHAT HISTORY:", 1)[-1].split("CURRENT QUESTION:", 1)[0]
+    asked = [line[3:].strip() for line in history.splitlines() if line.startswith("Q: ")]
+    subjects = [q for q in asked if not needs_rewrite(q)]
+    return f"{question} {subjects[-1]}" if subjects else question
+
+
+@dataclass
+class Session:
+    source_filter: Any
+    turns: List[str]
+
+
+def make_session(sources: List[str], rng: random.Random, turns: int, off_topic_rate: float,
+                 filter_mix: Sequence[float]) -> Session:
+    """
+    One simulated conversation: an opening question on one document's topic (or an off-topic
+    one), then follow-ups, mostly referring back. The source filter is none, that document, or
+    that document plus others, drawn from `filter_mix` (weights for the three).
+    """
+    source = rng.choice(sources)
+    kind = rng.choices(("none", "single", "multi"), weights=filter_mix)[0]
+    if kind == "single":
+        source_filter: Any = source
+    elif kind == "multi":
+        others = [s for s in sources if s != source]
+        source_filter = [source] + rng.sample(others, min(len(others), rng.randint(1, 2)))
+    else:
+        source_filter = None
+
+    subject = topic(source)
+    if rng.random() < off_topic_rate:
+        questions = [rng.choice(OFF_TOPIC)]
+    else:
+        questions = [rng.choice(OPENERS).format(topic=subject)]
+    while len(questions) < turns:
+        if rng.random() < 0.75:
+            questions.append(rng.choice(FOLLOW_UPS))
+        else:
+            questions.append(rng.choice(STANDALONE).format(topic=subject))
+    return Session(source_filter, questions)
+
+
+@dataclass
+class LevelStats:
+    concurrency: int
+    latencies: List[float] = field(default_factory=list)
+    questions: int = 0
+    errors: int = 0
+    no_answer: int = 0
+    fallbacks: int = 0
+    llm_rewrites: int = 0
+    # Chat calls made and failed after client retries; such questions still count as answered
+    # (the answer becomes NO_ANSWER), so `errors` alone does not show them.
+    llm_calls: int = 0
+    llm_errors: int = 0
+    # Stub responses during the level, retried ones included.
+    server_500: int = 0
+    server_429: int = 0
+    seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, seconds: float, result: Any) -> None:
+        with self._lock:
+            self.questions += 1
+            if result is None:
+                self.errors += 1
+                return
+            self.latencies.append(seconds)
+            self.no_answer += result.answer == NO_ANSWER
+            t = result.timings
+            if t is not None:
+                self.fallbacks += bool(t.fallback)
+                self.llm_rewrites += "rewrite" in t.spans
+                self.llm_calls += t.llm_calls
+                self.llm_errors += t.llm_errors
+
+    def row(self) -> Dict[str, Any]:
+        answered = max(1, self.questions - self.errors)
+        return {
+            "concurrency": self.concurrency,
+            "questions": self.questions,
+            "seconds": round(self.seconds, 3),
+            "throughput_qps": round(self.questions / self.seconds, 2) if self.seconds else 0.0,
+            "latency": summarize(self.latencies) if self.latencies else None,
+            "fallback_rate": round(self.fallbacks / answered, 4),
+            "no_answer_rate": round(self.no_answer / answered, 4),
+            "llm_rewrite_rate": round(self.llm_rewrites / answered, 4),
+            "error_rate": round(self.errors / max(1, self.questions), 4),
+            "llm_calls": self.llm_calls,
+            "llm_error_rate": round(self.llm_errors / max(1, self.llm_calls), 4),
+            "server_500": self.server_500,
+            "server_429": self.server_429,
+        }
+
+
+def run_session(session: Session, vs: FAISS, stats: LevelStats, args: argparse.Namespace) -> None:
+    history: List[str] = []
+    for question in session.turns:
+        memory_text = "\n".join(history[-MEMORY_TURNS:]).strip()
+        start = time.perf_counter()
+        try:
+            result = answer_question(
+                question,
+                vs,
+                k=args.k,
+                max_distance=args.max_distance,
+                source_filter=session.source_filter,
+                memory_text=memory_text,
+                use_cache=args.use_cache,
+            )
+        except Exception:
+            result = None
+        stats.record(time.perf_counter() - start, result)
+
+        if result is not None and result.answer != NO_ANSWER:
+            history.append(f"Q: {question}\nA: {result.answer}")
+        else:
+            history.append(f"Q: {question}")
+        if args.think_ms:
+            time.sleep(args.think_ms / 1000)
+
+
+def run_level(
+    vs: FAISS,
+    sources: List[str],
+    concurrency: int,
+    args: argparse.Namespace,
+    server: StubOpenAIServer,
+) -> LevelStats:
+    """
+    `concurrency` simulated users, each running `sessions_per_user` sessions back to back.
+    Every level starts with cold rewrite memo and answer cache.
+    """
+    rng = random.Random(args.seed + concurrency)
+    filter_mix = [float(w) for w in args.filter_mix.split(",")]
+    users = [
+        [make_session(sources, rng, args.turns, args.off_topic_rate, filter_mix) for _ in range(args.sessions_per_user)]
+        for _ in range(concurrency)
+    ]
+    get_rewrite_memo().clear()
+    get_answer_cache().clear()
+
+    stats = LevelStats(concurrency)
+
+    def user(sessions: List[Session]) -> None:
+        for session in sessions:
+            run_session(session, vs, stats, args)
+
+    errors, rate_limited = server.errors, server.rate_limited
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(user, users))
+    stats.seconds = time.perf_counter() - start
+    stats.server_500 = server.errors - errors
+    stats.server_429 = server.rate_limited - rate_limited
+    return stats
+
+
+def saturation_point(rows: List[Dict[str, Any]], min_scaling: float) -> Optional[int]:
+    """
+    The lowest concurrency past which added users mostly queue: the next level's relative
+    throughput gain is below `min_scaling` times its relative increase in users (0.25:
+    doubling the users adds under 25% throughput). None if throughput still scaled at the last level.
+    """
+    for a, b in zip(rows, rows[1:]):
+        users = b["concurrency"] / a["concurrency"] - 1
+        gain = b["throughput_qps"] / a["throughput_qps"] - 1 if a["throughput_qps"] else 0.0
+        if users > 0 and gain < min_scaling * users:
+            return a["concurrency"]
+    return None
+
+
+def build_store(args: argparse.Namespace, embedder: HashingNgramEmbeddings) -> FAISS:
+    """
+    In-memory index of the corpus. Vectors are computed locally; queries go through the
+    stub server, which serves the same embedder, so retrieval behaves like a real model's.
+    """
+    chunks = load_chunks(args.pdf_dir, args.pages, args.scale, seed=0)
+    texts = [c.page_content for c in chunks]
+    return FAISS.from_embeddings(
+        list(zip(texts, embedder.embed_documents(texts))),
+        RegistryEmbeddings(MODEL),
+        metadatas=[c.metadata for c in chunks],
+    )
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    embedder = HashingNgramEmbeddings()
+    if args.max_distance is None:
+        args.max_distance = embedder.max_distance
+    vs = build_store(args, embedder)
+    sources = sorted({d.metadata.get("source", "unknown") for d in vs.docstore._dict.values()})
+
+    samplers = {
+        "chat": lognormal_latency(args.chat_ms / 1000, args.chat_p99_ms / 1000, seed=args.seed),
+        "embeddings": lognormal_latency(args.embed_ms / 1000, args.embed_p99_ms / 1000, seed=args.seed + 1),
+    }
+    server = StubOpenAIServer(
+        reply=stub_reply,
+        latency=lambda endpoint: samplers[endpoint](),
+        embed=embedder.embed_query,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    ).start()
+    configure_clients(
+        base_url=server.base_url,
+        api_key="stub",
+        tokenize_embeddings=False,
+        concurrency=args.llm_concurrency,
+    )
+    try:
+        rows = []
+        for c in [int(c) for c in args.concurrency.split(",")]:
+            stats = run_level(vs, sources, c, args, server)
+            rows.append(stats.row())
+            print(f"  {c} users: {rows[-1]['throughput_qps']:.1f} q/s", file=sys.stderr)
+    finally:
+        server.stop()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "chunks": len(vs.docstore._dict),
+            "sources": len(sources),
+            "turns": args.turns,
+            "sessions_per_user": args.sessions_per_user,
+            "filter_mix": args.filter_mix,
+            "off_topic_rate": args.off_topic_rate,
+            "chat_ms": [args.chat_ms, args.chat_p99_ms],
+            "embed_ms": [args.embed_ms, args.embed_p99_ms],
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+            "llm_concurrency": args.llm_concurrency,
+            "think_ms": args.think_ms,
+            "use_cache": args.use_cache,
+            "min_scaling": args.min_scaling,
+            "server_requests": server.requests,
+            "server_500": server.errors,
+            "server_429": server.rate_limited,
+        },
+        "levels": rows,
+        "saturation_concurrency": saturation_point(rows, args.min_scaling),
+    }
+
+
+def print_table(report: Dict[str, Any]) -> None:
+    meta = report["meta"]
+    print(
+        f"\nchunks={meta['chunks']} sources={meta['sources']} chat={meta['chat_ms']}ms "
+        f"embed={meta['embed_ms']}ms (median, p99) errors={meta['error_rate']:.0%} "
+        f"llm_concurrency={meta['llm_concurrency']}",
+        file=sys.stderr,
+    )
+    print(
+        f"  {'users':>5}{'q/s':>8}{'p50':>9}{'p99':>9}{'fallback':>10}{'no answer':>11}"
+        f"{'rewrite':>9}{'errors':>8}{'llm err':>9}{'500s':>7}{'429s':>7}",
+        file=sys.stderr,
+    )
+    for r in report["levels"]:
+        lat = r["latency"] or {"p50_ms": 0.0, "p99_ms": 0.0}
+        print(
+            f"  {r['concurrency']:>5}{r['throughput_qps']:>8.1f}{lat['p50_ms']:>7.0f}ms{lat['p99_ms']:>7.0f}ms"
+            f"{r['fallback_rate']:>10.1%}{r['no_answer_rate']:>11.1%}{r['llm_rewrite_rate']:>9.1%}"
+            f"{r['error_rate']:>8.1%}{r['llm_error_rate']:>9.1%}{r['server_500']:>7}{r['server_429']:>7}",
+            file=sys.stderr,
+        )
+    sat = report["saturation_concurrency"]
+    if sat is None:
+        print(f"saturation: not reached at {report['levels'][-1]['concurrency']} users", file=sys.stderr)
+    else:
+        print(f"saturation: {sat} concurrent users", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load",
+        description="Offline load test of answer_question: concurrent multi-turn sessions against stub model endpoints.",
+    )
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    parser.add_argument("--pages", help="parsed-pages JSON cache (written on first use)")
+    parser.add_argument("--scale", type=int, default=1, help="synthetic corpus multiplier")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32,64", help="comma-separated simulated user counts")
+    parser.add_argument("--sessions-per-user", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=4, help="questions per session")
+    parser.add_argument("--filter-mix", default="0.5,0.3,0.2",
+                        help="weights of no source filter, one source, several sources")
+    parser.add_argument("--off-topic-rate", type=float, default=0.1, help="fraction of sessions opening off-topic")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's questions")
+    parser.add_argument("--chat-ms", type=float, default=150.0, help="median stub chat latency")
+    parser.add_argument("--chat-p99-ms", type=float, default=600.0)
+    parser.add_argument("--embed-ms", type=float, default=20.0, help="median stub embedding latency")
+    parser.add_argument("--embed-p99-ms", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.01, help="fraction of stub requests answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of stub requests answered 429")
+    parser.add_argument("--llm-concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY,
+                        help="client-side in-flight model request limit")
+    parser.add_argument("--max-distance", type=float, default=None,
+                        help="relevance gate (default: the local embedder's)")
+    parser.add_argument("--use-cache", action="store_true", help="serve repeated questions from the answer cache")
+    parser.add_argument("--min-scaling", type=float, default=0.25,
+                        help="throughput gain per relative user increase below which a level counts as saturated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_table(report)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.run import git_commit
+from rag.rewrite import needs_rewrite
+
+DEFAULT_SET = ROOT_DIR / "benchmarks" / "rewrite_set.jsonl"
+# Written after the detector was tuned and never used to tune it; the set above was
+# written alongside it, so only these numbers say how well it generalizes.
+DEFAULT_HELD_OUT = ROOT_DIR / "benchmarks" / "rewrite_heldout.jsonl"
+
+
+def load_set(path: Path) -> List[Dict[str, Any]]:
+    """
+    Labeled follow-ups, one JSON object per line: {"memory", "question", "needs_rewrite"}.
+    """
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rows.append(json.loads(line))
+    return rows
+
+
+def evaluate(rows: List[Dict[str, Any]], repeat: int = 200) -> Dict[str, Any]:
+    """
+    Confusion matrix of needs_rewrite against the labels. A skip is the detector saying
+    False; an unsafe skip is a skipped question that needed the rewrite.
+    """
+    tp = fp = tn = fn = 0
+    unsafe: List[str] = []
+    for r in rows:
+        predicted, label = needs_rewrite(r["question"]), bool(r["needs_rewrite"])
+        if predicted and label:
+            tp += 1
+        elif predicted:
+            fp += 1
+        elif label:
+            fn += 1
+            unsafe.append(r["question"])
+        else:
+            tn += 1
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for r in rows:
+            needs_rewrite(r["question"])
+    detector_us = (time.perf_counter() - start) / (repeat * max(1, len(rows))) * 1e6
+
+    skipped = tn + fn
+    return {
+        "examples": len(rows),
+        "skip_rate": round(skipped / max(1, len(rows)), 4),
+        # Of the questions that did not need a rewrite, how many were skipped (LLM calls saved).
+        "skip_recall": round(tn / max(1, tn + fp), 4),
+        # Of the skipped questions, how many were really self-contained.
+        "skip_precision": round(tn / max(1, skipped), 4),
+        "unsafe_skip_rate": round(fn / max(1, tp + fn), 4),
+        "accuracy": round((tp + tn) / max(1, len(rows)), 4),
+        "confusion": {"rewrite_needed_and_done": tp, "rewrite_unneeded_but_done": fp,
+                      "skipped_correctly": tn, "skipped_unsafely": fn},
+        "unsafe_skips": unsafe,
+        "detector_us": round(detector_us, 2),
+    }
+
+
+def print_summary(name: str, result: Dict[str, Any]) -> None:
+    print(
+        f"{name}: examples={result['examples']} skip_rate={result['skip_rate']:.1%} "
+        f"skip_precision={result['skip_precision']:.1%} skip_recall={result['skip_recall']:.1%} "
+        f"unsafe_skip_rate={result['unsafe_skip_rate']:.1%} detector={result['detector_us']:.1f}us",
+        file=sys.stderr,
+    )
+    for q in result["unsafe_skips"]:
+        print(f"  unsafe skip: {q}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.rewrite",
+        description="Accuracy of the local follow-up detector that skips the rewrite LLM call.",
+    )
+    parser.add_argument("--set", default=str(DEFAULT_SET), help="labeled JSONL set")
+    parser.add_argument("--held-out", default=str(DEFAULT_HELD_OUT),
+                        help="labeled JSONL set not used to tune the detector ('' to skip)")
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    result = evaluate(load_set(Path(args.set)))
+    report: Dict[str, Any] = {"meta": {"commit": git_commit(), "set": Path(args.set).name}, "results": result}
+    print()
+    print_summary(Path(args.set).name, result)
+
+    if args.held_out:
+        held_out = evaluate(load_set(Path(args.held_out)))
+        report["meta"]["held_out_set"] = Path(args.held_out).name
+        report["held_out"] = held_out
+        print_summary(Path(args.held_out).name, held_out)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.fakes import sample_queries, scale_corpus
+from rag.chunking import chunk_documents
+from rag.clients import configure_clients
+from rag.config import DEFAULT_MAX_CONTEXTS, DEFAULT_PDF_DIR, DEFAULT_TOP_K
+from rag.context import pack_contexts
+from rag.guardrails import flag_injections
+from rag.loaders import clean_text, list_pdfs, parse_pdf
+from rag.local_embeddings import HashingNgramEmbeddings
+from rag.qa_chain import answer_question
+from rag.lexical import get_lexical_index, load_or_build_lexical_index
+from rag.retriever import gate_and_select_contexts, lexical_fast_path, retrieve_with_scores
+from rag.stubs import StubOpenAIServer
+from rag.vectorstore import load_index, save_index
+
+PAGES_CACHE = "pages.json"
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set size of this process so far (None where unsupported).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": len(samples),
+        "total_s": round(float(ms.sum()) / 1000.0, 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+class Recorder:
+    """
+    Collects per-call latency samples for each benchmark stage.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.rss_after: Dict[str, Optional[float]] = {}
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+            self.rss_after[stage] = peak_rss_mb()
+
+    def report(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for stage, samples in self.samples.items():
+            out[stage] = summarize(samples)
+            out[stage]["peak_rss_mb"] = self.rss_after.get(stage)
+        return out
+
+
+def parse_real_corpus(pdf_dir: str, rec: Recorder) -> Tuple[List[Document], List[Document]]:
+    """
+    Parses the bundled PDFs the way load_pdfs does, timing each file (parse + clean)
+    and each clean_text call. Returns (raw pages, cleaned pages).
+    """
+    raw: List[Document] = []
+    cleaned: List[Document] = []
+    for path in list_pdfs(pdf_dir):
+        with rec.time("load_pdf"):
+            pages = parse_pdf(path)
+            for d in pages:
+                raw.append(Document(page_content=d.page_content, metadata=dict(d.metadata)))
+                with rec.time("clean_text"):
+                    d.page_content = clean_text(d.page_content)
+                cleaned.append(d)
+    rec.samples["load_pdfs"] = [sum(rec.samples["load_pdf"])]
+    rec.rss_after["load_pdfs"] = peak_rss_mb()
+    return raw, cleaned
+
+
+def write_pages(path: Path, pages: List[Document]) -> None:
+    payload = [{"text": d.page_content, "metadata": d.metadata} for d in pages]
+    path.write_text(json.dumps(payload), encoding="utf-8")
+
+
+def read_pages(path: Path) -> List[Document]:
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    return [Document(page_content=p["text"], metadata=p["metadata"]) for p in payload]
+
+
+def run_scale(scale: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Runs every stage on the real corpus (scale 1) or a synthetic corpus `scale` times its size.
+    """
+    rec = Recorder()
+    work_dir = Path(args.work_dir)
+    cache = work_dir / PAGES_CACHE
+
+    if scale == 1:
+        raw, pages = parse_real_corpus(args.pdf_dir, rec)
+        write_pages(cache, raw)
+    else:
+        raw = scale_corpus(read_pages(cache), scale, seed=args.seed)
+        pages = []
+        for d in raw:
+            with rec.time("clean_text"):
+                text = clean_text(d.page_content)
+            pages.append(Document(page_content=text, metadata=d.metadata))
+    del raw
+
+    by_source: Dict[str, List[Document]] = {}
+    for d in pages:
+        by_source.setdefault(d.metadata.get("source", "unknown"), []).append(d)
+
+    chunks: List[Document] = []
+    for docs in by_source.values():
+        with rec.time("chunk_documents"):
+            chunks.extend(chunk_documents(docs))
+    flagged = 0
+    for c in chunks:
+        with rec.time("guardrail_scan"):
+            flagged += flag_injections([c])
+
+    embeddings = HashingNgramEmbeddings(dim=args.dim)
+    texts = [c.page_content for c in chunks]
+    metadatas = [c.metadata for c in chunks]
+    with rec.time("embed_fake"):
+        # float32 rows instead of Python float lists keep the harness's own memory out of peak RSS.
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+    vs = None
+    for _ in range(args.repeat):
+        vs = None
+        with rec.time("index_build"):
+            vs = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas)
+    del vectors
+
+    # save_local / load_local: LangChain's pickle format, kept as the baseline.
+    pickle_dir = work_dir / f"pickle_x{scale}"
+    with rec.time("save_local"):
+        vs.save_local(str(pickle_dir))
+    index_dir = work_dir / f"index_x{scale}"
+    with rec.time("save_index"):
+        save_index(vs, str(index_dir))
+    del vs
+
+    for _ in range(args.repeat):
+        with rec.time("load_local"):
+            vs = FAISS.load_local(str(pickle_dir), embeddings, allow_dangerous_deserialization=True)
+    del vs
+    for _ in range(args.repeat):
+        with rec.time("load_index_mmap"):
+            load_index(str(index_dir), embeddings, mmap=True)
+    for _ in range(args.repeat):
+        with rec.time("load_index"):
+            vs = load_index(str(index_dir), embeddings)
+
+    for _ in range(args.repeat):
+        with rec.time("lexical_build"):
+            load_or_build_lexical_index(vs, str(index_dir), rebuild=True)
+    with rec.time("lexical_load"):
+        load_or_build_lexical_index(vs, str(index_dir))
+
+    queries = sample_queries(chunks, args.queries, seed=args.seed)
+    gated = context_tokens = context_tokens_saved = 0
+    for q in queries:
+        with rec.time("retrieve_gate_vector"):
+            docs_and_scores = retrieve_with_scores(q.page_content, vs, k=DEFAULT_TOP_K, mode="vector")
+            gate_and_select_contexts(docs_and_scores, embeddings.max_distance, max_contexts=DEFAULT_MAX_CONTEXTS)
+
+    for q in queries:
+        with rec.time("retrieve_gate"):
+            docs_and_scores = retrieve_with_scores(q.page_content, vs, k=DEFAULT_TOP_K)
+            contexts = gate_and_select_contexts(docs_and_scores, embeddings.max_distance, max_contexts=DEFAULT_MAX_CONTEXTS)
+        gated += bool(contexts)
+        with rec.time("pack_contexts"):
+            packed = pack_contexts(contexts)
+        context_tokens += packed.tokens_before
+        context_tokens_saved += packed.tokens_saved
+
+    # Keyword-style queries (one rare term) exercise the lexical fast path.
+    index = get_lexical_index(vs)
+    rare = [t for t, df in zip(index.vocab, index.df) if 1 < df <= 0.01 * len(index) and len(t) > 3]
+    rng = random.Random(args.seed)
+    keyword_queries = [rng.choice(rare) for _ in range(args.queries)] if rare else []
+    fast = 0
+    for term in keyword_queries:
+        with rec.time("retrieve_keyword"):
+            fast += lexical_fast_path(term, vs, k=DEFAULT_TOP_K) is not None
+            retrieve_with_scores(term, vs, k=DEFAULT_TOP_K)
+
+    for q in queries:
+        with rec.time("retrieve_gate_filtered"):
+            docs_and_scores = retrieve_with_scores(
+                q.page_content, vs, k=DEFAULT_TOP_K, source_filter=q.metadata["source"]
+            )
+            gate_and_select_contexts(docs_and_scores, embeddings.max_distance, max_contexts=DEFAULT_MAX_CONTEXTS)
+
+    if args.answers:
+        with StubOpenAIServer(dim=args.dim) as server:
+            configure_clients(base_url=server.base_url, api_key="stub", tokenize_embeddings=False)
+            for q in queries[: args.answers]:
+                with rec.time("answer_question_stub"):
+                    answer_question(q.page_content, vs, use_cache=False)
+
+    return {
+        "scale": scale,
+        "corpus": {
+            "sources": len(by_source),
+            "pages": len(pages),
+            "chunks": len(chunks),
+            "chars": sum(len(t) for t in texts),
+            "dim": args.dim,
+            "queries": len(queries),
+            "gate_pass_rate": round(gated / max(len(queries), 1), 4),
+            "keyword_fast_path_rate": round(fast / max(len(keyword_queries), 1), 4),
+            "injection_flag_rate": round(flagged / max(len(chunks), 1), 4),
+            "context_tokens_saved_rate": round(context_tokens_saved / max(context_tokens, 1), 4),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": rec.report(),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: Dict[str, Any]) -> None:
+    for key, scale in results["scales"].items():
+        c = scale["corpus"]
+        print(
+            f"\n[{key}] pages={c['pages']} chunks={c['chunks']} peak_rss={scale['peak_rss_mb']:.0f}MB",
+            file=sys.stderr,
+        )
+        print(f"  {'stage':<24}{'n':>7}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'total s':>10}", file=sys.stderr)
+        for stage, s in scale["stages"].items():
+            print(
+                f"  {stage:<24}{s['n']:>7}{s['p50_ms']:>12.3f}{s['p95_ms']:>12.3f}"
+                f"{s['p99_ms']:>12.3f}{s['total_s']:>10.2f}",
+                file=sys.stderr,
+            )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Offline ingestion/retrieval benchmarks (fake embeddings, stub chat model).",
+    )
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    parser.add_argument("--scales", default="1,10,100", help="comma-separated corpus multipliers")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--answers", type=int, default=50, help="answer_question calls against the stub server")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions of index build / load")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-scale", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker_scale is not None:
+        json.dump(run_scale(args.worker_scale, args), sys.stdout)
+        return
+
+    scales = sorted({int(s) for s in args.scales.split(",") if s.strip()})
+    # Synthetic corpora are derived from the parsed real corpus, so scale 1 always runs first.
+    run_scales = scales if 1 in scales else [1] + scales
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "args": {k: v for k, v in vars(args).items() if k not in ("work_dir", "worker_scale", "output")},
+        },
+        "scales": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as work_dir:
+        for scale in run_scales:
+            # One process per scale, so peak RSS is measured per corpus size.
+            cmd = [
+                sys.executable, "-m", "benchmarks.run",
+                "--worker-scale", str(scale),
+                "--work-dir", work_dir,
+                "--pdf-dir", args.pdf_dir,
+                "--queries", str(args.queries),
+                "--answers", str(args.answers),
+                "--repeat", str(args.repeat),
+                "--dim", str(args.dim),
+                "--seed", str(args.seed),
+            ]
+            print(f"running scale x{scale} ...", file=sys.stderr)
+            out = subprocess.run(cmd, cwd=ROOT_DIR, capture_output=True, text=True)
+            if out.returncode != 0:
+                sys.stderr.write(out.stderr)
+                raise SystemExit(f"benchmark worker for scale x{scale} failed")
+            if scale in scales:
+                results["scales"][f"x{scale}"] = json.loads(out.stdout)
+
+    print_table(results)
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.ann import load_chunks
+from benchmarks.fakes import sample_queries
+from benchmarks.run import git_commit, summarize
+from rag.ann import IndexSpec, build_index
+from rag.config import DEFAULT_PDF_DIR, DEFAULT_SHARD_SEARCH_WORKERS, DEFAULT_TOP_K
+from rag.local_embeddings import HashingNgramEmbeddings
+from rag.retriever import retrieve_batch_with_scores_by_vectors
+from rag.shards import assemble, assign_shards, shard_stats
+
+
+def build_store(chunks: List[Document], vectors: np.ndarray, embeddings: HashingNgramEmbeddings, spec: IndexSpec) -> FAISS:
+    vs = FAISS.from_embeddings(
+        list(zip([c.page_content for c in chunks], vectors)),
+        embeddings,
+        metadatas=[c.metadata for c in chunks],
+        ids=[c.id for c in chunks],
+    )
+    vs.index = build_index(vectors, spec, vs.index.metric_type)
+    return vs
+
+
+def timed_search(vs: FAISS, queries: np.ndarray, k: int, source_filter: Any = None) -> tuple:
+    """
+    One retrieval call per query (as the app issues them); returns (results, latencies).
+    """
+    results, samples = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(retrieve_batch_with_scores_by_vectors([q], vs, k=k, source_filter=source_filter)[0])
+        samples.append(time.perf_counter() - start)
+    return results, samples
+
+
+def same_results(a: List[list], b: List[list]) -> float:
+    """
+    Fraction of queries whose top-k distances are identical: 1.0 on flat indexes
+    (the synthetic corpus repeats chunks, so ids of tied duplicates may differ);
+    HNSW/IVF graphs differ per shard, so less there.
+    """
+    same = 0
+    for ra, rb in zip(a, b):
+        same += [round(s, 5) for _, s in ra] == [round(s, 5) for _, s in rb]
+    return round(same / max(1, len(a)), 4)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    spec = IndexSpec(type=args.index_type)
+    chunks = load_chunks(args.pdf_dir, args.pages, args.scale, seed=0)
+    for i, c in enumerate(chunks):
+        c.id = f"{c.metadata.get('source')}#{i}"
+    embeddings = HashingNgramEmbeddings(dim=args.dim)
+    vectors = np.asarray(embeddings.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+    queries = np.asarray(
+        embeddings.embed_documents([q.page_content for q in sample_queries(chunks, args.queries, seed=1)]),
+        dtype=np.float32,
+    )
+
+    start = time.perf_counter()
+    single = build_store(chunks, vectors, embeddings, spec)
+    single_build_s = time.perf_counter() - start
+
+    sources = [str(c.metadata.get("source")) for c in chunks]
+    groups = assign_shards(set(sources), args.shards, args.shard_by)
+    rows_of = {name: [i for i, s in enumerate(sources) if s in set(files)] for name, files in groups.items()}
+    names = sorted(groups)
+
+    def build(name: str) -> FAISS:
+        rows = rows_of[name]
+        return build_store([chunks[i] for i in rows], vectors[rows], embeddings, spec)
+
+    start = time.perf_counter()
+    serial = [build(n) for n in names]
+    serial_build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.build_workers) as pool:
+        shards = list(pool.map(build, names))
+    parallel_build_s = time.perf_counter() - start
+    del serial
+
+    with ThreadPoolExecutor(max_workers=args.search_workers, thread_name_prefix="rag-shard") as search_pool:
+        sharded = assemble(names, shards, [groups[n] for n in names], embeddings, pool=search_pool)
+
+        single_res, single_lat = timed_search(single, queries, args.k)
+        sharded_res, sharded_lat = timed_search(sharded, queries, args.k)
+        one_source = sorted(groups[names[0]])[0]
+        f_single, f_single_lat = timed_search(single, queries, args.k, one_source)
+        f_sharded, f_sharded_lat = timed_search(sharded, queries, args.k, one_source)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "chunks": len(chunks),
+            "dim": args.dim,
+            "index_type": args.index_type,
+            "shards": len(names),
+            "shard_by": args.shard_by,
+            "build_workers": args.build_workers,
+            "search_workers": args.search_workers,
+        },
+        "build": {
+            "single_s": round(single_build_s, 4),
+            "shards_serial_s": round(serial_build_s, 4),
+            "shards_parallel_s": round(parallel_build_s, 4),
+        },
+        "search": {
+            "single": summarize(single_lat),
+            "sharded": summarize(sharded_lat),
+            "same_top_k": same_results(single_res, sharded_res),
+        },
+        "filtered_search": {
+            "source": one_source,
+            "single": summarize(f_single_lat),
+            "sharded": summarize(f_sharded_lat),
+            "same_top_k": same_results(f_single, f_sharded),
+        },
+        "per_shard": shard_stats(sharded),
+    }
+
+
+def print_table(report: Dict[str, Any]) -> None:
+    meta, build = report["meta"], report["build"]
+    print(
+        f"\nchunks={meta['chunks']} shards={meta['shards']} ({meta['shard_by']}) index={meta['index_type']}\n"
+        f"  build: single {build['single_s']:.3f}s, shards serial {build['shards_serial_s']:.3f}s, "
+        f"parallel x{meta['build_workers']} {build['shards_parallel_s']:.3f}s",
+        file=sys.stderr,
+    )
+    for label in ("search", "filtered_search"):
+        r = report[label]
+        print(
+            f"  {label:<16} single p50 {r['single']['p50_ms']:.3f}ms p99 {r['single']['p99_ms']:.3f}ms | "
+            f"sharded p50 {r['sharded']['p50_ms']:.3f}ms p99 {r['sharded']['p99_ms']:.3f}ms | "
+            f"same top-k {r['same_top_k']:.1%}",
+            file=sys.stderr,
+        )
+    print(f"  {'shard':<12}{'vectors':>9}{'searches':>10}{'p50 ms':>9}{'p95 ms':>9}", file=sys.stderr)
+    for name, s in report["per_shard"].items():
+        print(
+            f"  {name:<12}{s['vectors']:>9}{s['searches']:>10}{s['p50_ms'] or 0:>9.3f}{s['p95_ms'] or 0:>9.3f}",
+            file=sys.stderr,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.shards",
+        description="Sharded vs. single index: parallel build time, scatter-gather search latency, exactness.",
+    )
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    parser.add_argument("--pages", help="parsed-pages JSON cache (written on first use)")
+    parser.add_argument("--scale", type=int, default=10, help="synthetic corpus multiplier")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--index-type", default="flat", choices=["flat", "hnsw", "ivf"])
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--shard-by", default="hash", choices=["hash", "source"])
+    parser.add_argument("--build-workers", type=int, default=4)
+    parser.add_argument("--search-workers", type=int, default=DEFAULT_SHARD_SEARCH_WORKERS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_table(report)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
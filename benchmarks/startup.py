@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.ann import load_chunks
+from benchmarks.run import git_commit
+from rag.ann import IndexSpec, build_index
+from rag.config import DEFAULT_PDF_DIR
+from rag.local_embeddings import HashingNgramEmbeddings
+
+MODES = ("copy", "mmap")
+
+
+def memory_mb() -> Dict[str, Optional[float]]:
+    """
+    RSS split into private (anonymous) and file-backed pages, plus PSS: shared pages
+    divided by the number of processes mapping them (Linux only; None elsewhere).
+    """
+    out: Dict[str, Optional[float]] = {"rss_mb": None, "rss_anon_mb": None, "rss_file_mb": None, "pss_mb": None}
+    fields = {"VmRSS": "rss_mb", "RssAnon": "rss_anon_mb", "RssFile": "rss_file_mb", "Pss": "pss_mb"}
+    for name in ("/proc/self/status", "/proc/self/smaps_rollup"):
+        try:
+            with open(name) as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in fields and value.strip().endswith("kB"):
+                        out[fields[key]] = int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    return out
+
+
+def evict_from_page_cache(index_dir: Path) -> None:
+    """
+    Asks the kernel to drop the index files from the page cache (best effort), for a cold start.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in index_dir.iterdir():
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def worker(index_dir: str, dim: int, mode: str, queries: np.ndarray, barrier: Any, results: Any) -> None:
+    from langchain_community.vectorstores.faiss import dependable_faiss_import
+    from rag.vectorstore import load_index
+
+    # The FAISS file alone (what mmap changes); load_index below also unpickles the docstore.
+    faiss = dependable_faiss_import()
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mode == "mmap" else 0
+    start = time.perf_counter()
+    index = faiss.read_index(str(Path(index_dir) / "index.faiss"), flags)
+    faiss_read_s = time.perf_counter() - start
+    del index
+
+    before = memory_mb()
+    start = time.perf_counter()
+    vs = load_index(index_dir, HashingNgramEmbeddings(dim=dim), mmap=mode == "mmap")
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vs.index.search(queries, 5)
+    first_search_s = time.perf_counter() - start
+
+    # Measure while every worker is alive and has touched the whole index.
+    barrier.wait()
+    after = memory_mb()
+    barrier.wait()
+    results.put({
+        "faiss_read_s": faiss_read_s,
+        "load_s": load_s,
+        "first_search_s": first_search_s,
+        **{k: (after[k] - before[k]) if after[k] is not None and before[k] is not None else None for k in after},
+    })
+
+
+def run_mode(index_dir: Path, dim: int, mode: str, workers: int, queries: np.ndarray, cold: bool) -> Dict[str, Any]:
+    if cold:
+        evict_from_page_cache(index_dir)
+
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(str(index_dir), dim, mode, queries, barrier, results))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    def total(key: str) -> Optional[float]:
+        values = [r[key] for r in rows]
+        return None if any(v is None for v in values) else round(sum(values), 1)
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "cold": cold,
+        "faiss_read_s_max": round(max(r["faiss_read_s"] for r in rows), 4),
+        "load_s_max": round(max(r["load_s"] for r in rows), 4),
+        "load_s_mean": round(sum(r["load_s"] for r in rows) / len(rows), 4),
+        "first_search_s_max": round(max(r["first_search_s"] for r in rows), 4),
+        # Growth over the interpreter baseline, summed over workers.
+        "rss_mb": total("rss_mb"),
+        "rss_anon_mb": total("rss_anon_mb"),
+        "rss_file_mb": total("rss_file_mb"),
+        "pss_mb": total("pss_mb"),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.startup",
+        description="Index load time and per-host memory: copied vs. memory-mapped FAISS index.",
+    )
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    parser.add_argument("--pages", help="parsed-pages JSON cache (written on first use)")
+    parser.add_argument("--scale", type=int, default=10, help="synthetic corpus multiplier")
+    parser.add_argument("--dim", type=int, default=1536, help="vector size (1536 = text-embedding-3-small)")
+    parser.add_argument("--index-type", default="flat", choices=["flat", "hnsw", "ivf"])
+    parser.add_argument("--workers", default="1,4", help="comma-separated worker process counts")
+    parser.add_argument("--warm", action="store_true", help="keep the index in the page cache between runs")
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    from langchain_community.vectorstores import FAISS
+    from rag.vectorstore import save_index
+
+    chunks = load_chunks(args.pdf_dir, args.pages, args.scale, seed=0)
+    embeddings = HashingNgramEmbeddings(dim=args.dim)
+    vectors = np.asarray(embeddings.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+    queries = vectors[:: max(1, len(vectors) // 32)][:32].copy()
+
+    rows: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="rag-startup-") as tmp:
+        index_dir = Path(tmp)
+        vs = FAISS.from_embeddings(
+            list(zip([c.page_content for c in chunks], vectors)),
+            embeddings,
+            metadatas=[c.metadata for c in chunks],
+        )
+        vs.index = build_index(vectors, IndexSpec(type=args.index_type), vs.index.metric_type)
+        save_index(vs, str(index_dir))
+        sizes = {p.name: round(p.stat().st_size / 2**20, 1) for p in index_dir.iterdir()}
+        del vs, vectors
+
+        for n in sorted({int(w) for w in args.workers.split(",") if w.strip()}):
+            for mode in MODES:
+                print(f"{mode} x{n} ...", file=sys.stderr)
+                rows.append(run_mode(index_dir, args.dim, mode, n, queries, cold=not args.warm))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "chunks": len(chunks),
+            "dim": args.dim,
+            "index_type": args.index_type,
+            "files_mb": sizes,
+        },
+        "results": rows,
+    }
+
+    print(f"\nchunks={len(chunks)} dim={args.dim} files(MB)={sizes}", file=sys.stderr)
+    print(
+        f"  {'mode':<6}{'workers':>8}{'faiss s':>9}{'load s':>9}{'1st search s':>14}{'RSS MB':>9}{'anon MB':>9}{'PSS MB':>9}",
+        file=sys.stderr,
+    )
+    for r in rows:
+        print(
+            f"  {r['mode']:<6}{r['workers']:>8}{r['faiss_read_s_max']:>9.3f}{r['load_s_max']:>9.3f}{r['first_search_s_max']:>14.3f}"
+            f"{r['rss_mb'] or 0:>9.0f}{r['rss_anon_mb'] or 0:>9.0f}{r['pss_mb'] or 0:>9.0f}",
+            file=sys.stderr,
+        )
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
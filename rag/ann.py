@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import math
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+from rag.config import (
+    DEFAULT_HNSW_EF_CONSTRUCTION,
+    DEFAULT_HNSW_EF_SEARCH,
+    DEFAULT_HNSW_M,
+    DEFAULT_INDEX_TYPE,
+    DEFAULT_IVF_NLIST,
+    DEFAULT_IVF_NPROBE,
+)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """
+    FAISS index type and its build/search parameters.
+
+    HNSW and IVF keep full vectors (no quantization), so every distance they report is
+    the exact one a flat index would report; only which neighbours are found may differ.
+    """
+    type: str = DEFAULT_INDEX_TYPE
+    hnsw_m: int = DEFAULT_HNSW_M
+    ef_construction: int = DEFAULT_HNSW_EF_CONSTRUCTION
+    ef_search: int = DEFAULT_HNSW_EF_SEARCH
+    ivf_nlist: int = DEFAULT_IVF_NLIST
+    ivf_nprobe: int = DEFAULT_IVF_NPROBE
+
+    def __post_init__(self):
+        if self.type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {self.type!r}; expected one of {INDEX_TYPES}")
+
+    @property
+    def approximate(self) -> bool:
+        return self.type != "flat"
+
+    def label(self) -> str:
+        if self.type == "hnsw":
+            return f"hnsw(M={self.hnsw_m},efC={self.ef_construction},ef={self.ef_search})"
+        if self.type == "ivf":
+            return f"ivf(nlist={self.ivf_nlist or 'auto'},nprobe={self.ivf_nprobe})"
+        return "flat"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: Optional[Dict[str, Any]]) -> "IndexSpec":
+        """
+        Spec recorded in a manifest; indexes saved before index types existed are flat.
+        """
+        if not d:
+            return cls(type="flat")
+        fields = cls.__dataclass_fields__
+        return cls(**{k: v for k, v in d.items() if k in fields})
+
+
+def ivf_nlist(spec: IndexSpec, n_vectors: int) -> int:
+    """
+    Number of IVF lists; the automatic value keeps >= 39 training points per centroid.
+    """
+    nlist = spec.ivf_nlist or min(int(4 * math.sqrt(n_vectors)), n_vectors // 39)
+    return max(1, min(nlist, n_vectors))
+
+
+def index_type(index: Any) -> str:
+    """
+    The type of a FAISS index object ("flat", "hnsw" or "ivf").
+    """
+    faiss = dependable_faiss_import()
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def is_approximate(index: Any) -> bool:
+    return index_type(index) != "flat"
+
+
+def configure_search(index: Any, spec: IndexSpec) -> None:
+    """
+    Applies the search-time knobs (efSearch / nprobe); they need no rebuild.
+    """
+    kind = index_type(index)
+    if kind == "hnsw":
+        index.hnsw.efSearch = spec.ef_search
+    elif kind == "ivf":
+        index.nprobe = min(spec.ivf_nprobe, index.nlist)
+        # Direct map: reconstruct() is needed for hybrid fusion and exact filtered scans.
+        index.make_direct_map()
+
+
+def build_index(vectors: np.ndarray, spec: IndexSpec, metric: int) -> Any:
+    """
+    A FAISS index of the given type holding `vectors` at positions 0..n-1.
+    IVF centroids are trained on the vectors themselves.
+    """
+    faiss = dependable_faiss_import()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+
+    if spec.type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec.hnsw_m, metric)
+        index.hnsw.efConstruction = spec.ef_construction
+    elif spec.type == "ivf" and n:
+        quantizer = faiss.IndexFlat(dim, metric)
+        index = faiss.IndexIVFFlat(quantizer, dim, ivf_nlist(spec, n), metric)
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlat(dim, metric)
+
+    if n:
+        index.add(vectors)
+    configure_search(index, spec)
+    return index
+
+
+def _same_build(index: Any, spec: IndexSpec) -> bool:
+    kind = index_type(index)
+    if kind != spec.type:
+        return False
+    if kind == "hnsw":
+        # Upper HNSW levels hold M neighbours per node.
+        return index.hnsw.nb_neighbors(1) == spec.hnsw_m
+    if kind == "ivf":
+        return index.nlist == ivf_nlist(spec, index.ntotal)
+    return True
+
+
+def convert_vectorstore(vectorstore: FAISS, spec: IndexSpec) -> None:
+    """
+    Rebuilds the vectorstore's FAISS index as `spec` from its stored vectors, in place.
+
+    Positions are preserved, so `index_to_docstore_id` and the docstore stay valid.
+    Only the search knobs are applied when the index is already built that way.
+    """
+    index = vectorstore.index
+    if _same_build(index, spec):
+        configure_search(index, spec)
+        return
+
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), dtype=np.float32)
+    vectorstore.index = build_index(vectors, spec, index.metric_type)
+
+
+def search_parameters(index: Any, selector: Any) -> Any:
+    """
+    SearchParameters of the type the index expects, carrying its current search knobs.
+    """
+    faiss = dependable_faiss_import()
+    kind = index_type(index)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    if kind == "ivf":
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def exact_subset_search(
+    index: Any,
+    queries: np.ndarray,
+    positions: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact k-NN restricted to the vectors at `positions` (which index.reconstruct must support).
+    Returns (distances, positions) shaped like Index.search output.
+    """
+    faiss = dependable_faiss_import()
+    vectors = index.reconstruct_batch(positions)
+    k = min(k, len(positions))
+    distances, local = faiss.knn(queries, vectors, k, metric=index.metric_type)
+    found = np.where(local >= 0, positions[np.clip(local, 0, None)], -1)
+    return distances, found
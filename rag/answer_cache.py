@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.config import DEFAULT_ANSWER_CACHE_MAX_ENTRIES, DEFAULT_ANSWER_CACHE_SIMILARITY
+
+if TYPE_CHECKING:
+    from rag.qa_chain import RAGResult
+
+
+def normalize_question(text: str) -> str:
+    return " ".join((text or "").casefold().split())
+
+
+@dataclass
+class _Entry:
+    result: "RAGResult"
+    embedding: Optional[np.ndarray]
+
+
+class AnswerCache:
+    """
+    Thread-safe cache of RAGResults (including NO_ANSWER outcomes).
+
+    Entries live in a scope: the index version plus every answer-affecting argument.
+    A lookup matches the normalized question exactly, or, when the caller can embed the
+    question, the most similar cached question in the same scope above `similarity_threshold`.
+    Entries of several index versions (two loaded stores, or a reload next to a stale
+    reference) coexist; those of versions no longer queried age out of the LRU.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_ANSWER_CACHE_MAX_ENTRIES,
+        similarity_threshold: float = DEFAULT_ANSWER_CACHE_SIMILARITY,
+    ):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: "OrderedDict[Tuple[Hashable, str], _Entry]" = OrderedDict()
+        self._by_scope: Dict[Hashable, Dict[str, _Entry]] = {}
+        self._matrices: Dict[Hashable, Tuple[List[str], np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def _scope_matrix_locked(self, scope: Hashable) -> Optional[Tuple[List[str], np.ndarray]]:
+        cached = self._matrices.get(scope)
+        if cached is not None:
+            return cached
+
+        keyed = [(q, e.embedding) for q, e in self._by_scope.get(scope, {}).items() if e.embedding is not None]
+        if not keyed:
+            return None
+
+        questions = [q for q, _ in keyed]
+        matrix = np.vstack([emb for _, emb in keyed])
+        self._matrices[scope] = (questions, matrix)
+        return questions, matrix
+
+    def _lookup_exact(self, scope: Hashable, question: str) -> Tuple[Optional["RAGResult"], bool]:
+        """
+        Returns (exact hit, whether a similarity search could still match).
+        """
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._by_scope.get(scope, {}).get(key)
+            if entry is not None:
+                self._entries.move_to_end((scope, key))
+                self.exact_hits += 1
+                return replace(entry.result, citations=list(entry.result.citations)), False
+
+            if scope not in self._by_scope:
+                self.misses += 1
+                return None, False
+
+        return None, True
+
+    def _lookup_similar(self, scope: Hashable, embedding: Sequence[float]) -> Optional["RAGResult"]:
+        query = _unit(embedding)
+        with self._lock:
+            scoped = self._scope_matrix_locked(scope)
+            if scoped is not None:
+                questions, matrix = scoped
+                sims = matrix @ query
+                best = int(np.argmax(sims))
+                if sims[best] >= self.similarity_threshold:
+                    match = questions[best]
+                    self._entries.move_to_end((scope, match))
+                    self.semantic_hits += 1
+                    result = self._by_scope[scope][match].result
+                    return replace(result, citations=list(result.citations))
+
+            self.misses += 1
+            return None
+
+    def lookup(
+        self,
+        version: str,
+        scope: Hashable,
+        question: str,
+        embed: Optional[Callable[[], Sequence[float]]] = None,
+    ) -> Optional["RAGResult"]:
+        """
+        Exact match on the normalized question first; only on a miss, and only if
+        `embed` is given, the question is embedded for a near-duplicate search.
+        """
+        scope = (version, scope)
+        hit, try_similar = self._lookup_exact(scope, question)
+        if hit is not None:
+            return hit
+        if not try_similar:
+            return None
+        if embed is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return self._lookup_similar(scope, embed())
+
+    async def alookup(
+        self,
+        version: str,
+        scope: Hashable,
+        question: str,
+        aembed: Optional[Callable[[], Awaitable[Sequence[float]]]] = None,
+    ) -> Optional["RAGResult"]:
+        """
+        Async variant of lookup(): the near-duplicate embedding is awaited.
+        """
+        scope = (version, scope)
+        hit, try_similar = self._lookup_exact(scope, question)
+        if hit is not None:
+            return hit
+        if not try_similar:
+            return None
+        if aembed is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return self._lookup_similar(scope, await aembed())
+
+    def store(
+        self,
+        version: str,
+        scope: Hashable,
+        question: str,
+        result: "RAGResult",
+        embedding: Optional[Sequence[float]] = None,
+    ) -> None:
+        scope = (version, scope)
+        key = normalize_question(question)
+        entry = _Entry(
+            result=replace(result, citations=list(result.citations)),
+            embedding=_unit(embedding) if embedding is not None else None,
+        )
+        with self._lock:
+            self._entries[(scope, key)] = entry
+            self._entries.move_to_end((scope, key))
+            self._by_scope.setdefault(scope, {})[key] = entry
+            self._matrices.pop(scope, None)
+
+            while len(self._entries) > self.max_entries:
+                (old_scope, old_key), _ = self._entries.popitem(last=False)
+                scoped = self._by_scope.get(old_scope, {})
+                scoped.pop(old_key, None)
+                if not scoped:
+                    self._by_scope.pop(old_scope, None)
+                self._matrices.pop(old_scope, None)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self._matrices.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "index_versions": len({version for version, _ in self._by_scope}),
+            }
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else v
+
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """
+    Process-wide answer cache shared by every session.
+    """
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+        return _answer_cache
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from rag.config import (
+    DEFAULT_BATCH_CONCURRENCY,
+    DEFAULT_INDEX_DIR,
+    DEFAULT_LLM_MODEL,
+    DEFAULT_MAX_CONTEXTS,
+    DEFAULT_PDF_DIR,
+    DEFAULT_TOP_K,
+)
+from rag.qa_chain import BatchItem, answer_questions
+
+
+def question_entry(record: Any, default_id: Any) -> Tuple[Any, str, str]:
+    """
+    (id, question, memory) from a JSON string or an object with "question" and
+    optional "id" and "memory" fields.
+    """
+    if isinstance(record, str):
+        return default_id, record, ""
+    if isinstance(record, dict) and isinstance(record.get("question"), str):
+        return record.get("id", default_id), record["question"], record.get("memory") or ""
+    raise ValueError("expected a string or an object with a 'question' field")
+
+
+def read_questions(lines: TextIO) -> Iterator[Tuple[Any, str, str]]:
+    """
+    Parses JSONL questions, one question_entry per non-empty line. Yields (id, question, memory).
+    """
+    for n, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            yield question_entry(json.loads(line), n)
+        except ValueError as exc:
+            raise ValueError(f"line {n}: {exc}") from None
+
+
+def result_record(item_id: Any, item: BatchItem) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"id": item_id, "question": item.question}
+    if item.result is not None:
+        record.update(asdict(item.result))
+    record["error"] = item.error
+    return record
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m rag.batch",
+        description="Answer questions from a JSONL file and write RAGResults as JSONL.",
+    )
+    parser.add_argument("input", help="JSONL file with questions ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file ('-' for stdout)")
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--source", action="append", help="restrict retrieval to this PDF (repeatable)")
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--max-distance", type=float, help="relevance gate (default: the embedding backend's)")
+    parser.add_argument("--max-contexts", type=int, default=DEFAULT_MAX_CONTEXTS)
+    parser.add_argument("--model", default=DEFAULT_LLM_MODEL)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY)
+    parser.add_argument("--chunk", type=int, default=1000, help="questions per answer_questions() call")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from rag.vectorstore import get_vectorstore
+
+    load_dotenv()
+    vectorstore = get_vectorstore(pdf_dir=args.pdf_dir, index_dir=args.index_dir)
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    answered = errors = 0
+    start = time.perf_counter()
+
+    def run(batch: List[Tuple[Any, str, str]]) -> None:
+        nonlocal answered, errors
+        items = answer_questions(
+            [q for _, q, _ in batch],
+            vectorstore,
+            k=args.k,
+            max_distance=args.max_distance,
+            max_contexts=args.max_contexts,
+            source_filter=args.source,
+            model=args.model,
+            memory_texts=[m for _, _, m in batch],
+            use_cache=not args.no_cache,
+            max_concurrency=args.concurrency,
+        )
+        for (item_id, _, _), item in zip(batch, items):
+            dst.write(json.dumps(result_record(item_id, item), ensure_ascii=False) + "\n")
+            answered += 1
+            errors += item.error is not None
+        dst.flush()
+
+    try:
+        batch: List[Tuple[Any, str, str]] = []
+        for entry in read_questions(src):
+            batch.append(entry)
+            if len(batch) >= args.chunk:
+                run(batch)
+                batch = []
+        if batch:
+            run(batch)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+    elapsed = time.perf_counter() - start
+    rate = answered / elapsed if elapsed > 0 else 0.0
+    print(f"answered={answered} errors={errors} wall={elapsed:.2f}s ({rate:.1f} questions/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,13 @@ from typing import List
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from rag.config import DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+
 
 def chunk_documents(
     docs: List[Document],
-    chunk_size: int = 900,
-    chunk_overlap: int = 120,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
 ) -> List[Document]:
     """
     Splits documents into chunks while keeping metadata (source/page).
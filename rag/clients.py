@@ -0,0 +1,565 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from rag.config import (
+    DEFAULT_BUILD_CONCURRENCY,
+    DEFAULT_LLM_MODEL,
+    DEFAULT_EMBEDDING_MODEL,
+    DEFAULT_HTTP_MAX_CONNECTIONS,
+    DEFAULT_HTTP_MAX_KEEPALIVE,
+    DEFAULT_HTTP_TIMEOUT_SECONDS,
+    DEFAULT_LLM_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_RETRY_BUDGET_RATIO,
+    DEFAULT_RETRY_BUDGET_MIN,
+)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ConcurrencyLimiter:
+    """
+    Caps in-flight requests across threads and event loops, and tracks pool utilization.
+
+    Threads wait on a condition; coroutines wait on a future of their own loop, which
+    release() resolves thread-safely, so neither polls.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.acquired = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def _take_locked(self) -> None:
+        self.in_flight += 1
+        self.acquired += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _wake_async_locked(self) -> None:
+        while self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+                return
+            except RuntimeError:
+                # The waiter's loop is closed; wake the next one.
+                continue
+
+    def acquire(self) -> None:
+        with self._cond:
+            if self.in_flight < self.limit:
+                self._take_locked()
+                return
+
+            start = time.perf_counter()
+            self.waits += 1
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.wait_seconds += time.perf_counter() - start
+            self._take_locked()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight >= self.limit:
+                return False
+            self._take_locked()
+            return True
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        start: Optional[float] = None
+        while True:
+            with self._cond:
+                if self.in_flight < self.limit:
+                    self._take_locked()
+                    if start is not None:
+                        self.wait_seconds += time.perf_counter() - start
+                    return
+                if start is None:
+                    start = time.perf_counter()
+                    self.waits += 1
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._cond:
+                    try:
+                        self._async_waiters.remove((loop, future))
+                    except ValueError:
+                        # Already woken: hand the freed slot to the next waiter.
+                        self._wake_async_locked()
+                raise
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            # Wake one thread and one coroutine; whichever loses the race waits again.
+            self._cond.notify()
+            self._wake_async_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "utilization": self.in_flight / self.limit if self.limit else 0.0,
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 4),
+            }
+
+
+class RetryBudget:
+    """
+    Token bucket that limits retries to a fraction of traffic.
+
+    Every request deposits `ratio` tokens and every retry spends one, so during a
+    sustained outage at most ~ratio retries per request are sent (plus a small reserve).
+    """
+
+    def __init__(
+        self,
+        ratio: float = DEFAULT_RETRY_BUDGET_RATIO,
+        min_retries: int = DEFAULT_RETRY_BUDGET_MIN,
+    ):
+        self.ratio = ratio
+        self.capacity = float(min_retries) * 2
+        self.tokens = float(min_retries)
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1.0:
+                self.denied += 1
+                return False
+            self.tokens -= 1.0
+            self.retries += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ratio": self.ratio,
+                "tokens": round(self.tokens, 2),
+                "retries": self.retries,
+                "denied": self.denied,
+            }
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    """
+    Honors Retry-After when the server sends it; otherwise jittered exponential backoff.
+    """
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+    return min(0.25 * (2 ** attempt), 8.0) * (0.5 + random.random() / 2)
+
+
+class _Once:
+    def __init__(self, fn: Callable[[], None]):
+        self._fn = fn
+        self._done = False
+        self._lock = threading.Lock()
+
+    def __call__(self) -> None:
+        with self._lock:
+            if self._done:
+                return
+            self._done = True
+        self._fn()
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for part in self._stream:
+            yield part
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _PooledTransport(httpx.BaseTransport):
+    """
+    Shared keep-alive connection pool with a concurrency cap and budgeted retries
+    on 429/5xx and connection errors (none without a `budget`). A request holds its slot
+    until its body is closed, so streamed responses count as in flight.
+    """
+
+    def __init__(self, registry: "ClientRegistry", limiter: ConcurrencyLimiter, budget: Optional[RetryBudget]):
+        self._registry = registry
+        self._limiter = limiter
+        self._budget = budget
+        self._inner = httpx.HTTPTransport(limits=registry.limits)
+
+    def _may_retry(self, attempt: int) -> bool:
+        return self._budget is not None and attempt < self._registry.max_retries and self._budget.try_spend()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._limiter.acquire()
+        release = _Once(self._limiter.release)
+        if self._budget is not None:
+            self._budget.deposit()
+
+        try:
+            attempt = 0
+            while True:
+                response = None
+                try:
+                    response = self._inner.handle_request(request)
+                except httpx.TransportError:
+                    if not self._may_retry(attempt):
+                        raise
+                else:
+                    if response.status_code == 429:
+                        self._registry.count("rate_limited")
+                    if response.status_code not in RETRY_STATUS_CODES or not self._may_retry(attempt):
+                        return httpx.Response(
+                            status_code=response.status_code,
+                            headers=response.headers,
+                            stream=_ReleasingStream(response.stream, release),
+                            extensions=response.extensions,
+                        )
+                    response.close()
+
+                time.sleep(retry_delay(response, attempt))
+                attempt += 1
+        except BaseException:
+            release()
+            raise
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class _AsyncPooledTransport(httpx.AsyncBaseTransport):
+    """
+    Async counterpart of _PooledTransport.
+    """
+
+    def __init__(self, registry: "ClientRegistry", limiter: ConcurrencyLimiter, budget: Optional[RetryBudget]):
+        self._registry = registry
+        self._limiter = limiter
+        self._budget = budget
+        self._inner = httpx.AsyncHTTPTransport(limits=registry.limits)
+
+    def _may_retry(self, attempt: int) -> bool:
+        return self._budget is not None and attempt < self._registry.max_retries and self._budget.try_spend()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self._limiter.aacquire()
+        release = _Once(self._limiter.release)
+        if self._budget is not None:
+            self._budget.deposit()
+
+        try:
+            attempt = 0
+            while True:
+                response = None
+                try:
+                    response = await self._inner.handle_async_request(request)
+                except httpx.TransportError:
+                    if not self._may_retry(attempt):
+                        raise
+                else:
+                    if response.status_code == 429:
+                        self._registry.count("rate_limited")
+                    if response.status_code not in RETRY_STATUS_CODES or not self._may_retry(attempt):
+                        return httpx.Response(
+                            status_code=response.status_code,
+                            headers=response.headers,
+                            stream=_AsyncReleasingStream(response.stream, release),
+                            extensions=response.extensions,
+                        )
+                    await response.aclose()
+
+                await asyncio.sleep(retry_delay(response, attempt))
+                attempt += 1
+        except BaseException:
+            release()
+            raise
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+class ClientRegistry:
+    """
+    Hands out long-lived chat and embedding clients per (model, temperature).
+
+    All clients share one pooled HTTP transport with a concurrency limit and a retry budget.
+    Async clients are kept per event loop, since async connections cannot cross loops.
+    Index builds get their own embedding clients (`build=True`): a separate transport with
+    its own `build_concurrency` limit and no retries, since EmbeddingJob retries the batches.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        concurrency: int = DEFAULT_LLM_CONCURRENCY,
+        max_connections: int = DEFAULT_HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = DEFAULT_HTTP_MAX_KEEPALIVE,
+        timeout: float = DEFAULT_HTTP_TIMEOUT_SECONDS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        retry_budget_ratio: float = DEFAULT_RETRY_BUDGET_RATIO,
+        tokenize_embeddings: bool = True,
+        build_concurrency: int = DEFAULT_BUILD_CONCURRENCY,
+    ):
+        self.base_url = base_url
+        # Client-side tiktoken length checks; disable for OpenAI-compatible stubs/proxies.
+        self.tokenize_embeddings = tokenize_embeddings
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        )
+        self.limiter = ConcurrencyLimiter(concurrency)
+        self.budget = RetryBudget(retry_budget_ratio)
+        self.build_limiter = ConcurrencyLimiter(build_concurrency)
+
+        self._counters: Dict[str, int] = {"rate_limited": 0}
+        self._lock = threading.Lock()
+        self._http_client = httpx.Client(transport=_PooledTransport(self, self.limiter, self.budget), timeout=timeout)
+        self._build_http_client = httpx.Client(
+            transport=_PooledTransport(self, self.build_limiter, None), timeout=timeout,
+        )
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._clients: Dict[Tuple[Any, ...], Any] = {}
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[Any, ...], Any]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def _client_store(self) -> Tuple[Dict[Tuple[Any, ...], Any], Optional[httpx.AsyncClient]]:
+        """
+        Client cache and async HTTP client for the running event loop (if any).
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self._clients, None
+
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(transport=_AsyncPooledTransport(self, self.limiter, self.budget), timeout=self.timeout)
+            self._async_clients[loop] = client
+        return self._loop_clients.setdefault(loop, {}), client
+
+    def _common_kwargs(self, async_client: Optional[httpx.AsyncClient], build: bool = False) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {
+            "http_client": self._build_http_client if build else self._http_client,
+            "timeout": self.timeout,
+            # Retries happen in the shared transport, under the retry budget.
+            "max_retries": 0,
+        }
+        if async_client is not None:
+            kwargs["http_async_client"] = async_client
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        if self.api_key:
+            kwargs["api_key"] = self.api_key
+        return kwargs
+
+    def chat(self, model: str = DEFAULT_LLM_MODEL, temperature: float = 0.0) -> ChatOpenAI:
+        with self._lock:
+            store, async_client = self._client_store()
+            key = ("chat", model, float(temperature))
+            client = store.get(key)
+            if client is None:
+                client = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    **self._common_kwargs(async_client),
+                )
+                store[key] = client
+            return client
+
+    def embeddings(self, model: str = DEFAULT_EMBEDDING_MODEL, build: bool = False) -> OpenAIEmbeddings:
+        with self._lock:
+            if build:
+                # Builds embed synchronously; their client is not tied to an event loop.
+                store, async_client = self._clients, None
+            else:
+                store, async_client = self._client_store()
+            key = ("embeddings", model, build)
+            client = store.get(key)
+            if client is None:
+                client = OpenAIEmbeddings(
+                    model=model,
+                    check_embedding_ctx_length=self.tokenize_embeddings,
+                    **self._common_kwargs(async_client, build),
+                )
+                store[key] = client
+            return client
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            clients = {"sync": len(self._clients), "event_loops": len(self._loop_clients)}
+        return {
+            "pool": self.limiter.stats(),
+            "build_pool": self.build_limiter.stats(),
+            "retry_budget": self.budget.stats(),
+            "clients": clients,
+            **counters,
+        }
+
+    async def aclose(self) -> None:
+        """
+        Closes the running event loop's async HTTP client; call it before the loop shuts down.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.pop(loop, None)
+            self._loop_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self) -> None:
+        """
+        Closes the sync HTTP client and every event loop's async one: on its own loop when
+        that loop is running (scheduled, not awaited), directly when it is idle. Clients of
+        already closed loops cannot be closed any more and are dropped.
+        """
+        self._http_client.close()
+        self._build_http_client.close()
+        with self._lock:
+            async_clients = list(self._async_clients.items())
+            self._async_clients.clear()
+            self._loop_clients.clear()
+        for loop, client in async_clients:
+            if loop.is_closed():
+                continue
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            else:
+                loop.run_until_complete(client.aclose())
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> ClientRegistry:
+    """
+    Process-wide client registry.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
+
+
+def configure_clients(**kwargs: Any) -> ClientRegistry:
+    """
+    Replaces the process-wide registry, e.g. to point it at a stub server:
+    configure_clients(base_url=server.base_url, api_key="stub", tokenize_embeddings=False).
+    """
+    global _registry
+    with _registry_lock:
+        old = _registry
+        _registry = ClientRegistry(**kwargs)
+    if old is not None:
+        old.close()
+    return _registry
+
+
+def get_chat_model(model: str = DEFAULT_LLM_MODEL, temperature: float = 0.0) -> ChatOpenAI:
+    return get_client_registry().chat(model, temperature)
+
+
+def get_embedding_model(model: str = DEFAULT_EMBEDDING_MODEL, build: bool = False) -> OpenAIEmbeddings:
+    return get_client_registry().embeddings(model, build)
+
+
+class RegistryEmbeddings(Embeddings):
+    """
+    Embeddings that resolve the registry client on every call, so async calls use the
+    running loop's pooled client and configure_clients() takes effect immediately.
+    With `build=True` they use the registry's index build client (see ClientRegistry).
+    """
+
+    backend = "openai"
+
+    def __init__(self, model: str = DEFAULT_EMBEDDING_MODEL, build: bool = False):
+        self.model = model
+        self.build = build
+
+    def for_build(self) -> "RegistryEmbeddings":
+        return RegistryEmbeddings(self.model, build=True)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return get_embedding_model(self.model, self.build).embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return get_embedding_model(self.model, self.build).embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await get_embedding_model(self.model, self.build).aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await get_embedding_model(self.model, self.build).aembed_query(text)
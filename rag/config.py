@@ -8,9 +8,108 @@ DEFAULT_PDF_DIR = "data/raw_docs"
 DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
 DEFAULT_LLM_MODEL = "gpt-4o-mini"
 
+# Embedding backend (rag/embeddings.py): "openai" (DEFAULT_EMBEDDING_MODEL over the API) or
+# "hashing" (in-process hashed character n-grams, no network or API key). EMBEDDING_BACKEND and
+# OPENAI_MODEL_EMBEDDINGS in the environment override these. Indexes record the backend they were
+# built with and refuse to load with another one.
+DEFAULT_EMBEDDING_BACKEND = "openai"
+DEFAULT_HASHING_EMBEDDING_DIM = 1024
+
+DEFAULT_EMBEDDING_CACHE_PATH = "data/processed/embedding_cache.sqlite3"
+DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES = 250_000
+
+DEFAULT_QUERY_CACHE_MAX_ENTRIES = 4096
+DEFAULT_QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_QUERY_CACHE_TTL_SECONDS = 3600.0
+
+DEFAULT_HTTP_MAX_CONNECTIONS = 32
+DEFAULT_HTTP_MAX_KEEPALIVE = 16
+DEFAULT_HTTP_TIMEOUT_SECONDS = 60.0
+DEFAULT_LLM_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BUDGET_RATIO = 0.2
+DEFAULT_RETRY_BUDGET_MIN = 10
+
+DEFAULT_BATCH_CONCURRENCY = 8
+
+# HTTP service (python -m rag.server).
+DEFAULT_SERVER_HOST = "127.0.0.1"
+DEFAULT_SERVER_PORT = 8000
+DEFAULT_SERVER_CONCURRENCY = 32  # requests being answered at once
+DEFAULT_SERVER_MAX_QUEUE = 64  # requests waiting for a slot before new ones get 503
+DEFAULT_SERVER_TIMEOUT_SECONDS = 60.0
+DEFAULT_SERVER_MAX_BATCH = 256
+DEFAULT_SERVER_MAX_BODY_BYTES = 1024 * 1024
+
+DEFAULT_REWRITE_MEMO_MAX_ENTRIES = 4096
+
+DEFAULT_ANSWER_CACHE_MAX_ENTRIES = 2048
+DEFAULT_ANSWER_CACHE_SIMILARITY = 0.97
+
+DEFAULT_METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_METRICS_RECENT = 200
+
+DEFAULT_CHUNK_SIZE = 900
+DEFAULT_CHUNK_OVERLAP = 120
+DEFAULT_INGEST_WORKERS = 4
+DEFAULT_EMBED_BATCH_SIZE = 256
+# Embedding requests in flight during an index build (rag/embedding_job.py): the window halves
+# on every rate limit and grows back by one after a window's worth of successful requests.
+DEFAULT_EMBED_CONCURRENCY = 4
+DEFAULT_EMBED_MAX_ATTEMPTS = 6
+# Index builds embed through their own HTTP client: no transport retries (the job retries whole
+# batches) and their own limit on requests in flight, shared by concurrent builds, so a build
+# neither takes the chat clients' slots and retry budget nor multiplies its retries.
+DEFAULT_BUILD_CONCURRENCY = 16
+
+# "vector": FAISS only; "hybrid": BM25 + FAISS rank fusion (opt-in). Hybrid changes which chunks
+# reach the LLM (the closest vector hit can fall out of the top k) and adds a BM25 pass per query;
+# keep "vector" until a recall / answer-quality comparison supports switching. Lexical-only hybrid
+# hits are scored with their real vector distance, so the relevance gate applies to them unchanged.
+DEFAULT_RETRIEVAL_MODE = "vector"
+DEFAULT_BM25_K1 = 1.5
+DEFAULT_BM25_B = 0.75
+DEFAULT_HYBRID_CANDIDATES = 20
+DEFAULT_RRF_K = 60
+# Lexical fast path (hybrid mode): decisive keyword queries skip the embedding call. Off by
+# default: without a query vector its hits have no real distance and bypass the relevance gate.
+DEFAULT_LEXICAL_FAST_PATH = False
+DEFAULT_FAST_PATH_MAX_TERMS = 4
+DEFAULT_FAST_PATH_MAX_DF = 0.05
+DEFAULT_FAST_PATH_MARGIN = 1.5
+
+# FAISS index type: "flat" (exact scan), "hnsw" or "ivf" (approximate; exact distances).
+DEFAULT_INDEX_TYPE = "flat"
+DEFAULT_HNSW_M = 32
+DEFAULT_HNSW_EF_CONSTRUCTION = 200
+DEFAULT_HNSW_EF_SEARCH = 128
+DEFAULT_IVF_NLIST = 0  # 0 = about 4 * sqrt(number of vectors)
+DEFAULT_IVF_NPROBE = 32
+# Memory-map the saved FAISS vectors read-only when serving (shared across processes via the page cache).
+DEFAULT_INDEX_MMAP = True
+# Source-filtered searches over at most this many vectors are scanned exactly on ANN indexes.
+DEFAULT_ANN_EXACT_FILTER_MAX = 50_000
+
+# Sharded index (rag/shards.py): 0 = one FAISS index; N > 0 = whole PDFs spread over N shards
+# by a hash of the file name ("hash"), or one shard per PDF ("source"). Shards are built in
+# parallel and searched scatter-gather; the layout of an existing index changes only on rebuild.
+DEFAULT_INDEX_SHARDS = 0
+DEFAULT_SHARD_BY = "hash"
+DEFAULT_SHARD_BUILD_WORKERS = 4
+DEFAULT_SHARD_SEARCH_WORKERS = 8
+
+# Chunks flagged at ingest by the injection scanner: "mark" (sent to the LLM labelled as
+# untrusted), "drop" (never used as context) or "off".
+DEFAULT_INJECTION_POLICY = "mark"
+
 DEFAULT_TOP_K = 5
+# Relevance gate on the best chunk's L2 distance, for OpenAI embeddings; other backends bring
+# their own (hashed n-gram vectors of related texts are further apart). See default_max_distance.
 DEFAULT_MAX_DISTANCE = 1.1
+DEFAULT_HASHING_MAX_DISTANCE = 1.66
 DEFAULT_MAX_CONTEXTS = 5
+# Cap on the context text sent to the answer LLM, after merging adjacent chunks (None = no cap).
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1500
 DEFAULT_MAX_SOURCES_SHORT = 2
 DEFAULT_MAX_SOURCES_LONG = 4
 DEFAULT_SHORT_ANSWER_CHAR_LIMIT = 280
\ No newline at end of file
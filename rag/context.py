@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from rag.config import DEFAULT_CONTEXT_TOKEN_BUDGET, DEFAULT_LLM_MODEL
+from rag.guardrails import INJECTION_FLAG, is_flagged
+from rag.metrics import count_tokens
+
+# Shortest suffix/prefix match treated as splitter overlap rather than coincidence.
+MIN_OVERLAP_CHARS = 16
+
+
+@dataclass
+class PackedContexts:
+    """
+    Output of pack_contexts: the contexts to send, best first, and what packing did to them.
+
+    Token counts cover the context texts only (the rest of the prompt is unchanged).
+    """
+    contexts: List[Document]
+    tokens_before: int = 0
+    tokens_after: int = 0
+    merged: int = 0
+    dropped: int = 0
+    truncated: bool = False
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def _position(d: Document) -> Optional[Tuple[str, int, int]]:
+    md = d.metadata or {}
+    page, index = md.get("page"), md.get("chunk_index")
+    if not isinstance(page, int) or not isinstance(index, int):
+        return None
+    return md.get("source", "unknown"), page, index
+
+
+def strip_overlap(a: str, b: str, min_overlap: int = MIN_OVERLAP_CHARS) -> str:
+    """
+    Concatenates two consecutive chunks, keeping the text they share only once.
+
+    The splitter repeats the tail of a chunk at the start of the next one, so the
+    longest suffix of `a` that is a prefix of `b` is dropped from `b`.
+    """
+    if len(a) >= min_overlap and len(b) >= min_overlap:
+        probe = b[:min_overlap]
+        pos = a.find(probe, max(0, len(a) - len(b)))
+        while pos != -1:
+            if b.startswith(a[pos:]):
+                return a + b[len(a) - pos:]
+            pos = a.find(probe, pos + 1)
+    return f"{a} {b}"
+
+
+def merge_adjacent(contexts: List[Document]) -> Tuple[List[Document], int]:
+    """
+    Merges chunks that sit next to each other on the same page (same source and page,
+    consecutive chunk_index) into one Document, without the overlap they share.
+
+    Each run takes the place of its best-ranked member and keeps the metadata of its
+    first chunk (flagged if any member is). Returns (contexts, number of chunks merged away).
+    """
+    by_position = {}
+    for rank, d in enumerate(contexts):
+        pos = _position(d)
+        if pos is not None:
+            by_position.setdefault(pos, rank)
+
+    runs: List[List[Document]] = []
+    used = set()
+    for rank, d in enumerate(contexts):
+        pos = _position(d)
+        if pos is None:
+            runs.append([d])
+            continue
+        if pos in used:
+            # Part of a better-ranked run, or the same chunk retrieved twice.
+            continue
+
+        source, page, index = pos
+        first = last = index
+        while (source, page, first - 1) in by_position:
+            first -= 1
+        while (source, page, last + 1) in by_position:
+            last += 1
+        run = [(source, page, i) for i in range(first, last + 1)]
+        used.update(run)
+        runs.append([contexts[by_position[p]] for p in run])
+
+    merged: List[Document] = []
+    merged_away = len(contexts) - sum(len(run) for run in runs)
+    for run in runs:
+        if len(run) == 1:
+            merged.append(run[0])
+            continue
+        text = run[0].page_content
+        for d in run[1:]:
+            text = strip_overlap(text, d.page_content)
+        metadata = dict(run[0].metadata)
+        if any(is_flagged(d) for d in run):
+            metadata[INJECTION_FLAG] = True
+        merged.append(Document(page_content=text, metadata=metadata))
+        merged_away += len(run) - 1
+    return merged, merged_away
+
+
+def _truncate(text: str, budget: int, model: str) -> str:
+    """
+    Cuts `text` at a word boundary so that it fits in `budget` tokens.
+    """
+    tokens = count_tokens(text, model)
+    while text and tokens > budget:
+        cut = max(1, min(len(text) - 1, int(len(text) * budget / tokens)))
+        space = text.rfind(" ", 0, cut)
+        text = text[:space if space > 0 else cut].rstrip()
+        tokens = count_tokens(text, model)
+    return text
+
+
+def pack_contexts(
+    contexts: List[Document],
+    token_budget: Optional[int] = DEFAULT_CONTEXT_TOKEN_BUDGET,
+    model: str = DEFAULT_LLM_MODEL,
+) -> PackedContexts:
+    """
+    Prepares gated contexts (best first) for build_user_msg.
+
+    Adjacent chunks are merged without their overlap, then contexts are taken in score
+    order while they fit in `token_budget`; one that does not fit is skipped so a
+    smaller, lower-ranked one can still be used. The best context is always kept,
+    truncated to the budget if it alone exceeds it. token_budget=None disables the cap.
+    """
+    tokens_before = sum(count_tokens(d.page_content, model) for d in contexts)
+    merged, merged_away = merge_adjacent(contexts)
+
+    packed: List[Document] = []
+    used = dropped = 0
+    truncated = False
+    for d in merged:
+        tokens = count_tokens(d.page_content, model)
+        if token_budget is not None and used + tokens > token_budget:
+            if packed:
+                dropped += 1
+                continue
+            d = Document(page_content=_truncate(d.page_content, token_budget, model), metadata=d.metadata)
+            tokens = count_tokens(d.page_content, model)
+            truncated = True
+        packed.append(d)
+        used += tokens
+
+    return PackedContexts(
+        contexts=packed,
+        tokens_before=tokens_before,
+        tokens_after=used,
+        merged=merged_away,
+        dropped=dropped,
+        truncated=truncated,
+    )
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import json
+import os
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_FILENAME = "docstore.npz"
+DOCSTORE_VERSION = 1
+
+# Sentinels in the typed page / chunk_index columns.
+_NONE = -1
+_MISSING = -2
+_ABSENT = object()
+
+
+def _fits_column(value: Any) -> bool:
+    if value is None:
+        return True
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool) and 0 <= value < 2**31
+
+
+def _blob(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    UTF-8 strings as one uint8 array plus int64 byte offsets (n + 1 entries).
+    """
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unblob(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    data = blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+class CompactDocstore(Docstore, AddableMixin):
+    """
+    Read-optimized docstore for chunk Documents.
+
+    Chunk text lives in one UTF-8 blob with an offsets array; sources are interned into
+    a table, with the metadata shared by all chunks of a source (PDF producer, title, ...)
+    stored once per source; page and chunk_index are int32 columns. Documents are only
+    built when `search` returns them.
+
+    Additions and deletions (incremental index updates) are kept in an overlay until
+    the store is saved again.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[str] = (),
+        text: Optional[np.ndarray] = None,
+        text_offsets: Optional[np.ndarray] = None,
+        source: Optional[np.ndarray] = None,
+        page: Optional[np.ndarray] = None,
+        chunk_index: Optional[np.ndarray] = None,
+        extra: Optional[np.ndarray] = None,
+        sources: Sequence[str] = (),
+        source_metadata: Sequence[Dict[str, Any]] = (),
+        extras: Sequence[Dict[str, Any]] = (),
+    ):
+        n = len(ids)
+        self._ids = list(ids)
+        self._text = text if text is not None else np.empty(0, dtype=np.uint8)
+        self._text_offsets = text_offsets if text_offsets is not None else np.zeros(1, dtype=np.int64)
+        self._source = source if source is not None else np.empty(n, dtype=np.int32)
+        self._page = page if page is not None else np.empty(n, dtype=np.int32)
+        self._chunk_index = chunk_index if chunk_index is not None else np.empty(n, dtype=np.int32)
+        self._extra = extra if extra is not None else np.empty(n, dtype=np.int32)
+        self._sources = list(sources)
+        self._source_metadata = list(source_metadata)
+        self._extras = list(extras)
+
+        self._rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._deleted: Set[int] = set()
+        self._added: Dict[str, Document] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows) - len(self._deleted) + len(self._added)
+
+    def __contains__(self, doc_id: object) -> bool:
+        if doc_id in self._added:
+            return True
+        row = self._rows.get(doc_id)  # type: ignore[arg-type]
+        return row is not None and row not in self._deleted
+
+    def _row(self, doc_id: str) -> Optional[int]:
+        row = self._rows.get(doc_id)
+        return None if row is None or row in self._deleted else row
+
+    def _document(self, row: int) -> Document:
+        start, end = self._text_offsets[row], self._text_offsets[row + 1]
+        text = self._text[start:end].tobytes().decode("utf-8")
+
+        src = int(self._source[row])
+        metadata: Dict[str, Any] = dict(self._source_metadata[src]) if src >= 0 else {}
+        if self._extra[row] >= 0:
+            metadata.update(self._extras[self._extra[row]])
+        if src >= 0:
+            metadata["source"] = self._sources[src]
+        for key, column in (("page", self._page), ("chunk_index", self._chunk_index)):
+            value = int(column[row])
+            if value != _MISSING:
+                metadata[key] = None if value == _NONE else value
+        return Document(id=self._ids[row], page_content=text, metadata=metadata)
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self._added.get(search)
+        if doc is not None:
+            return doc
+        row = self._row(search)
+        if row is None:
+            return f"ID {search} not found."
+        return self._document(row)
+
+    def source(self, doc_id: str) -> Optional[str]:
+        """
+        The chunk's source name without building its Document.
+        """
+        doc = self._added.get(doc_id)
+        if doc is not None:
+            src = doc.metadata.get("source")
+            return None if src is None else str(src)
+        row = self._row(doc_id)
+        if row is None or self._source[row] < 0:
+            return None
+        return self._sources[self._source[row]]
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [doc_id for doc_id in texts if doc_id in self]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+
+    def delete(self, ids: List) -> None:
+        missing = [doc_id for doc_id in ids if doc_id not in self]
+        if missing:
+            raise ValueError(f"Tried to delete ids that do not exist: {missing}")
+        for doc_id in ids:
+            if self._added.pop(doc_id, None) is None:
+                self._deleted.add(self._rows[doc_id])
+
+    @classmethod
+    def from_documents(cls, ids: Sequence[str], docs: Sequence[Document]) -> "CompactDocstore":
+        """
+        Packs Documents into the compact layout (row i = ids[i]).
+        """
+        sources: Dict[str, int] = {}
+        shared: List[Optional[Dict[str, Any]]] = []
+        source = np.full(len(docs), _NONE, dtype=np.int32)
+        page = np.full(len(docs), _MISSING, dtype=np.int32)
+        chunk_index = np.full(len(docs), _MISSING, dtype=np.int32)
+
+        rest: List[Dict[str, Any]] = []
+        for row, doc in enumerate(docs):
+            metadata = dict(doc.metadata or {})
+            src = metadata.get("source")
+            if isinstance(src, str):
+                del metadata["source"]
+                source[row] = code = sources.setdefault(src, len(sources))
+                if code == len(shared):
+                    shared.append(None)
+            for key, column in (("page", page), ("chunk_index", chunk_index)):
+                # Anything else (negative, non-int) stays in the per-chunk extras.
+                if key in metadata and _fits_column(metadata[key]):
+                    value = metadata.pop(key)
+                    column[row] = _NONE if value is None else int(value)
+            rest.append(metadata)
+
+            # Metadata shared by every chunk of the source: intersect as rows arrive.
+            if source[row] >= 0:
+                common = shared[source[row]]
+                if common is None:
+                    shared[source[row]] = dict(metadata)
+                else:
+                    for key in [k for k, v in common.items() if metadata.get(k, _ABSENT) != v]:
+                        del common[key]
+
+        extras: Dict[str, int] = {}
+        extra = np.full(len(docs), _NONE, dtype=np.int32)
+        for row, metadata in enumerate(rest):
+            common = shared[source[row]] if source[row] >= 0 else None
+            own = {k: v for k, v in metadata.items() if common is None or k not in common}
+            if own:
+                key = json.dumps(own, sort_keys=True)
+                extra[row] = extras.setdefault(key, len(extras))
+
+        text, text_offsets = _blob([d.page_content for d in docs])
+        return cls(
+            ids=ids,
+            text=text,
+            text_offsets=text_offsets,
+            source=source,
+            page=page,
+            chunk_index=chunk_index,
+            extra=extra,
+            sources=list(sources),
+            source_metadata=[s or {} for s in shared],
+            extras=[json.loads(e) for e in extras],
+        )
+
+    def save(self, index_dir: str, index_to_docstore_id: Dict[int, str]) -> None:
+        """
+        Writes the store (overlay included) as docstore.npz, rows in FAISS position order.
+        The file is written next to its target and renamed into place.
+        """
+        positions = np.asarray(sorted(index_to_docstore_id), dtype=np.int64)
+        ids = [index_to_docstore_id[int(p)] for p in positions]
+        packed = self if self._is_packed(ids) else CompactDocstore.from_documents(ids, _documents(self, ids))
+        packed._write(Path(index_dir) / DOCSTORE_FILENAME, positions)
+
+    def _is_packed(self, ids: Sequence[str]) -> bool:
+        return not self._added and not self._deleted and ids == self._ids
+
+    def _write(self, path: Path, positions: np.ndarray) -> None:
+        ids, id_offsets = _blob(self._ids)
+        meta = json.dumps({
+            "version": DOCSTORE_VERSION,
+            "sources": self._sources,
+            "source_metadata": self._source_metadata,
+            "extras": self._extras,
+        })
+        tmp = path.with_name(path.name + ".tmp.npz")
+        # Uncompressed, so the text blob can be memory-mapped in place on load.
+        np.savez(
+            tmp,
+            meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8),
+            positions=positions,
+            ids=ids,
+            id_offsets=id_offsets,
+            text=self._text,
+            text_offsets=self._text_offsets,
+            source=self._source,
+            page=self._page,
+            chunk_index=self._chunk_index,
+            extra=self._extra,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = False) -> Optional[Tuple["CompactDocstore", Dict[int, str]]]:
+        """
+        Reads docstore.npz; returns (docstore, index_to_docstore_id), or None if there is none.
+        With mmap=True the text blob is memory-mapped read-only instead of read into memory.
+        """
+        path = Path(index_dir) / DOCSTORE_FILENAME
+        if not path.exists():
+            return None
+
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            if meta.get("version") != DOCSTORE_VERSION:
+                raise ValueError(f"Unsupported docstore version {meta.get('version')} in {path}")
+            ids = _unblob(data["ids"], data["id_offsets"])
+            arrays = {
+                key: data[key]
+                for key in ("positions", "text_offsets", "source", "page", "chunk_index", "extra")
+            }
+            text = _mmap_member(path, "text") if mmap else data["text"]
+
+        store = cls(
+            ids=ids,
+            text=text,
+            text_offsets=arrays["text_offsets"],
+            source=arrays["source"],
+            page=arrays["page"],
+            chunk_index=arrays["chunk_index"],
+            extra=arrays["extra"],
+            sources=meta["sources"],
+            source_metadata=meta["source_metadata"],
+            extras=meta["extras"],
+        )
+        mapping = {int(p): doc_id for p, doc_id in zip(arrays["positions"], ids)}
+        return store, mapping
+
+
+def _documents(docstore: Docstore, ids: Sequence[str]) -> List[Document]:
+    docs = []
+    for doc_id in ids:
+        doc = docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            raise ValueError(f"Document {doc_id!r} is missing from the docstore")
+        docs.append(doc)
+    return docs
+
+
+def _mmap_member(path: Path, name: str) -> np.ndarray:
+    """
+    Memory-maps one array stored uncompressed inside an .npz file.
+    """
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name + ".npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{name} is compressed in {path}; cannot memory-map it")
+
+    with open(path, "rb") as f:
+        # Local file header: 30 fixed bytes, then the file name and extra field.
+        f.seek(info.header_offset)
+        header = f.read(30)
+        start = info.header_offset + 30 + int.from_bytes(header[26:28], "little") + int.from_bytes(header[28:30], "little")
+        f.seek(start)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    if fortran_order or len(shape) != 1:
+        raise ValueError(f"{name} in {path} is not a flat array")
+    if shape[0] == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+
+def save_docstore(docstore: Docstore, index_to_docstore_id: Dict[int, str], index_dir: str) -> None:
+    """
+    Saves any FAISS docstore (e.g. an InMemoryDocstore) in the compact format.
+    """
+    if isinstance(docstore, CompactDocstore):
+        docstore.save(index_dir, index_to_docstore_id)
+        return
+    positions = sorted(index_to_docstore_id)
+    ids = [index_to_docstore_id[p] for p in positions]
+    CompactDocstore.from_documents(ids, _documents(docstore, ids))._write(
+        Path(index_dir) / DOCSTORE_FILENAME,
+        np.asarray(positions, dtype=np.int64),
+    )
+
+
+def load_docstore(index_dir: str, mmap: bool = False) -> Optional[Tuple[CompactDocstore, Dict[int, str]]]:
+    return CompactDocstore.load(index_dir, mmap=mmap)
@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from rag.config import (
+    DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES,
+    DEFAULT_QUERY_CACHE_MAX_ENTRIES,
+    DEFAULT_QUERY_CACHE_MAX_BYTES,
+    DEFAULT_QUERY_CACHE_TTL_SECONDS,
+)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses whitespace so re-chunked but otherwise identical text maps to the same key.
+    """
+    return " ".join((text or "").split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """
+    Cache key for a chunk: (embedding model, normalized chunk text) hashed with SHA-256.
+    """
+    payload = f"{model}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent on-disk embedding cache backed by SQLite.
+
+    Vectors are stored as float32 blobs. When the cache grows past `max_entries`,
+    the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Looks up cached vectors; returns None for every text that is not cached.
+        """
+        keys = [cache_key(model, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for r in results if r is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+
+        return results
+
+    def put_many(
+        self,
+        model: str,
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+    ) -> None:
+        """
+        Stores vectors for the given texts and evicts old entries if over capacity.
+        """
+        now = time.time()
+        rows = [
+            (cache_key(model, t), model, array("f", v).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self.evictions += excess
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return int(count)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe in-memory LRU cache of query embeddings with a TTL.
+
+    Keyed on (embedding model, normalized query text). Vectors are kept as float32
+    arrays and the cache is bounded both by entry count and by total vector bytes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_QUERY_CACHE_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_QUERY_CACHE_MAX_BYTES,
+        ttl_seconds: Optional[float] = DEFAULT_QUERY_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[array, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = (model, normalize_text(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            vec, stored_at = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove_locked(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vec.tolist()
+
+    def put(self, model: str, text: str, vector: Sequence[float]) -> None:
+        key = (model, normalize_text(text))
+        vec = array("f", vector)
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = (vec, time.monotonic())
+            self._bytes += vec.itemsize * len(vec)
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self.evictions += 1
+
+    def _remove_locked(self, key: Tuple[str, str]) -> None:
+        vec, _ = self._entries.pop(key)
+        self._bytes -= vec.itemsize * len(vec)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_embedding_caches: Dict[Tuple[str, int], EmbeddingCache] = {}
+_embedding_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(
+    path: str,
+    max_entries: int = DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES,
+) -> EmbeddingCache:
+    """
+    Process-wide EmbeddingCache per file, so callers share one SQLite connection
+    (entries are keyed by model, so every model shares it too).
+    """
+    key = (str(Path(path).resolve()), max_entries)
+    with _embedding_caches_lock:
+        cache = _embedding_caches.get(key)
+        if cache is None:
+            cache = EmbeddingCache(path, max_entries=max_entries)
+            _embedding_caches[key] = cache
+        return cache
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    """
+    Process-wide query embedding cache shared by every session and vectorstore.
+    """
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache()
+        return _query_cache
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings client so repeated work is served from caches.
+
+    Document embeddings come from the persistent EmbeddingCache, so only chunks that
+    were never embedded with this model are sent to the wrapped client.
+    Query embeddings come from the in-memory QueryEmbeddingCache when one is given.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: EmbeddingCache,
+        model: str,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+        self.query_cache = query_cache
+
+    def for_build(self) -> "CachedEmbeddings":
+        """
+        The same caches in front of the wrapped client's index build variant, if it has one.
+        """
+        for_build = getattr(self.embeddings, "for_build", None)
+        embeddings = for_build() if for_build is not None else self.embeddings
+        return CachedEmbeddings(embeddings, self.cache, self.model, self.query_cache)
+
+    def _missing(self, texts: List[str], cached: List[Optional[List[float]]]) -> List[str]:
+        missing = [t for t, v in zip(texts, cached) if v is None]
+        return list(dict.fromkeys(missing))
+
+    def _merge(
+        self,
+        texts: List[str],
+        cached: List[Optional[List[float]]],
+        missing: List[str],
+        fresh: List[List[float]],
+    ) -> List[List[float]]:
+        by_text = dict(zip(missing, fresh))
+        return [v if v is not None else by_text[t] for t, v in zip(texts, cached)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        cached = self.cache.get_many(self.model, texts)
+        missing = self._missing(texts, cached)
+
+        fresh: List[List[float]] = []
+        if missing:
+            fresh = self.embeddings.embed_documents(missing)
+            self.cache.put_many(self.model, missing, fresh)
+
+        return self._merge(texts, cached, missing, fresh)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        cached = self.cache.get_many(self.model, texts)
+        missing = self._missing(texts, cached)
+
+        fresh: List[List[float]] = []
+        if missing:
+            fresh = await self.embeddings.aembed_documents(missing)
+            self.cache.put_many(self.model, missing, fresh)
+
+        return self._merge(texts, cached, missing, fresh)
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_cache is None:
+            return self.embeddings.embed_query(text)
+
+        vec = self.query_cache.get(self.model, text)
+        if vec is None:
+            vec = self.embeddings.embed_query(text)
+            self.query_cache.put(self.model, text, vec)
+        return vec
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds many queries; query-cache misses go to the wrapped client as one batch.
+        OpenAI embeddings are symmetric, so a batched document embedding equals embed_query.
+        """
+        texts = list(texts)
+        if self.query_cache is None:
+            return self.embeddings.embed_documents(texts) if texts else []
+
+        cached = [self.query_cache.get(self.model, t) for t in texts]
+        missing = self._missing(texts, cached)
+
+        fresh: List[List[float]] = []
+        if missing:
+            fresh = self.embeddings.embed_documents(missing)
+            for t, v in zip(missing, fresh):
+                self.query_cache.put(self.model, t, v)
+
+        return self._merge(texts, cached, missing, fresh)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.query_cache is None:
+            return await self.embeddings.aembed_query(text)
+
+        vec = self.query_cache.get(self.model, text)
+        if vec is None:
+            vec = await self.embeddings.aembed_query(text)
+            self.query_cache.put(self.model, text, vec)
+        return vec
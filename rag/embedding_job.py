@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import httpx
+import openai
+from langchain_core.embeddings import Embeddings
+
+from rag.clients import RETRY_STATUS_CODES, retry_delay
+from rag.config import DEFAULT_EMBED_BATCH_SIZE, DEFAULT_EMBED_CONCURRENCY, DEFAULT_EMBED_MAX_ATTEMPTS
+from rag.embedding_cache import cache_key
+
+
+class EmbeddingCheckpoint:
+    """
+    Vectors of the embedding batches a build has completed, in SQLite, keyed like the
+    embedding cache on (model, normalized text). Every batch is committed as it finishes,
+    so a build that crashes or gives up resumes from here; remove the file once the index is saved.
+
+    Unlike the embedding cache it is never evicted and only lives as long as one build.
+    """
+
+    def __init__(self, path: str, model: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model = model
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        keys = [cache_key(self.model, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+        return [found.get(key) for key in keys]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        rows = [(cache_key(self.model, t), array("f", v).tobytes()) for t, v in zip(texts, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO vectors (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()
+        return int(count)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class AdaptiveLimit:
+    """
+    AIMD window of requests in flight: a rate limit halves it and pauses new requests
+    for the server's Retry-After (or a jittered backoff); a window's worth of successes
+    in a row grows it by one, up to `maximum`.
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum = max(1, maximum)
+        self.limit = self.maximum
+        self.in_flight = 0
+        self.peak = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                wait_s = self._paused_until - time.monotonic()
+                if wait_s <= 0 and self.in_flight < self.limit:
+                    break
+                self._cond.wait(timeout=wait_s if wait_s > 0 else None)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+            self._cond.notify_all()
+
+    def release_rate_limited(self, pause_seconds: float) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._successes = 0
+            self.limit = max(1, self.limit // 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause_seconds)
+            self._cond.notify_all()
+
+    def release_failed(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._successes = 0
+            self._cond.notify_all()
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_transient(exc: BaseException) -> bool:
+    return _status_code(exc) in RETRY_STATUS_CODES or isinstance(
+        exc, (openai.APIConnectionError, httpx.TransportError)
+    )
+
+
+@dataclass
+class EmbeddingJobStats:
+    texts: int = 0
+    resumed: int = 0
+    embedded: int = 0
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    peak_concurrency: int = 0
+    concurrency: int = 0
+    seconds: float = 0.0
+
+    @property
+    def vectors_per_second(self) -> float:
+        return self.embedded / self.seconds if self.seconds > 0 else 0.0
+
+    def report(self) -> str:
+        return (
+            f"texts={self.texts} embedded={self.embedded} resumed={self.resumed} "
+            f"requests={self.requests} retries={self.retries} rate_limited={self.rate_limited} "
+            f"concurrency={self.concurrency} (peak {self.peak_concurrency}) "
+            f"{self.vectors_per_second:.1f} vectors/s"
+        )
+
+
+class EmbeddingJob:
+    """
+    Embeds a corpus in batches of `batch_size` texts with up to `concurrency` requests
+    in flight (see AdaptiveLimit).
+
+    Rate limits, 5xx and connection errors are retried per batch, `max_attempts` times
+    in all; any other error, or a batch out of attempts, stops the job and is raised once
+    the batches in flight are done. Completed batches are saved to `checkpoint` (if any)
+    as they finish and texts found there are not sent again, so rerunning a failed job
+    resumes it. Stats accumulate over run() calls; `progress` gets them after every
+    completed batch, from the thread that ran it.
+
+    Since the job owns the retries, it embeds through the build variant of `embeddings`
+    (`for_build()`, when they have one): for the OpenAI backend, a client without transport
+    retries and with its own concurrency limit (see ClientRegistry).
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+        concurrency: int = DEFAULT_EMBED_CONCURRENCY,
+        max_attempts: int = DEFAULT_EMBED_MAX_ATTEMPTS,
+        checkpoint: Optional[EmbeddingCheckpoint] = None,
+        progress: Optional[Callable[[EmbeddingJobStats], None]] = None,
+    ):
+        for_build = getattr(embeddings, "for_build", None)
+        self.embeddings = for_build() if for_build is not None else embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.stats = EmbeddingJobStats(concurrency=max(1, concurrency))
+
+        self._limit = AdaptiveLimit(concurrency)
+        self._lock = threading.Lock()
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            self._limit.acquire()
+            self._count(requests=1)
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as exc:
+                delay = retry_delay(getattr(exc, "response", None), attempt)
+                rate_limited = _status_code(exc) == 429
+                if rate_limited:
+                    self._limit.release_rate_limited(delay)
+                    self._count(rate_limited=1)
+                else:
+                    self._limit.release_failed()
+                attempt += 1
+                if not _is_transient(exc) or attempt >= self.max_attempts:
+                    raise
+                self._count(retries=1)
+                if not rate_limited:
+                    time.sleep(delay)
+                continue
+
+            self._limit.release()
+            if self.checkpoint is not None:
+                self.checkpoint.put_many(texts, vectors)
+            self._count(embedded=len(texts))
+            if self.progress is not None:
+                self.progress(self.stats)
+            return vectors
+
+    def run(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Returns one vector per text, in order.
+        """
+        texts = list(texts)
+        start = time.perf_counter()
+        found: Dict[str, List[float]] = {}
+        resumed = 0
+        if self.checkpoint is not None and texts:
+            for t, v in zip(texts, self.checkpoint.get_many(texts)):
+                if v is not None:
+                    found[t] = v
+                    resumed += 1
+        missing = [t for t in dict.fromkeys(texts) if t not in found]
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+
+        try:
+            if len(batches) == 1 or self._limit.maximum == 1:
+                for batch in batches:
+                    found.update(zip(batch, self._embed_batch(batch)))
+            elif batches:
+                pool = ThreadPoolExecutor(
+                    max_workers=min(self._limit.maximum, len(batches)), thread_name_prefix="rag-embed"
+                )
+                try:
+                    futures = {pool.submit(self._embed_batch, b): i for i, b in enumerate(batches)}
+                    done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                    for f in done:
+                        if f.exception() is not None:
+                            raise f.exception()
+                    for f, i in futures.items():
+                        found.update(zip(batches[i], f.result()))
+                finally:
+                    pool.shutdown(wait=True, cancel_futures=True)
+        finally:
+            with self._lock:
+                self.stats.texts += len(texts)
+                self.stats.resumed += resumed
+                self.stats.seconds += time.perf_counter() - start
+                self.stats.concurrency = self._limit.limit
+                self.stats.peak_concurrency = max(self.stats.peak_concurrency, self._limit.peak)
+
+        return [found[t] for t in texts]
@@ -1,11 +1,136 @@
 from __future__ import annotations
 
-from langchain_openai import OpenAIEmbeddings
-from rag.config import DEFAULT_EMBEDDING_MODEL
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
 
+from langchain_core.embeddings import Embeddings
+from rag.config import (
+    DEFAULT_EMBEDDING_BACKEND,
+    DEFAULT_EMBEDDING_MODEL,
+    DEFAULT_EMBEDDING_CACHE_PATH,
+    DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES,
+)
+from rag.clients import RegistryEmbeddings
+from rag.embedding_cache import CachedEmbeddings, get_embedding_cache, get_query_cache
+# Resumable bulk embedding for index builds.
+from rag.embedding_job import EmbeddingCheckpoint, EmbeddingJob, EmbeddingJobStats
+from rag.local_embeddings import HashingNgramEmbeddings
 
-def get_embeddings(model: str = DEFAULT_EMBEDDING_MODEL) -> OpenAIEmbeddings:
+
+@dataclass(frozen=True)
+class EmbeddingBackend:
+    name: str
+    # Builds the embeddings client for a model name (local backends may ignore it).
+    factory: Callable[[str], Embeddings]
+    # Remote backends sit behind the persistent and query embedding caches;
+    # local ones compute a vector faster than the caches look one up.
+    cached: bool = True
+
+
+_backends: Dict[str, EmbeddingBackend] = {}
+
+
+def register_embedding_backend(backend: EmbeddingBackend) -> None:
+    _backends[backend.name] = backend
+
+
+register_embedding_backend(EmbeddingBackend("openai", RegistryEmbeddings))
+register_embedding_backend(EmbeddingBackend("hashing", lambda model: HashingNgramEmbeddings(), cached=False))
+
+
+def embedding_backends() -> Dict[str, EmbeddingBackend]:
+    return dict(_backends)
+
+
+def _resolve(backend: Optional[str]) -> EmbeddingBackend:
+    name = backend or os.getenv("EMBEDDING_BACKEND") or DEFAULT_EMBEDDING_BACKEND
+    if name not in _backends:
+        raise ValueError(f"Unknown embedding backend {name!r} (known: {', '.join(sorted(_backends))})")
+    return _backends[name]
+
+
+def get_embeddings(model: Optional[str] = None, backend: Optional[str] = None) -> Embeddings:
+    """
+    Embeddings client of `backend` (default: EMBEDDING_BACKEND or DEFAULT_EMBEDDING_BACKEND)
+    for `model` (default: OPENAI_MODEL_EMBEDDINGS or DEFAULT_EMBEDDING_MODEL).
+    The OpenAI backend uses the shared pooled clients from the client registry.
+    """
+    model = model or os.getenv("OPENAI_MODEL_EMBEDDINGS") or DEFAULT_EMBEDDING_MODEL
+    return _resolve(backend).factory(model)
+
+
+def get_cached_embeddings(
+    model: Optional[str] = None,
+    cache_path: str = DEFAULT_EMBEDDING_CACHE_PATH,
+    max_entries: int = DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES,
+    backend: Optional[str] = None,
+) -> Embeddings:
     """
-    OpenAI embeddings client.
+    Embeddings client (see get_embeddings) behind the persistent chunk embedding cache
+    (one shared connection per cache file) and the process-wide query embedding cache;
+    local backends are returned uncached.
     """
-    return OpenAIEmbeddings(model=model)
\ No newline at end of file
+    spec = _resolve(backend)
+    embeddings = get_embeddings(model, spec.name)
+    if not spec.cached:
+        return embeddings
+
+    return CachedEmbeddings(
+        embeddings,
+        get_embedding_cache(cache_path, max_entries),
+        model=embeddings.model,
+        query_cache=get_query_cache(),
+    )
+
+
+class EmbeddingMismatchError(ValueError):
+    """
+    A saved index does not match the configured embeddings.
+    """
+
+
+def _unwrap(embeddings: Embeddings) -> Embeddings:
+    # CachedEmbeddings (and similar wrappers) keep the client they wrap in `.embeddings`.
+    while isinstance(getattr(embeddings, "embeddings", None), Embeddings):
+        embeddings = embeddings.embeddings
+    return embeddings
+
+
+def embedding_info(embeddings: Embeddings, dim: int) -> Dict[str, Any]:
+    """
+    What an index records about the embeddings it was built with.
+    """
+    inner = _unwrap(embeddings)
+    return {
+        "backend": getattr(inner, "backend", type(inner).__name__),
+        "model": getattr(embeddings, "model", None),
+        "dim": int(dim),
+    }
+
+
+def check_embeddings(manifest: Dict[str, Any], embeddings: Embeddings, dim: int, index_dir: str) -> None:
+    """
+    Raises EmbeddingMismatchError when the index in `index_dir` was built with another
+    embedding backend or model, or its vectors do not have the dimension `embeddings` produce:
+    searching it would silently return unrelated chunks.
+    """
+    saved = dict(manifest.get("embeddings") or {})
+    saved.setdefault("model", manifest.get("embedding_model"))
+    saved.setdefault("dim", int(dim))
+    current = embedding_info(embeddings, dim)
+    expected_dim = getattr(_unwrap(embeddings), "dim", None)
+
+    if (
+        saved.get("backend", current["backend"]) != current["backend"]
+        or saved["model"] != current["model"]
+        or saved["dim"] != int(dim)
+        or (expected_dim is not None and expected_dim != int(dim))
+    ):
+        built = f"{saved['backend']}/{saved['model']}" if saved.get("backend") else str(saved["model"])
+        configured = f"{current['backend']}/{current['model']}" + (f" ({expected_dim}-d)" if expected_dim else "")
+        raise EmbeddingMismatchError(
+            f"The index in {index_dir} was built with {built} embeddings ({saved['dim']}-d), but the "
+            f"configured ones are {configured}. Rebuild the index (python -m rag.ingest) or set "
+            f"EMBEDDING_BACKEND / OPENAI_MODEL_EMBEDDINGS to match it."
+        )
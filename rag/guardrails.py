@@ -1,3 +1,11 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+from langchain_core.documents import Document
+
 INJECTION_PATTERNS = [
     "ignore previous instructions",
     "ignore the system message",
@@ -8,10 +16,128 @@ INJECTION_PATTERNS = [
     "assistant:",
 ]
 
+# Document text is scanned with narrower patterns: "act as" and a role word followed by a colon
+# are ordinary prose ("ethical concerns that act as barriers", "CAD system: usefulness").
+CHUNK_INJECTION_PATTERNS = [
+    "ignore previous instructions",
+    "ignore the system message",
+    "disregard previous instructions",
+    "you are now",
+]
+# Chat role markers, flagged in document text only at the start of a line.
+CHUNK_ROLE_MARKERS = [
+    "system:",
+    "assistant:",
+]
+
+# Chunk metadata key set at ingest time: True if the chunk text matches CHUNK_INJECTION_PATTERNS
+# or starts a line with one of CHUNK_ROLE_MARKERS.
+INJECTION_FLAG = "injection"
+
+# Invisible format characters (soft hyphen, zero-width space/joiners, bidi controls, BOM)
+# that can split a pattern without changing how the text looks.
+_INVISIBLE = re.compile("[\u00ad\u180e\u200b-\u200f\u202a-\u202e\u2060-\u2064\u2066-\u2069\ufeff]")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form for matching: NFKC (full-width and other compatibility forms),
+    case-folded, invisible characters removed and whitespace runs collapsed to one space.
+    """
+    text = text or ""
+    if text.isascii():
+        # ASCII is already NFKC and has no invisible characters.
+        return " ".join(text.lower().split())
+    text = unicodedata.normalize("NFKC", text)
+    text = _INVISIBLE.sub("", text).casefold()
+    return " ".join(text.split())
+
+
+def _trie_regex(patterns: Iterable[str]) -> str:
+    """
+    One regex for all patterns, factored by common prefixes, so each text position
+    is tested against a few characters instead of every pattern.
+    """
+    trie: Dict[str, dict] = {}
+    for p in patterns:
+        node = trie
+        for ch in p:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        alternatives = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class GuardrailScanner:
+    """
+    Single-pass matcher for a list of phrases over normalized text.
+
+    Patterns are normalized like the text and must start at a word boundary
+    ("act as" does not match "react as"). With `line_start=True` they must start a line
+    (after leading whitespace); each line is normalized on its own.
+    """
+
+    def __init__(self, patterns: Iterable[str], line_start: bool = False):
+        self.patterns: List[str] = sorted({normalize_text(p).strip() for p in patterns if p and p.strip()})
+        self.line_start = line_start
+        prefix = r"^" if line_start else r"(?<!\w)"
+        self._regex = re.compile(prefix + _trie_regex(self.patterns), re.MULTILINE) if self.patterns else None
+
+    def search(self, text: str) -> Optional[str]:
+        """
+        The first pattern found in `text` (normalized), or None.
+        """
+        if self._regex is None:
+            return None
+        if self.line_start:
+            normalized = "\n".join(normalize_text(line) for line in (text or "").splitlines())
+        else:
+            normalized = normalize_text(text)
+        m = self._regex.search(normalized)
+        return m.group(0) if m else None
+
+    def matches(self, text: str) -> bool:
+        return self.search(text) is not None
+
+
+_scanner = GuardrailScanner(INJECTION_PATTERNS)
+_chunk_scanner = GuardrailScanner(CHUNK_INJECTION_PATTERNS)
+_chunk_role_scanner = GuardrailScanner(CHUNK_ROLE_MARKERS, line_start=True)
+
+
 def is_prompt_injection(text: str) -> bool:
     """
     Detects simple prompt-injection attempts in user input.
     This is a lightweight guardrail for demo purposes.
     """
-    t = text.lower()
-    return any(p in t for p in INJECTION_PATTERNS)
+    return _scanner.matches(text)
+
+
+def is_chunk_injection(text: str) -> bool:
+    """
+    Detects instructions aimed at the model in document text (see CHUNK_INJECTION_PATTERNS).
+    """
+    return _chunk_scanner.matches(text) or _chunk_role_scanner.matches(text)
+
+
+def flag_injections(chunks: List[Document]) -> int:
+    """
+    Scans each chunk once and stores the result under INJECTION_FLAG in its metadata,
+    so retrieval can drop or mark flagged chunks without rescanning. Returns the number flagged.
+    """
+    flagged = 0
+    for c in chunks:
+        c.metadata[INJECTION_FLAG] = is_chunk_injection(c.page_content)
+        flagged += c.metadata[INJECTION_FLAG]
+    return flagged
+
+
+def is_flagged(doc: Document) -> bool:
+    return bool((doc.metadata or {}).get(INJECTION_FLAG))
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import argparse
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from rag.config import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_EMBED_BATCH_SIZE,
+    DEFAULT_EMBED_CONCURRENCY,
+    DEFAULT_INDEX_DIR,
+    DEFAULT_INDEX_TYPE,
+    DEFAULT_INDEX_SHARDS,
+    DEFAULT_INGEST_WORKERS,
+    DEFAULT_PDF_DIR,
+    DEFAULT_SHARD_BY,
+)
+from rag.ann import INDEX_TYPES, IndexSpec
+from rag.chunking import chunk_documents
+from rag.docstore import CompactDocstore
+from rag.embedding_job import EmbeddingCheckpoint, EmbeddingJob
+from rag.guardrails import flag_injections
+from rag.loaders import clean_text, parse_pdf
+from rag.manifest import chunk_id, file_entry
+
+
+@dataclass
+class IngestStats:
+    total_files: int = 0
+    files: int = 0
+    pages: int = 0
+    chunks: int = 0
+    vectors: int = 0
+    flagged: int = 0
+    embed_requests: int = 0
+    rate_limited: int = 0
+    resumed: int = 0
+    workers: int = 1
+    parse_seconds: float = 0.0
+    chunk_seconds: float = 0.0
+    embed_seconds: float = 0.0
+    index_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @staticmethod
+    def _rate(n: int, seconds: float) -> float:
+        return n / seconds if seconds > 0 else 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        # Parsing runs in parallel; divide the summed worker time by the pool size.
+        return self._rate(self.pages, self.parse_seconds / max(self.workers, 1))
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self._rate(self.chunks, self.chunk_seconds)
+
+    @property
+    def vectors_per_second(self) -> float:
+        return self._rate(self.vectors, self.embed_seconds + self.index_seconds)
+
+    def report(self) -> str:
+        return (
+            f"files={self.files} pages={self.pages} chunks={self.chunks} vectors={self.vectors} "
+            f"flagged={self.flagged}\n"
+            f"parse: {self.pages_per_second:.1f} pages/s ({self.workers} workers)\n"
+            f"chunk: {self.chunks_per_second:.1f} chunks/s\n"
+            f"embed+index: {self.vectors_per_second:.1f} vectors/s "
+            f"(embed {self.embed_seconds:.2f}s, index {self.index_seconds:.2f}s)\n"
+            f"embed requests: {self.embed_requests} ({self.rate_limited} rate-limited), "
+            f"{self.resumed} vectors resumed from checkpoint\n"
+            f"wall: {self.wall_seconds:.2f}s"
+        )
+
+
+@dataclass
+class IngestResult:
+    vectorstore: Optional[FAISS]
+    files: Dict[str, Any] = field(default_factory=dict)
+    stats: IngestStats = field(default_factory=IngestStats)
+    # Sharded builds: stats of each shard (re)built, by shard name.
+    shards: Dict[str, IngestStats] = field(default_factory=dict)
+
+
+def _timed_parse(path: Path) -> Tuple[List[Document], float]:
+    start = time.perf_counter()
+    pages = parse_pdf(path)
+    return pages, time.perf_counter() - start
+
+
+def iter_parsed(
+    paths: List[Path],
+    workers: int = DEFAULT_INGEST_WORKERS,
+) -> Iterator[Tuple[Path, List[Document], float]]:
+    """
+    Parses PDFs in a process pool and yields (path, pages, parse_seconds) in input order.
+    At most 2 * workers files are in flight, so parsed pages never pile up in memory.
+    """
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            pages, seconds = _timed_parse(path)
+            yield path, pages, seconds
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Tuple[Path, Future]] = deque()
+        queue = iter(paths)
+
+        for path in queue:
+            pending.append((path, pool.submit(_timed_parse, path)))
+            if len(pending) >= 2 * workers:
+                break
+
+        while pending:
+            path, fut = pending.popleft()
+            nxt = next(queue, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(_timed_parse, nxt)))
+
+            pages, seconds = fut.result()
+            yield path, pages, seconds
+
+
+def iter_chunks(
+    parsed: Iterator[Tuple[Path, List[Document], float]],
+    stats: IngestStats,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+) -> Iterator[Tuple[Path, int, List[Document], List[str]]]:
+    """
+    Cleans and chunks pages one file at a time, flagging chunks that look like prompt injection.
+    Yields (path, page_count, chunks, chunk_ids).
+    """
+    for path, pages, parse_seconds in parsed:
+        stats.parse_seconds += parse_seconds
+
+        start = time.perf_counter()
+        for d in pages:
+            d.page_content = clean_text(d.page_content)
+        chunks = chunk_documents(pages, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        stats.flagged += flag_injections(chunks)
+        ids = [chunk_id(path.name, c.metadata["chunk_index"]) for c in chunks]
+        stats.chunk_seconds += time.perf_counter() - start
+
+        stats.files += 1
+        stats.pages += len(pages)
+        stats.chunks += len(chunks)
+        yield path, len(pages), chunks, ids
+
+
+def ingest_pdfs(
+    paths: List[Path],
+    embeddings: Embeddings,
+    vectorstore: Optional[FAISS] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    workers: int = DEFAULT_INGEST_WORKERS,
+    batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    embed_concurrency: int = DEFAULT_EMBED_CONCURRENCY,
+    checkpoint: Optional[EmbeddingCheckpoint] = None,
+) -> IngestResult:
+    """
+    Streams PDFs through parse -> clean -> chunk -> embed -> index.
+
+    Chunks are embedded by an EmbeddingJob in requests of `batch_size`, up to `embed_concurrency`
+    at once, and inserted `batch_size * embed_concurrency` at a time, so peak memory depends on
+    those and the worker count rather than on the corpus size. Vectors found in `checkpoint`
+    are not embedded again and new ones are saved to it (see EmbeddingCheckpoint).
+    If `vectorstore` is given, chunks are added to it; otherwise a new one is created.
+    `progress` is called with the running stats after every file and embedding batch.
+    """
+    stats = IngestStats(total_files=len(paths), workers=max(1, min(workers, len(paths))))
+    job = EmbeddingJob(embeddings, batch_size=batch_size, concurrency=embed_concurrency, checkpoint=checkpoint)
+    files: Dict[str, Any] = {}
+    vs = vectorstore
+    batch: List[Document] = []
+    batch_ids: List[str] = []
+
+    def flush() -> None:
+        nonlocal vs
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        try:
+            vectors = job.run([d.page_content for d in batch])
+        finally:
+            stats.embed_seconds += time.perf_counter() - start
+            stats.embed_requests = job.stats.requests
+            stats.rate_limited = job.stats.rate_limited
+            stats.resumed = job.stats.resumed
+
+        start = time.perf_counter()
+        text_embeddings = [(d.page_content, v) for d, v in zip(batch, vectors)]
+        metadatas = [d.metadata for d in batch]
+        if vs is None:
+            vs = FAISS.from_embeddings(
+                text_embeddings,
+                embeddings,
+                metadatas=metadatas,
+                ids=list(batch_ids),
+                docstore=CompactDocstore(),
+            )
+        else:
+            vs.add_embeddings(text_embeddings, metadatas=metadatas, ids=list(batch_ids))
+        stats.index_seconds += time.perf_counter() - start
+
+        stats.vectors += len(batch)
+        batch.clear()
+        batch_ids.clear()
+        if progress is not None:
+            progress(stats)
+
+    wall_start = time.perf_counter()
+    parsed = iter_parsed(paths, workers=workers)
+    for path, page_count, chunks, ids in iter_chunks(parsed, stats, chunk_size, chunk_overlap):
+        files[path.name] = file_entry(path, page_count, ids)
+        if progress is not None:
+            progress(stats)
+        for c, cid in zip(chunks, ids):
+            batch.append(c)
+            batch_ids.append(cid)
+            if len(batch) >= batch_size * max(1, embed_concurrency):
+                flush()
+    flush()
+    stats.wall_seconds = time.perf_counter() - wall_start
+
+    return IngestResult(vectorstore=vs, files=files, stats=stats)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m rag.ingest",
+        description="Build or update the FAISS index from the PDF folder.",
+    )
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--update", action="store_true", help="only re-index added/changed/removed PDFs")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_CHUNK_OVERLAP)
+    parser.add_argument("--workers", type=int, default=DEFAULT_INGEST_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_EMBED_BATCH_SIZE, help="texts per embedding request")
+    parser.add_argument(
+        "--embed-concurrency", type=int, default=DEFAULT_EMBED_CONCURRENCY, help="embedding requests in flight",
+    )
+    parser.add_argument(
+        "--embedding-backend", help="embedding backend, e.g. openai or hashing (default: EMBEDDING_BACKEND or config)",
+    )
+    parser.add_argument(
+        "--index-type", choices=INDEX_TYPES,
+        help=f"FAISS index type (default: the saved one with --update, else {DEFAULT_INDEX_TYPE})",
+    )
+    parser.add_argument("--shards", type=int, default=DEFAULT_INDEX_SHARDS, help="build N shards (0 = one index)")
+    parser.add_argument("--shard-by", choices=["hash", "source"], default=DEFAULT_SHARD_BY)
+    parser.add_argument(
+        "--rebuild-shard", action="append", metavar="NAME",
+        help="re-index only this shard of a sharded index (repeatable)",
+    )
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from rag.embeddings import get_cached_embeddings
+    from rag.shards import build_sharded, is_sharded, rebuild_shards, update_sharded
+    from rag.vectorstore import build_vectorstore, update_vectorstore
+
+    load_dotenv()
+    common = dict(
+        pdf_dir=args.pdf_dir,
+        index_dir=args.index_dir,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        embed_concurrency=args.embed_concurrency,
+        embeddings=get_cached_embeddings(backend=args.embedding_backend),
+        index_spec=IndexSpec(type=args.index_type) if args.index_type else None,
+    )
+    if args.rebuild_shard:
+        common.pop("index_spec")
+        result = rebuild_shards(args.rebuild_shard, **common)
+    elif args.update:
+        result = (update_sharded if is_sharded(args.index_dir) else update_vectorstore)(**common)
+    elif args.shards > 0:
+        result = build_sharded(shards=args.shards, shard_by=args.shard_by, **common)
+    else:
+        result = build_vectorstore(**common)
+    print(result.stats.report())
+    for name, stats in result.shards.items():
+        print(f"  {name}: files={stats.files} chunks={stats.chunks} wall={stats.wall_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import re
+import threading
+import weakref
+from collections import Counter
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from rag.config import DEFAULT_BM25_B, DEFAULT_BM25_K1
+
+LEXICAL_FILENAME = "lexical.npz"
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+(?:[-'][0-9a-z]+)*")
+
+STOPWORDS = frozenset(
+    """
+    a about above after again against all am an and any are as at be because been before being below
+    between both but by can could did do does doing down during each few for from further had has have
+    having he her here hers herself him himself his how i if in into is it its itself just me more most
+    my myself no nor not now of off on once only or other our ours ourselves out over own same she should
+    so some such than that the their theirs them themselves then there these they this those through to
+    too under until up very was we were what when where which while who whom why will with would you your
+    yours yourself yourselves describe explain list mention mentioned tell give according document documents
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Casefolded word tokens (hyphenated/apostrophe words kept whole) without stopwords.
+    """
+    return [t for t in _TOKEN_RE.findall((text or "").casefold()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over the chunks of a vectorstore.
+
+    Postings are stored CSR-style: for term t, `postings_doc[offsets[t]:offsets[t + 1]]`
+    are the matching chunk positions and `postings_w` their precomputed BM25 term
+    weights (tf saturation and length normalization; idf is applied at query time).
+    """
+
+    def __init__(
+        self,
+        doc_ids: Sequence[str],
+        sources: Sequence[str],
+        vocab: Sequence[str],
+        offsets: np.ndarray,
+        postings_doc: np.ndarray,
+        postings_w: np.ndarray,
+        source_codes: np.ndarray,
+    ):
+        self.doc_ids = list(doc_ids)
+        self.sources = list(sources)
+        self.vocab = list(vocab)
+        self.offsets = offsets
+        self.postings_doc = postings_doc
+        self.postings_w = postings_w
+        self.source_codes = source_codes
+
+        self.term_ids: Dict[str, int] = {t: i for i, t in enumerate(self.vocab)}
+        n = len(self.doc_ids)
+        df = np.diff(self.offsets).astype(np.float64)
+        self.df = df
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self._source_ids = {s.casefold(): i for i, s in enumerate(self.sources)}
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(
+        cls,
+        doc_ids: Sequence[str],
+        texts: Sequence[str],
+        sources: Sequence[str],
+        k1: float = DEFAULT_BM25_K1,
+        b: float = DEFAULT_BM25_B,
+    ) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        source_names: Dict[str, int] = {}
+        term_col: List[int] = []
+        doc_col: List[int] = []
+        tf_col: List[int] = []
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        source_codes = np.zeros(len(texts), dtype=np.int32)
+
+        for pos, (text, src) in enumerate(zip(texts, sources)):
+            tokens = tokenize(text)
+            doc_len[pos] = len(tokens)
+            source_codes[pos] = source_names.setdefault(src, len(source_names))
+            for term, tf in Counter(tokens).items():
+                term_col.append(vocab.setdefault(term, len(vocab)))
+                doc_col.append(pos)
+                tf_col.append(tf)
+
+        terms = np.asarray(term_col, dtype=np.int64)
+        order = np.argsort(terms, kind="stable")
+        postings_doc = np.asarray(doc_col, dtype=np.int32)[order]
+        tf = np.asarray(tf_col, dtype=np.float32)[order]
+
+        avgdl = float(doc_len.mean()) if len(doc_len) and doc_len.mean() > 0 else 1.0
+        norm = k1 * (1.0 - b + b * doc_len[postings_doc] / avgdl)
+        postings_w = (tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+
+        return cls(
+            doc_ids=doc_ids,
+            sources=list(source_names),
+            vocab=list(vocab),
+            offsets=offsets,
+            postings_doc=postings_doc,
+            postings_w=postings_w,
+            source_codes=source_codes,
+        )
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore: FAISS) -> "BM25Index":
+        """
+        Indexes every chunk in the vectorstore, in FAISS position order.
+        """
+        doc_ids: List[str] = []
+        texts: List[str] = []
+        sources: List[str] = []
+        for pos in sorted(vectorstore.index_to_docstore_id):
+            doc_id = vectorstore.index_to_docstore_id[pos]
+            doc = vectorstore.docstore.search(doc_id)
+            if not isinstance(doc, Document):
+                continue
+            doc_ids.append(doc_id)
+            texts.append(doc.page_content)
+            sources.append(str(doc.metadata.get("source", "")))
+        return cls.build(doc_ids, texts, sources)
+
+    def query_terms(self, query: str) -> List[str]:
+        return list(dict.fromkeys(tokenize(query)))
+
+    def document_frequency(self, term: str) -> int:
+        tid = self.term_ids.get(term)
+        return 0 if tid is None else int(self.df[tid])
+
+    def _source_mask(self, sources: Optional[FrozenSet[str]]) -> Optional[np.ndarray]:
+        if sources is None:
+            return None
+        codes = [self._source_ids[s] for s in sources if s in self._source_ids]
+        return np.isin(self.source_codes, np.asarray(codes, dtype=np.int32))
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        sources: Optional[FrozenSet[str]] = None,
+    ) -> Tuple[List[Tuple[int, float, int]], int]:
+        """
+        Top-k chunks by BM25 score, restricted to `sources` (casefolded names) if given.
+
+        Returns ([(position, score, number of query terms matched)], number of query terms).
+        """
+        terms = self.query_terms(query)
+        n = len(self.doc_ids)
+        if not terms or n == 0:
+            return [], len(terms)
+
+        scores = np.zeros(n, dtype=np.float32)
+        matched = np.zeros(n, dtype=np.int16)
+        for term in terms:
+            tid = self.term_ids.get(term)
+            if tid is None:
+                continue
+            start, end = self.offsets[tid], self.offsets[tid + 1]
+            docs = self.postings_doc[start:end]
+            scores[docs] += self.idf[tid] * self.postings_w[start:end]
+            matched[docs] += 1
+
+        mask = self._source_mask(sources)
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(p), float(scores[p]), int(matched[p])) for p in hits], len(terms)
+
+    def save(self, index_dir: str) -> None:
+        path = Path(index_dir) / LEXICAL_FILENAME
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(
+            tmp,
+            doc_ids=np.asarray(self.doc_ids, dtype=np.str_),
+            sources=np.asarray(self.sources, dtype=np.str_),
+            vocab=np.asarray(self.vocab, dtype=np.str_),
+            offsets=self.offsets,
+            postings_doc=self.postings_doc,
+            postings_w=self.postings_w,
+            source_codes=self.source_codes,
+        )
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["BM25Index"]:
+        """
+        Reads the lexical index saved next to the FAISS index (None if missing or unreadable).
+        """
+        path = Path(index_dir) / LEXICAL_FILENAME
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return cls(
+                    doc_ids=data["doc_ids"].tolist(),
+                    sources=data["sources"].tolist(),
+                    vocab=data["vocab"].tolist(),
+                    offsets=data["offsets"],
+                    postings_doc=data["postings_doc"],
+                    postings_w=data["postings_w"],
+                    source_codes=data["source_codes"],
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+class LexicalState:
+    """
+    A BM25 index attached to one vectorstore, for the contents it had when attached.
+    """
+
+    def __init__(self, vectorstore: FAISS, index: BM25Index):
+        mapping = vectorstore.index_to_docstore_id
+        # The mapping itself, not its id(): ids are reused once a replaced mapping is collected.
+        self.mapping = mapping
+        self.size = len(mapping)
+        self.index = index
+        # BM25 position -> FAISS position, to score lexical-only hits against the query vector.
+        by_id = {doc_id: pos for pos, doc_id in mapping.items()}
+        self.faiss_positions = np.asarray([by_id.get(d, -1) for d in index.doc_ids], dtype=np.int64)
+
+
+_attached: "weakref.WeakKeyDictionary[FAISS, LexicalState]" = weakref.WeakKeyDictionary()
+_attached_lock = threading.Lock()
+
+
+def _matches(vectorstore: FAISS, index: BM25Index) -> bool:
+    mapping = vectorstore.index_to_docstore_id
+    return len(index) == len(mapping) and set(index.doc_ids) == set(mapping.values())
+
+
+def attach_lexical_index(vectorstore: FAISS, index: BM25Index) -> None:
+    with _attached_lock:
+        _attached[vectorstore] = LexicalState(vectorstore, index)
+
+
+def lexical_state(vectorstore: FAISS) -> LexicalState:
+    """
+    The BM25 index for the vectorstore's current contents; rebuilt in memory when the
+    vectorstore changed since it was attached (or nothing was attached).
+    """
+    mapping = vectorstore.index_to_docstore_id
+    with _attached_lock:
+        state = _attached.get(vectorstore)
+        if state is None or state.mapping is not mapping or state.size != len(mapping):
+            state = LexicalState(vectorstore, BM25Index.from_vectorstore(vectorstore))
+            _attached[vectorstore] = state
+        return state
+
+
+def get_lexical_index(vectorstore: FAISS) -> BM25Index:
+    return lexical_state(vectorstore).index
+
+
+def load_or_build_lexical_index(vectorstore: FAISS, index_dir: str, rebuild: bool = False) -> BM25Index:
+    """
+    Attaches the persisted BM25 index to a loaded vectorstore, or (re)builds and saves it
+    when it is missing, unreadable or out of sync with the FAISS index.
+    """
+    index = None if rebuild else BM25Index.load(index_dir)
+    if index is None or not _matches(vectorstore, index):
+        index = BM25Index.from_vectorstore(vectorstore)
+        index.save(index_dir)
+    attach_lexical_index(vectorstore, index)
+    return index
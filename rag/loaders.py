@@ -24,10 +24,9 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 
-def load_pdfs(folder: str = "data/raw_docs") -> List[Document]:
+def list_pdfs(folder: str = "data/raw_docs") -> List[Path]:
     """
-    Loads all PDFs from a folder as LangChain Documents.
-    Each PDF is split per page and includes source filename and 0-based page index.
+    Returns the PDFs in a folder, sorted by filename.
     """
     base = Path(folder)
     if not base.exists():
@@ -37,20 +36,46 @@ def load_pdfs(folder: str = "data/raw_docs") -> List[Document]:
     if not pdfs:
         raise FileNotFoundError(f"No PDFs found in: {base.resolve()}")
 
-    docs: List[Document] = []
-    for path in pdfs:
-        loader = PyPDFLoader(str(path))
-        pages = loader.load()
+    return pdfs
+
+
+def parse_pdf(path: Path) -> List[Document]:
+    """
+    Parses a single PDF into one Document per page (text is not cleaned yet),
+    with source filename and 0-based page index.
+    """
+    loader = PyPDFLoader(str(path))
+    pages = loader.load()
+
+    for d in pages:
+        d.metadata = dict(d.metadata or {})
+        d.metadata["source"] = path.name
+
+        if "page" not in d.metadata:
+            d.metadata["page"] = None
 
-        for d in pages:
-            d.metadata = dict(d.metadata or {})
-            d.metadata["source"] = path.name
+    return pages
 
-            if "page" not in d.metadata:
-                d.metadata["page"] = None
 
-            d.page_content = clean_text(d.page_content)
+def load_pdf(path: Path) -> List[Document]:
+    """
+    Loads a single PDF as LangChain Documents, one per page,
+    with source filename and 0-based page index.
+    """
+    pages = parse_pdf(path)
+    for d in pages:
+        d.page_content = clean_text(d.page_content)
+
+    return pages
 
-        docs.extend(pages)
 
-    return docs
\ No newline at end of file
+def load_pdfs(folder: str = "data/raw_docs") -> List[Document]:
+    """
+    Loads all PDFs from a folder as LangChain Documents.
+    Each PDF is split per page and includes source filename and 0-based page index.
+    """
+    docs: List[Document] = []
+    for path in list_pdfs(folder):
+        docs.extend(load_pdf(path))
+
+    return docs
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import re
+import zlib
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag.config import DEFAULT_HASHING_EMBEDDING_DIM, DEFAULT_HASHING_MAX_DISTANCE
+from rag.lexical import STOPWORDS
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+# Character n-gram sizes (over the lowercased text, words separated by one space).
+_CHAR_NGRAMS = (4, 5)
+# Odd 32-bit multipliers for the rolling n-gram hash and its final mix.
+_POLY = np.uint64(0x01000193)
+_MIX = np.uint64(0x9E3779B1)
+_MASK = np.uint64(0xFFFFFFFF)
+
+
+class HashingNgramEmbeddings(Embeddings):
+    """
+    In-process embeddings with no model, network or fitted state: signed feature
+    hashing of character 4/5-grams and whole words (stopwords removed) into `dim`
+    buckets, log-scaled counts, L2-normalized. Texts that share words or word pieces end up close, so
+    it handles typos and inflections (readmit / readmission) better than word hashing.
+
+    The n-gram hashes are computed with NumPy over the text's bytes; only words go
+    through a (memoized) Python hash. Documents and queries embed the same way.
+    """
+
+    backend = "hashing"
+
+    def __init__(self, dim: int = DEFAULT_HASHING_EMBEDDING_DIM, max_distance: float = DEFAULT_HASHING_MAX_DISTANCE):
+        self.dim = dim
+        self.model = f"hashing-ngram-{dim}"
+        # Relevance gate calibrated for these vectors (see rag.retriever.default_max_distance).
+        self.max_distance = max_distance
+        self._words: Dict[str, int] = {}
+
+    def _word_feature(self, word: str) -> int:
+        f = self._words.get(word)
+        if f is None:
+            f = zlib.crc32(word.encode("utf-8"))
+            if len(self._words) < 1_000_000:
+                self._words[word] = f
+        return f
+
+    def _features(self, text: str) -> np.ndarray:
+        words = [w for w in _NON_ALNUM.sub(" ", (text or "").lower()).split() if w not in STOPWORDS]
+        if not words:
+            return np.empty(0, dtype=np.uint64)
+        normalized = " ".join(words)
+
+        data = np.frombuffer(f" {normalized} ".encode("ascii", "ignore"), dtype=np.uint8).astype(np.uint64)
+        parts = [np.fromiter((self._word_feature(w) for w in words), dtype=np.uint64)]
+        for n in _CHAR_NGRAMS:
+            if data.size < n:
+                continue
+            h = np.full(data.size - n + 1, n, dtype=np.uint64)
+            for j in range(n):
+                h = (h * _POLY + data[j:data.size - n + 1 + j]) & _MASK
+            parts.append(h)
+        features = np.concatenate(parts)
+        # Spread the low bits, which pick the bucket.
+        features = (features * _MIX) & _MASK
+        return features ^ (features >> np.uint64(16))
+
+    def _embed(self, text: str) -> List[float]:
+        features = self._features(text)
+        v = np.zeros(self.dim, dtype=np.float32)
+        if features.size:
+            buckets = ((features >> np.uint64(1)) % np.uint64(self.dim)).astype(np.int64)
+            signs = np.where(features & np.uint64(1), 1.0, -1.0)
+            v += np.bincount(buckets, weights=signs, minlength=self.dim).astype(np.float32)
+            v = np.sign(v) * np.log1p(np.abs(v))
+            norm = float(np.linalg.norm(v))
+            if norm > 0:
+                v /= norm
+        return v.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(list(texts))
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(source: str, chunk_index: int) -> str:
+    """
+    Stable vector/docstore id for a chunk, so a file's chunks can be deleted by id later.
+    """
+    return f"{source}#{chunk_index}"
+
+
+def file_entry(path: Path, page_count: int, chunk_ids: List[str]) -> Dict[str, Any]:
+    stat = path.stat()
+    return {
+        "sha256": file_sha256(path),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "pages": page_count,
+        "chunk_ids": chunk_ids,
+    }
+
+
+def new_manifest(
+    embedding_model: str,
+    chunk_size: int,
+    chunk_overlap: int,
+) -> Dict[str, Any]:
+    return {
+        "version": MANIFEST_VERSION,
+        "embedding_model": embedding_model,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "files": {},
+    }
+
+
+def load_manifest(index_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Reads the manifest saved next to the FAISS index (None if missing or unreadable).
+    """
+    path = Path(index_dir) / MANIFEST_FILENAME
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(index_dir: str, manifest: Dict[str, Any]) -> None:
+    path = Path(index_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    tmp = path / f"{MANIFEST_FILENAME}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp.replace(path / MANIFEST_FILENAME)
+
+
+def corpus_summary(manifest: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Document names and page / chunk counts of the indexed corpus, from the manifest alone
+    (no filesystem scan). Empty counts when there is no manifest.
+    """
+    files: Dict[str, Any] = (manifest or {}).get("files", {})
+    return {
+        "documents": sorted(files),
+        "pages": sum(int(e.get("pages", 0)) for e in files.values()),
+        "chunks": sum(len(e.get("chunk_ids", ())) for e in files.values()),
+        "embedding_model": (manifest or {}).get("embedding_model"),
+    }
+
+
+@dataclass
+class CorpusDiff:
+    added: List[Path] = field(default_factory=list)
+    changed: List[Path] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+def diff_corpus(manifest: Dict[str, Any], pdfs: List[Path]) -> CorpusDiff:
+    """
+    Compares the PDFs on disk with the manifest.
+
+    Files whose size and mtime match the manifest are trusted without hashing;
+    otherwise the content hash decides whether the file really changed.
+    """
+    known: Dict[str, Any] = manifest.get("files", {})
+    diff = CorpusDiff()
+
+    for path in pdfs:
+        entry = known.get(path.name)
+        if entry is None:
+            diff.added.append(path)
+            continue
+
+        stat = path.stat()
+        if stat.st_size == entry.get("size") and stat.st_mtime == entry.get("mtime"):
+            diff.unchanged.append(path.name)
+        elif file_sha256(path) == entry.get("sha256"):
+            entry["mtime"] = stat.st_mtime
+            diff.unchanged.append(path.name)
+        else:
+            diff.changed.append(path)
+
+    on_disk = {p.name for p in pdfs}
+    diff.removed = sorted(name for name in known if name not in on_disk)
+    return diff
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Deque, Dict, Iterator, List, Optional, Protocol, Sequence
+
+import numpy as np
+
+from rag.config import DEFAULT_METRICS_BUCKETS, DEFAULT_METRICS_RECENT
+
+
+@dataclass
+class Timings:
+    """
+    Per-request QA pipeline instrumentation.
+
+    `spans` maps stage name -> seconds (guardrail, cache_lookup, rewrite, lexical, embed,
+    search, fallback_*, pack_contexts, answer_llm, ...); `total` is the wall time of the call.
+    `context_tokens` is the context text sent to the answer LLM, `context_tokens_saved`
+    what merging and the token budget removed from it. `rewrite_skipped` / `rewrite_cached`:
+    a follow-up question was used as is (self-contained) or its rewrite was memoized.
+    `llm_errors`: chat model calls that failed after the client's retries (the rewrite then
+    falls back to the question, the answer to NO_ANSWER).
+    """
+    spans: Dict[str, float] = field(default_factory=dict)
+    total: float = 0.0
+    fallback: bool = False
+    cache_hit: bool = False
+    lexical_fast_path: bool = False
+    rewrite_skipped: bool = False
+    rewrite_cached: bool = False
+    llm_calls: int = 0
+    llm_errors: int = 0
+    prompt_chars: int = 0
+    prompt_tokens: int = 0
+    context_tokens: int = 0
+    context_tokens_saved: int = 0
+    _start: float = field(default_factory=time.perf_counter, repr=False, compare=False)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def count_prompt(self, text: str, model: str) -> None:
+        self.llm_calls += 1
+        self.prompt_chars += len(text)
+        self.prompt_tokens += count_tokens(text, model)
+
+    def finish(self) -> "Timings":
+        self.total = time.perf_counter() - self._start
+        return self
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d.pop("_start", None)
+        return d
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str) -> Any:
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken missing, or its encoding files cannot be downloaded (offline).
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Prompt tokens with tiktoken when available; otherwise ~4 characters per token.
+    """
+    enc = _encoding(model)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+class MetricsSink(Protocol):
+    def record(self, timings: Timings) -> None:
+        ...
+
+
+class InMemoryMetrics:
+    """
+    Thread-safe aggregation of Timings across requests: a cumulative latency histogram
+    per stage (plus "total"), request counters, and the most recent Timings.
+    """
+
+    def __init__(
+        self,
+        buckets: Sequence[float] = DEFAULT_METRICS_BUCKETS,
+        recent: int = DEFAULT_METRICS_RECENT,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        self.requests = 0
+        self.fallbacks = 0
+        self.cache_hits = 0
+        self.lexical_fast_paths = 0
+        self.rewrite_skips = 0
+        self.rewrite_cache_hits = 0
+        self.llm_calls = 0
+        self.llm_errors = 0
+        self.prompt_chars = 0
+        self.prompt_tokens = 0
+        self.context_tokens = 0
+        self.context_tokens_saved = 0
+
+        self._counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._recent: Deque[Timings] = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def _observe_locked(self, stage: str, seconds: float) -> None:
+        counts = self._counts.setdefault(stage, [0] * (len(self.buckets) + 1))
+        counts[bisect_left(self.buckets, seconds)] += 1
+        self._sums[stage] = self._sums.get(stage, 0.0) + seconds
+
+    def record(self, timings: Timings) -> None:
+        with self._lock:
+            self.requests += 1
+            self.fallbacks += timings.fallback
+            self.cache_hits += timings.cache_hit
+            self.lexical_fast_paths += timings.lexical_fast_path
+            self.rewrite_skips += timings.rewrite_skipped
+            self.rewrite_cache_hits += timings.rewrite_cached
+            self.llm_calls += timings.llm_calls
+            self.llm_errors += timings.llm_errors
+            self.prompt_chars += timings.prompt_chars
+            self.prompt_tokens += timings.prompt_tokens
+            self.context_tokens += timings.context_tokens
+            self.context_tokens_saved += timings.context_tokens_saved
+
+            for stage, seconds in timings.spans.items():
+                self._observe_locked(stage, seconds)
+            self._observe_locked("total", timings.total)
+            self._recent.append(timings)
+
+    def recent(self) -> List[Timings]:
+        with self._lock:
+            return list(self._recent)
+
+    def recent_breakdown(self) -> List[Dict[str, Any]]:
+        """
+        p50/p95/p99 milliseconds per stage over the recent requests, slowest p95 first.
+        """
+        samples: Dict[str, List[float]] = {}
+        for t in self.recent():
+            for stage, seconds in t.spans.items():
+                samples.setdefault(stage, []).append(seconds)
+            samples.setdefault("total", []).append(t.total)
+
+        rows = []
+        for stage, values in samples.items():
+            p50, p95, p99 = np.percentile(np.asarray(values) * 1000.0, [50, 95, 99])
+            rows.append({
+                "stage": stage,
+                "n": len(values),
+                "p50_ms": round(float(p50), 1),
+                "p95_ms": round(float(p95), 1),
+                "p99_ms": round(float(p99), 1),
+            })
+        rows.sort(key=lambda r: (r["stage"] != "total", -r["p95_ms"]))
+        return rows
+
+    def histograms(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                stage: {"counts": list(counts), "sum": self._sums[stage]}
+                for stage, counts in self._counts.items()
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "fallbacks": self.fallbacks,
+                "cache_hits": self.cache_hits,
+                "lexical_fast_paths": self.lexical_fast_paths,
+                "rewrite_skips": self.rewrite_skips,
+                "rewrite_cache_hits": self.rewrite_cache_hits,
+                "llm_calls": self.llm_calls,
+                "llm_errors": self.llm_errors,
+                "prompt_chars": self.prompt_chars,
+                "prompt_tokens": self.prompt_tokens,
+                "context_tokens": self.context_tokens,
+                "context_tokens_saved": self.context_tokens_saved,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self.requests = self.fallbacks = self.cache_hits = self.lexical_fast_paths = 0
+            self.rewrite_skips = self.rewrite_cache_hits = 0
+            self.llm_calls = self.llm_errors = self.prompt_chars = self.prompt_tokens = 0
+            self.context_tokens = self.context_tokens_saved = 0
+            self._counts.clear()
+            self._sums.clear()
+            self._recent.clear()
+
+
+def prometheus_text(metrics: InMemoryMetrics, prefix: str = "rag") -> str:
+    """
+    Renders the aggregated metrics in the Prometheus text exposition format.
+    """
+    lines = [
+        f"# HELP {prefix}_stage_seconds Time spent per QA pipeline stage.",
+        f"# TYPE {prefix}_stage_seconds histogram",
+    ]
+    for stage, h in sorted(metrics.histograms().items()):
+        cumulative = 0
+        for le, count in zip(list(metrics.buckets) + ["+Inf"], h["counts"]):
+            cumulative += count
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {h["sum"]:.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+
+    counters = {
+        "requests": "Answered questions.",
+        "fallbacks": "Questions that needed the raw-question fallback search.",
+        "cache_hits": "Questions served from the answer cache.",
+        "lexical_fast_paths": "Retrievals answered by the BM25 fast path without an embedding call.",
+        "rewrite_skips": "Follow-up questions used as the retrieval query without a rewrite LLM call.",
+        "rewrite_cache_hits": "Follow-up rewrites served from the rewrite memo.",
+        "llm_calls": "Chat model calls.",
+        "llm_errors": "Chat model calls that failed after retries.",
+        "prompt_chars": "Prompt characters sent to the chat model.",
+        "prompt_tokens": "Prompt tokens sent to the chat model.",
+        "context_tokens": "Context tokens sent to the answer LLM after packing.",
+        "context_tokens_saved": "Context tokens removed by merging adjacent chunks and the token budget.",
+    }
+    stats = metrics.stats()
+    for name, help_text in counters.items():
+        lines.append(f"# HELP {prefix}_{name}_total {help_text}")
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {stats[name]}")
+
+    return "\n".join(lines) + "\n"
+
+
+_metrics: Optional[InMemoryMetrics] = None
+_sinks: List[MetricsSink] = []
+_sinks_lock = threading.Lock()
+
+
+def get_metrics() -> InMemoryMetrics:
+    """
+    Process-wide in-memory metrics; always registered as a sink.
+    """
+    global _metrics
+    with _sinks_lock:
+        if _metrics is None:
+            _metrics = InMemoryMetrics()
+            _sinks.append(_metrics)
+        return _metrics
+
+
+def add_metrics_sink(sink: MetricsSink) -> None:
+    get_metrics()
+    with _sinks_lock:
+        if sink not in _sinks:
+            _sinks.append(sink)
+
+
+def remove_metrics_sink(sink: MetricsSink) -> None:
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def emit(timings: Timings) -> None:
+    """
+    Hands finished Timings to every registered sink; a failing sink never fails the request.
+    """
+    get_metrics()
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.record(timings)
+        except Exception:
+            pass
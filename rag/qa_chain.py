@@ -1,12 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List, Tuple, Optional
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Dict, Generator, Hashable, Iterator, List, Optional, Sequence, Tuple, Union
 
 from langchain_core.documents import Document
 from langchain_openai import ChatOpenAI
 from langchain_community.vectorstores import FAISS
 
+from rag.clients import get_chat_model
 from rag.guardrails import is_prompt_injection
 from rag.config import (
     NO_ANSWER,
@@ -14,47 +20,136 @@ from rag.config import (
     DEFAULT_MAX_SOURCES_SHORT,
     DEFAULT_MAX_SOURCES_LONG,
     DEFAULT_SHORT_ANSWER_CHAR_LIMIT,
-    DEFAULT_MAX_DISTANCE,
+    DEFAULT_BATCH_CONCURRENCY,
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
 )
+from rag.context import pack_contexts
 from rag.prompts import SYSTEM_MSG, build_user_msg, REWRITE_QUERY_PROMPT
-from rag.retriever import retrieve_with_scores, gate_and_select_contexts, build_citations
+from rag.rewrite import get_rewrite_memo, needs_rewrite
+from rag.answer_cache import get_answer_cache, normalize_question
+from rag.metrics import Timings, emit
+from rag.retriever import (
+    SourceFilter,
+    index_version,
+    normalize_source_filter,
+    aretrieve_with_scores,
+    embed_queries,
+    lexical_fast_path,
+    retrieve_batch_with_scores,
+    search_by_vector,
+    search_batch_by_vectors,
+    gate_and_select_contexts,
+    build_citations,
+    default_max_distance,
+)
 
 
 @dataclass
 class RAGResult:
     answer: str
     citations: List[str]
+    timings: Optional[Timings] = field(default=None, compare=False, repr=False)
 
 
-def _rewrite_for_retrieval(
-    question: str,
-    memory_text: str,
-    llm: ChatOpenAI,
-) -> str:
-    q = (question or "").strip()
+@dataclass
+class BatchItem:
+    """
+    One answer_questions() outcome: `result` is None when `error` is set.
+    """
+    index: int
+    question: str
+    result: Optional[RAGResult] = None
+    error: Optional[str] = None
 
+
+def _rewrite_prompt(question: str, memory_text: str) -> Optional[str]:
+    """
+    Rewrite prompt for a follow-up question, or None when there is no chat memory.
+    """
     if not (memory_text or "").strip():
-        return q
+        return None
 
-    prompt = REWRITE_QUERY_PROMPT.format(
+    return REWRITE_QUERY_PROMPT.format(
         memory=memory_text,
-        question=q,
+        question=(question or "").strip(),
     )
 
+
+def _local_rewrite(question: str, memory_text: str, timings: Optional[Timings] = None) -> Optional[str]:
+    """
+    The retrieval query when it needs no rewrite LLM call: the question itself when there
+    is no memory or it is self-contained, or a memoized rewrite. None means: call the LLM.
+    """
+    q = (question or "").strip()
+    if not (memory_text or "").strip():
+        return q
+    if not needs_rewrite(q):
+        if timings is not None:
+            timings.rewrite_skipped = True
+        return q
+
+    cached = get_rewrite_memo().get(memory_text, q)
+    if cached is not None and timings is not None:
+        timings.rewrite_cached = True
+    return cached
+
+
+def _accept_rewrite(question: str, content: Optional[str]) -> str:
+    q = (question or "").strip()
+    rewritten = (content or "").strip()
+
+    if not rewritten:
+        return q
+    if len(rewritten) > 250:
+        return q
+    if is_prompt_injection(rewritten):
+        return q
+
+    return rewritten
+
+
+def _rewrite_for_retrieval(
+    question: str,
+    memory_text: str,
+    llm: ChatOpenAI,
+    timings: Optional[Timings] = None,
+) -> str:
+    prompt = _rewrite_prompt(question, memory_text)
+    if prompt is None:
+        return (question or "").strip()
+
     try:
         resp = llm.invoke([("user", prompt)])
-        rewritten = (resp.content or "").strip()
+    except Exception:
+        if timings is not None:
+            timings.llm_errors += 1
+        return (question or "").strip()
+
+    rewritten = _accept_rewrite(question, resp.content)
+    get_rewrite_memo().put(memory_text, (question or "").strip(), rewritten)
+    return rewritten
 
-        if not rewritten:
-            return q
-        if len(rewritten) > 250:
-            return q
-        if is_prompt_injection(rewritten):
-            return q
 
-        return rewritten
+async def _arewrite_for_retrieval(
+    question: str,
+    memory_text: str,
+    llm: ChatOpenAI,
+    timings: Optional[Timings] = None,
+) -> str:
+    prompt = _rewrite_prompt(question, memory_text)
+    if prompt is None:
+        return (question or "").strip()
+
+    try:
+        resp = await llm.ainvoke([("user", prompt)])
     except Exception:
-        return q
+        if timings is not None:
+            timings.llm_errors += 1
+        return (question or "").strip()
+
+    rewritten = _accept_rewrite(question, resp.content)
+    get_rewrite_memo().put(memory_text, (question or "").strip(), rewritten)
+    return rewritten
 
 
 def _looks_like_no_answer(text: str) -> bool:
@@ -63,36 +158,123 @@ def _looks_like_no_answer(text: str) -> bool:
     return t == target or t == target.rstrip(".")
 
 
-def answer_question(
+def _answer_scope(
+    vectorstore: FAISS,
+    k: int,
+    max_distance: float,
+    max_contexts: int,
+    source_filter: SourceFilter,
+    model: str,
+    memory_text: str,
+) -> Tuple[str, Hashable]:
+    """
+    Answer cache scope: index version plus every argument that can change the answer.
+    """
+    sources = normalize_source_filter(source_filter)
+    scope = (
+        k,
+        max_distance,
+        max_contexts,
+        tuple(sorted(sources)) if sources else None,
+        model,
+        " ".join((memory_text or "").split()),
+    )
+    return index_version(vectorstore), scope
+
+
+def _near_duplicate_query(
     question: str,
     vectorstore: FAISS,
-    k: int = 5,
-    max_distance: float = DEFAULT_MAX_DISTANCE,
-    max_contexts: int = 5,
-    source_filter: Optional[str] = None,
-    model: str = DEFAULT_LLM_MODEL,
-    temperature: float = 0.0,
-    memory_text: str = "",
-) -> RAGResult:
-    if is_prompt_injection(question):
-        return RAGResult(answer=NO_ANSWER, citations=[])
+    k: int,
+    source_filter: SourceFilter,
+    memory_text: str,
+) -> Optional[str]:
+    """
+    The query to embed for near-duplicate answer cache matching, or None to match exactly only.
 
-    llm_rewrite = ChatOpenAI(model=model, temperature=0)
-    llm_answer = ChatOpenAI(model=model, temperature=0)
+    Only without memory (the question is then its own retrieval query, and its embedding is
+    shared with retrieval via the query cache), and only when retrieval will embed it at all:
+    a decisive lexical fast path answers without a query embedding, and so must the cache.
+    """
+    if (memory_text or "").strip():
+        return None
+    query = (question or "").strip()
+    if lexical_fast_path(query, vectorstore, k=k, source_filter=source_filter) is not None:
+        return None
+    return query
 
-    retrieval_query = _rewrite_for_retrieval(
-        question=question,
-        memory_text=memory_text,
-        llm=llm_rewrite,
-    )
 
-    docs_and_scores: List[Tuple[Document, float]] = retrieve_with_scores(
-        retrieval_query,
-        vectorstore,
-        k=k,
-        source_filter=source_filter,
-    )
+def _search(
+    query: str,
+    vectorstore: FAISS,
+    k: int,
+    source_filter: SourceFilter,
+    timings: Timings,
+    stage: str = "",
+) -> List[Tuple[Document, float]]:
+    """
+    retrieve_with_scores with a span per step: lexical fast path, then (if it was
+    not decisive) query embedding and hybrid/vector search.
+    """
+    with timings.span(stage + "lexical"):
+        fast = lexical_fast_path(query, vectorstore, k=k, source_filter=source_filter)
+    if fast is not None:
+        timings.lexical_fast_path = True
+        return fast
+
+    with timings.span(stage + "embed"):
+        embedding = vectorstore._embed_query(query)
+    with timings.span(stage + "search"):
+        return search_by_vector(query, embedding, vectorstore, k=k, source_filter=source_filter)
+
+
+async def _asearch(
+    query: str,
+    vectorstore: FAISS,
+    k: int,
+    source_filter: SourceFilter,
+    timings: Timings,
+    stage: str = "",
+) -> List[Tuple[Document, float]]:
+    with timings.span(stage + "lexical"):
+        fast = lexical_fast_path(query, vectorstore, k=k, source_filter=source_filter)
+    if fast is not None:
+        timings.lexical_fast_path = True
+        return fast
+
+    with timings.span(stage + "embed"):
+        embedding = await vectorstore._aembed_query(query)
+    with timings.span(stage + "search"):
+        return search_by_vector(query, embedding, vectorstore, k=k, source_filter=source_filter)
+
+
+def _retrieve_contexts(
+    question: str,
+    vectorstore: FAISS,
+    k: int,
+    max_distance: float,
+    max_contexts: int,
+    source_filter: SourceFilter,
+    model: str,
+    memory_text: str,
+    timings: Timings,
+) -> List[Document]:
+    """
+    Rewrite -> retrieve -> gate, with a retry on the raw question if the rewrite found nothing.
+    """
+    retrieval_query = _local_rewrite(question, memory_text, timings)
+    if retrieval_query is None:
+        llm_rewrite = get_chat_model(model, temperature=0)
+        timings.count_prompt(_rewrite_prompt(question, memory_text), model)
+        with timings.span("rewrite"):
+            retrieval_query = _rewrite_for_retrieval(
+                question=question,
+                memory_text=memory_text,
+                llm=llm_rewrite,
+                timings=timings,
+            )
 
+    docs_and_scores = _search(retrieval_query, vectorstore, k, source_filter, timings)
     contexts = gate_and_select_contexts(
         docs_and_scores,
         max_distance,
@@ -100,28 +282,155 @@ def answer_question(
     )
 
     if not contexts and retrieval_query.strip() != (question or "").strip():
-        docs_and_scores = retrieve_with_scores(
-            question,
-            vectorstore,
-            k=k,
-            source_filter=source_filter,
-        )
+        timings.fallback = True
+        docs_and_scores = _search(question, vectorstore, k, source_filter, timings, stage="fallback_")
         contexts = gate_and_select_contexts(
             docs_and_scores,
             max_distance,
             max_contexts=max_contexts,
         )
 
+    return contexts
+
+
+def _pack(contexts: List[Document], model: str, timings: Optional[Timings] = None) -> List[Document]:
+    """
+    Merges adjacent chunks and fits the contexts into the context token budget.
+    """
+    with timings.span("pack_contexts") if timings is not None else nullcontext():
+        packed = pack_contexts(contexts, token_budget=DEFAULT_CONTEXT_TOKEN_BUDGET, model=model)
+    if timings is not None:
+        timings.context_tokens += packed.tokens_after
+        timings.context_tokens_saved += packed.tokens_saved
+    return packed.contexts
+
+
+def _run_pipeline(
+    question: str,
+    vectorstore: FAISS,
+    k: int,
+    max_distance: float,
+    max_contexts: int,
+    source_filter: SourceFilter,
+    model: str,
+    memory_text: str,
+    timings: Timings,
+) -> Tuple[RAGResult, bool]:
+    """
+    Rewrite -> retrieve -> answer.
+    Returns the result and whether it is safe to cache (False if the answer LLM call failed).
+    """
+    contexts = _retrieve_contexts(
+        question,
+        vectorstore,
+        k=k,
+        max_distance=max_distance,
+        max_contexts=max_contexts,
+        source_filter=source_filter,
+        model=model,
+        memory_text=memory_text,
+        timings=timings,
+    )
+
     if not contexts:
-        return RAGResult(answer=NO_ANSWER, citations=[])
+        return RAGResult(answer=NO_ANSWER, citations=[]), True
 
+    contexts = _pack(contexts, model, timings)
+    llm_answer = get_chat_model(model, temperature=0)
     user_msg = build_user_msg(question, contexts)
+    timings.count_prompt(SYSTEM_MSG + user_msg, model)
 
     try:
-        resp = llm_answer.invoke([("system", SYSTEM_MSG), ("user", user_msg)])
-        answer = (resp.content or "").strip().replace("\\n", "\n").strip()
+        with timings.span("answer_llm"):
+            resp = llm_answer.invoke([("system", SYSTEM_MSG), ("user", user_msg)])
     except Exception:
-        answer = ""
+        timings.llm_errors += 1
+        return RAGResult(answer=NO_ANSWER, citations=[]), False
+
+    return _finalize_answer(resp.content, contexts), True
+
+
+def _stream_pipeline(
+    question: str,
+    vectorstore: FAISS,
+    k: int,
+    max_distance: float,
+    max_contexts: int,
+    source_filter: SourceFilter,
+    model: str,
+    memory_text: str,
+    timings: Timings,
+) -> Generator[str, None, Tuple[RAGResult, bool]]:
+    """
+    Like _run_pipeline, but yields answer text deltas while the answer LLM streams.
+
+    Output that could still turn out to be NO_ANSWER is held back; as soon as it is
+    recognized as NO_ANSWER the LLM stream is closed without yielding anything.
+    """
+    contexts = _retrieve_contexts(
+        question,
+        vectorstore,
+        k=k,
+        max_distance=max_distance,
+        max_contexts=max_contexts,
+        source_filter=source_filter,
+        model=model,
+        memory_text=memory_text,
+        timings=timings,
+    )
+
+    if not contexts:
+        return RAGResult(answer=NO_ANSWER, citations=[]), True
+
+    contexts = _pack(contexts, model, timings)
+    llm_answer = get_chat_model(model, temperature=0)
+    user_msg = build_user_msg(question, contexts)
+    timings.count_prompt(SYSTEM_MSG + user_msg, model)
+
+    target = NO_ANSWER.strip().lower()
+    parts: List[str] = []
+    held = ""
+    streaming = False
+
+    start = time.perf_counter()
+    stream = llm_answer.stream([("system", SYSTEM_MSG), ("user", user_msg)])
+    try:
+        for chunk in stream:
+            text = chunk.content or ""
+            if not text:
+                continue
+            if not parts:
+                timings.add("answer_first_token", time.perf_counter() - start)
+            parts.append(text)
+
+            if streaming:
+                yield text
+                continue
+
+            held += text
+            head = " ".join(held.split()).lower()
+            if head.startswith(target.rstrip(".")):
+                return RAGResult(answer=NO_ANSWER, citations=[]), True
+            if target.startswith(head):
+                continue
+
+            streaming = True
+            yield held
+    except Exception:
+        timings.llm_errors += 1
+        return RAGResult(answer=NO_ANSWER, citations=[]), False
+    finally:
+        stream.close()
+        timings.add("answer_llm", time.perf_counter() - start)
+
+    return _finalize_answer("".join(parts), contexts), True
+
+
+def _finalize_answer(content: Optional[str], contexts: List[Document]) -> RAGResult:
+    """
+    Turns the raw answer LLM output into a RAGResult (canonical NO_ANSWER or answer + citations).
+    """
+    answer = (content or "").strip().replace("\\n", "\n").strip()
 
     if not answer or _looks_like_no_answer(answer):
         return RAGResult(answer=NO_ANSWER, citations=[])
@@ -137,4 +446,453 @@ def answer_question(
     )
     citations = build_citations(contexts, max_sources=max_sources)
 
-    return RAGResult(answer=answer, citations=citations)
\ No newline at end of file
+    return RAGResult(answer=answer, citations=citations)
+
+
+async def _arun_pipeline(
+    question: str,
+    vectorstore: FAISS,
+    k: int,
+    max_distance: float,
+    max_contexts: int,
+    source_filter: SourceFilter,
+    model: str,
+    memory_text: str,
+    timings: Timings,
+) -> Tuple[RAGResult, bool]:
+    """
+    Async rewrite -> retrieve -> answer, with the same result as _run_pipeline.
+
+    While the rewrite LLM call is in flight, retrieval for the raw question runs
+    speculatively; it serves as the fallback search (or as the main search when
+    the rewrite returns the question unchanged). Spans of the speculative search
+    only measure the time spent waiting for it.
+    """
+    llm_answer = get_chat_model(model, temperature=0)
+
+    raw_search: Optional[asyncio.Task] = None
+    retrieval_query = _local_rewrite(question, memory_text, timings)
+    if retrieval_query is None:
+        timings.count_prompt(_rewrite_prompt(question, memory_text), model)
+        raw_search = asyncio.create_task(
+            aretrieve_with_scores(question, vectorstore, k=k, source_filter=source_filter)
+        )
+
+    try:
+        if retrieval_query is None:
+            with timings.span("rewrite"):
+                retrieval_query = await _arewrite_for_retrieval(
+                    question=question,
+                    memory_text=memory_text,
+                    llm=get_chat_model(model, temperature=0),
+                    timings=timings,
+                )
+
+        if raw_search is not None and retrieval_query == (question or "").strip():
+            with timings.span("search"):
+                docs_and_scores = await raw_search
+        else:
+            docs_and_scores = await _asearch(retrieval_query, vectorstore, k, source_filter, timings)
+
+        contexts = gate_and_select_contexts(
+            docs_and_scores,
+            max_distance,
+            max_contexts=max_contexts,
+        )
+
+        if not contexts and retrieval_query.strip() != (question or "").strip():
+            timings.fallback = True
+            if raw_search is not None:
+                with timings.span("fallback_search"):
+                    docs_and_scores = await raw_search
+            else:
+                docs_and_scores = await _asearch(question, vectorstore, k, source_filter, timings, stage="fallback_")
+            contexts = gate_and_select_contexts(
+                docs_and_scores,
+                max_distance,
+                max_contexts=max_contexts,
+            )
+    finally:
+        if raw_search is not None:
+            if not raw_search.done():
+                raw_search.cancel()
+            elif not raw_search.cancelled():
+                raw_search.exception()
+
+    if not contexts:
+        return RAGResult(answer=NO_ANSWER, citations=[]), True
+
+    contexts = _pack(contexts, model, timings)
+    user_msg = build_user_msg(question, contexts)
+    timings.count_prompt(SYSTEM_MSG + user_msg, model)
+
+    try:
+        with timings.span("answer_llm"):
+            resp = await llm_answer.ainvoke([("system", SYSTEM_MSG), ("user", user_msg)])
+    except Exception:
+        timings.llm_errors += 1
+        return RAGResult(answer=NO_ANSWER, citations=[]), False
+
+    return _finalize_answer(resp.content, contexts), True
+
+
+def _finish(result: RAGResult, timings: Timings) -> RAGResult:
+    """
+    Attaches the finished Timings to the result and reports them to the metrics sinks.
+    """
+    result.timings = timings.finish()
+    emit(timings)
+    return result
+
+
+def answer_question(
+    question: str,
+    vectorstore: FAISS,
+    k: int = 5,
+    max_distance: Optional[float] = None,
+    max_contexts: int = 5,
+    source_filter: SourceFilter = None,
+    model: str = DEFAULT_LLM_MODEL,
+    temperature: float = 0.0,
+    memory_text: str = "",
+    use_cache: bool = True,
+) -> RAGResult:
+    """
+    Answers a question strictly from the indexed documents.
+
+    With use_cache=True, results are served from the process-wide answer cache:
+    exact matches on the normalized question, plus near-duplicate questions
+    (by query embedding similarity) when there is no chat memory to resolve.
+    The result carries per-stage Timings, which are also sent to the metrics sinks.
+    max_distance defaults to the relevance gate of the index's embedding backend.
+    """
+    if max_distance is None:
+        max_distance = default_max_distance(vectorstore)
+    timings = Timings()
+    with timings.span("guardrail"):
+        injected = is_prompt_injection(question)
+    if injected:
+        return _finish(RAGResult(answer=NO_ANSWER, citations=[]), timings)
+
+    args = dict(
+        k=k,
+        max_distance=max_distance,
+        max_contexts=max_contexts,
+        source_filter=source_filter,
+        model=model,
+        memory_text=memory_text,
+    )
+
+    if not use_cache:
+        result, _ = _run_pipeline(question, vectorstore, timings=timings, **args)
+        return _finish(result, timings)
+
+    cache = get_answer_cache()
+    version, scope = _answer_scope(vectorstore, **args)
+
+    embed = None
+    with timings.span("cache_lookup"):
+        query = _near_duplicate_query(question, vectorstore, k, source_filter, memory_text)
+        if query is not None:
+            embed = partial(vectorstore._embed_query, query)
+        cached = cache.lookup(version, scope, question, embed=embed)
+    if cached is not None:
+        timings.cache_hit = True
+        return _finish(cached, timings)
+
+    result, cacheable = _run_pipeline(question, vectorstore, timings=timings, **args)
+    if cacheable:
+        # Fast-path answers are stored for exact matches only: embedding them would cost the call it saved.
+        embedding = embed() if embed is not None and not timings.lexical_fast_path else None
+        cache.store(version, scope, question, result, embedding=embedding)
+    return _finish(result, timings)
+
+
+def answer_question_stream(
+    question: str,
+    vectorstore: FAISS,
+    k: int = 5,
+    max_distance: Optional[float] = None,
+    max_contexts: int = 5,
+    source_filter: SourceFilter = None,
+    model: str = DEFAULT_LLM_MODEL,
+    temperature: float = 0.0,
+    memory_text: str = "",
+    use_cache: bool = True,
+) -> Iterator[Union[str, RAGResult]]:
+    """
+    Streaming variant of answer_question.
+
+    Yields answer text deltas as they arrive, then exactly one final RAGResult with
+    the citations. A reply recognized as NO_ANSWER is not streamed at all.
+    The final RAGResult is authoritative: if the full reply turns out to contain the
+    NO_ANSWER phrase, it is NO_ANSWER even though some text was already yielded.
+    Its answer_llm span includes time the consumer spends between deltas.
+    """
+    if max_distance is None:
+        max_distance = default_max_distance(vectorstore)
+    timings = Timings()
+    with timings.span("guardrail"):
+        injected = is_prompt_injection(question)
+    if injected:
+        yield _finish(RAGResult(answer=NO_ANSWER, citations=[]), timings)
+        return
+
+    args = dict(
+        k=k,
+        max_distance=max_distance,
+        max_contexts=max_contexts,
+        source_filter=source_filter,
+        model=model,
+        memory_text=memory_text,
+    )
+
+    cache = None
+    embed = None
+    if use_cache:
+        cache = get_answer_cache()
+        version, scope = _answer_scope(vectorstore, **args)
+        with timings.span("cache_lookup"):
+            query = _near_duplicate_query(question, vectorstore, k, source_filter, memory_text)
+            if query is not None:
+                embed = partial(vectorstore._embed_query, query)
+            cached = cache.lookup(version, scope, question, embed=embed)
+        if cached is not None:
+            timings.cache_hit = True
+            if cached.answer != NO_ANSWER:
+                yield cached.answer
+            yield _finish(cached, timings)
+            return
+
+    result, cacheable = yield from _stream_pipeline(question, vectorstore, timings=timings, **args)
+    if cache is not None and cacheable:
+        embedding = embed() if embed is not None and not timings.lexical_fast_path else None
+        cache.store(version, scope, question, result, embedding=embedding)
+    yield _finish(result, timings)
+
+
+async def answer_question_async(
+    question: str,
+    vectorstore: FAISS,
+    k: int = 5,
+    max_distance: Optional[float] = None,
+    max_contexts: int = 5,
+    source_filter: SourceFilter = None,
+    model: str = DEFAULT_LLM_MODEL,
+    temperature: float = 0.0,
+    memory_text: str = "",
+    use_cache: bool = True,
+) -> RAGResult:
+    """
+    Async variant of answer_question with the same result.
+
+    Uses the async chat/embedding interfaces, so many questions can share one event loop.
+    """
+    if max_distance is None:
+        max_distance = default_max_distance(vectorstore)
+    timings = Timings()
+    with timings.span("guardrail"):
+        injected = is_prompt_injection(question)
+    if injected:
+        return _finish(RAGResult(answer=NO_ANSWER, citations=[]), timings)
+
+    args = dict(
+        k=k,
+        max_distance=max_distance,
+        max_contexts=max_contexts,
+        source_filter=source_filter,
+        model=model,
+        memory_text=memory_text,
+    )
+
+    if not use_cache:
+        result, _ = await _arun_pipeline(question, vectorstore, timings=timings, **args)
+        return _finish(result, timings)
+
+    cache = get_answer_cache()
+    version, scope = _answer_scope(vectorstore, **args)
+
+    aembed = None
+    with timings.span("cache_lookup"):
+        query = _near_duplicate_query(question, vectorstore, k, source_filter, memory_text)
+        if query is not None:
+            aembed = partial(vectorstore._aembed_query, query)
+        cached = await cache.alookup(version, scope, question, aembed=aembed)
+    if cached is not None:
+        timings.cache_hit = True
+        return _finish(cached, timings)
+
+    result, cacheable = await _arun_pipeline(question, vectorstore, timings=timings, **args)
+    if cacheable:
+        embedding = await aembed() if aembed is not None and not timings.lexical_fast_path else None
+        cache.store(version, scope, question, result, embedding=embedding)
+    return _finish(result, timings)
+
+
+def _error_text(exc: BaseException) -> str:
+    return f"{type(exc).__name__}: {exc}"
+
+
+def answer_questions(
+    questions: Sequence[str],
+    vectorstore: FAISS,
+    k: int = 5,
+    max_distance: Optional[float] = None,
+    max_contexts: int = 5,
+    source_filter: SourceFilter = None,
+    model: str = DEFAULT_LLM_MODEL,
+    temperature: float = 0.0,
+    memory_texts: Optional[Sequence[str]] = None,
+    use_cache: bool = True,
+    max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+) -> List[BatchItem]:
+    """
+    Batch variant of answer_question for evaluation and bulk jobs.
+
+    All retrieval queries are embedded in one batched request and searched as one
+    FAISS matrix query; rewrite and answer LLM calls run on at most `max_concurrency`
+    threads. Returns one BatchItem per question, in input order. Unlike answer_question,
+    a failed answer LLM call is reported as the item's error instead of NO_ANSWER.
+    """
+    if max_distance is None:
+        max_distance = default_max_distance(vectorstore)
+    memories = list(memory_texts) if memory_texts is not None else [""] * len(questions)
+    if len(memories) != len(questions):
+        raise ValueError("memory_texts must have one entry per question")
+
+    items = [BatchItem(index=i, question=q) for i, q in enumerate(questions)]
+    cache = get_answer_cache() if use_cache else None
+    scopes: Dict[int, Tuple[str, Hashable]] = {}
+    pending: List[int] = []
+    # Repeated (question, memory) pairs are answered once and copied.
+    leaders: Dict[Tuple[str, str], int] = {}
+    duplicates: Dict[int, int] = {}
+
+    for i, item in enumerate(items):
+        if is_prompt_injection(item.question):
+            item.result = RAGResult(answer=NO_ANSWER, citations=[])
+            continue
+
+        key = (normalize_question(item.question), " ".join((memories[i] or "").split()))
+        if key in leaders:
+            duplicates[i] = leaders[key]
+            continue
+        leaders[key] = i
+
+        if cache is not None:
+            scopes[i] = _answer_scope(
+                vectorstore,
+                k=k,
+                max_distance=max_distance,
+                max_contexts=max_contexts,
+                source_filter=source_filter,
+                model=model,
+                memory_text=memories[i],
+            )
+            # Questions without memory are also near-duplicate matched, once embedded below.
+            if (memories[i] or "").strip():
+                item.result = cache.lookup(*scopes[i], item.question)
+                if item.result is not None:
+                    continue
+        pending.append(i)
+
+    llm = get_chat_model(model, temperature=0)
+    raw = {i: (items[i].question or "").strip() for i in pending}
+    queries: Dict[int, str] = {}
+    for i in pending:
+        local = _local_rewrite(items[i].question, memories[i])
+        if local is not None:
+            queries[i] = local
+    to_rewrite = [i for i in pending if i not in queries]
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        rewritten = pool.map(lambda i: _rewrite_for_retrieval(items[i].question, memories[i], llm), to_rewrite)
+        queries.update(zip(to_rewrite, rewritten))
+
+        # Decisive keyword matches skip the embedding request altogether.
+        found: Dict[int, List[Tuple[Document, float]]] = {}
+        for i in pending:
+            fast = lexical_fast_path(queries[i], vectorstore, k=k, source_filter=source_filter)
+            if fast is not None:
+                found[i] = fast
+
+        to_embed = [i for i in pending if i not in found]
+        try:
+            embedded = embed_queries([queries[i] for i in to_embed], vectorstore)
+        except Exception as exc:
+            for i in to_embed:
+                items[i].error = _error_text(exc)
+            pending = [i for i in pending if i in found]
+            to_embed, embedded = [], []
+        vectors = dict(zip(to_embed, embedded))
+
+        if cache is not None:
+            still_pending = []
+            for i in pending:
+                item = items[i]
+                if not (memories[i] or "").strip():
+                    embed = (lambda v=vectors[i]: v) if i in vectors else None
+                    item.result = cache.lookup(*scopes[i], item.question, embed=embed)
+                if item.result is None:
+                    still_pending.append(i)
+            pending = still_pending
+
+        contexts: Dict[int, List[Document]] = {}
+        try:
+            to_search = [i for i in pending if i not in found]
+            hits = search_batch_by_vectors(
+                [queries[i] for i in to_search],
+                [vectors[i] for i in to_search],
+                vectorstore,
+                k=k,
+                source_filter=source_filter,
+            )
+            found.update(zip(to_search, hits))
+            for i in pending:
+                contexts[i] = gate_and_select_contexts(found[i], max_distance, max_contexts=max_contexts)
+
+            # Same fallback as answer_question: retry with the raw question if the rewrite found nothing.
+            retry = [i for i in pending if not contexts[i] and queries[i] != raw[i]]
+            if retry:
+                hits = retrieve_batch_with_scores(
+                    [raw[i] for i in retry],
+                    vectorstore,
+                    k=k,
+                    source_filter=source_filter,
+                )
+                for i, docs_and_scores in zip(retry, hits):
+                    contexts[i] = gate_and_select_contexts(docs_and_scores, max_distance, max_contexts=max_contexts)
+        except Exception as exc:
+            for i in pending:
+                items[i].error = _error_text(exc)
+            pending = []
+
+        def answer(i: int) -> None:
+            item = items[i]
+            if not contexts[i]:
+                item.result = RAGResult(answer=NO_ANSWER, citations=[])
+                return
+            try:
+                packed = _pack(contexts[i], model)
+                user_msg = build_user_msg(item.question, packed)
+                resp = llm.invoke([("system", SYSTEM_MSG), ("user", user_msg)])
+            except Exception as exc:
+                item.error = _error_text(exc)
+                return
+            item.result = _finalize_answer(resp.content, packed)
+
+        list(pool.map(answer, pending))
+
+    if cache is not None:
+        for i in pending:
+            item = items[i]
+            if item.result is not None:
+                embedding = None if (memories[i] or "").strip() else vectors.get(i)
+                cache.store(*scopes[i], item.question, item.result, embedding=embedding)
+
+    for i, leader in duplicates.items():
+        result = items[leader].result
+        items[i].result = replace(result, citations=list(result.citations)) if result is not None else None
+        items[i].error = items[leader].error
+
+    return items
@@ -1,9 +1,32 @@
 from __future__ import annotations
 
-from typing import List, Tuple, Optional
+import threading
+import uuid
+import weakref
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+from rag.ann import exact_subset_search, is_approximate, search_parameters
+from rag.config import (
+    DEFAULT_ANN_EXACT_FILTER_MAX,
+    DEFAULT_FAST_PATH_MARGIN,
+    DEFAULT_FAST_PATH_MAX_DF,
+    DEFAULT_FAST_PATH_MAX_TERMS,
+    DEFAULT_HYBRID_CANDIDATES,
+    DEFAULT_INJECTION_POLICY,
+    DEFAULT_LEXICAL_FAST_PATH,
+    DEFAULT_MAX_DISTANCE,
+    DEFAULT_RETRIEVAL_MODE,
+    DEFAULT_RRF_K,
+)
+from rag.guardrails import is_flagged
+from rag.lexical import lexical_state
+
+SourceFilter = Optional[Union[str, Iterable[str]]]
 
 
 def citation(d: Document) -> str:
@@ -24,47 +47,486 @@ def citation(d: Document) -> str:
     return " | ".join(parts)
 
 
+class IndexFingerprint:
+    """
+    Cheap identity of the current index contents.
+
+    FAISS.delete() replaces `index_to_docstore_id` and additions grow it, so (mapping, length)
+    changes whenever the indexed vectors change. The mapping object itself is held and compared
+    by identity: its id() could be reused by a new mapping once the old one is garbage collected.
+    """
+
+    __slots__ = ("mapping", "size")
+
+    def __init__(self, vectorstore: FAISS):
+        self.mapping = vectorstore.index_to_docstore_id
+        self.size = len(self.mapping)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, IndexFingerprint) and other.mapping is self.mapping and other.size == self.size
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+def index_fingerprint(vectorstore: FAISS) -> IndexFingerprint:
+    return IndexFingerprint(vectorstore)
+
+
+_versions: "weakref.WeakKeyDictionary[FAISS, Tuple[IndexFingerprint, str]]" = weakref.WeakKeyDictionary()
+_versions_lock = threading.Lock()
+
+
+def index_version(vectorstore: FAISS) -> str:
+    """
+    Opaque version token for a loaded index.
+
+    A new token is issued for every vectorstore object and whenever its contents change,
+    so caches keyed on it are invalidated by reloads, rebuilds and incremental updates.
+    """
+    fingerprint = index_fingerprint(vectorstore)
+    with _versions_lock:
+        entry = _versions.get(vectorstore)
+        if entry is None or entry[0] != fingerprint:
+            entry = (fingerprint, uuid.uuid4().hex)
+            _versions[vectorstore] = entry
+        return entry[1]
+
+
+class _SourceSelectors:
+    """
+    Precomputed source -> FAISS vector positions, plus cached ID selectors per filter.
+    """
+
+    MAX_SELECTORS = 64
+
+    def __init__(self, vectorstore: FAISS):
+        self.fingerprint = index_fingerprint(vectorstore)
+
+        positions: Dict[str, List[int]] = {}
+        # CompactDocstore answers this without building every Document.
+        source_of = getattr(vectorstore.docstore, "source", None)
+        for pos, doc_id in vectorstore.index_to_docstore_id.items():
+            if source_of is not None:
+                src = source_of(doc_id)
+                if src is None:
+                    continue
+            else:
+                doc = vectorstore.docstore.search(doc_id)
+                if not isinstance(doc, Document):
+                    continue
+                src = doc.metadata.get("source", "")
+            positions.setdefault(str(src).casefold(), []).append(pos)
+
+        self.positions: Dict[str, np.ndarray] = {
+            src: np.asarray(p, dtype=np.int64) for src, p in positions.items()
+        }
+        self._selectors: Dict[FrozenSet[str], Tuple[Any, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def selector(self, sources: FrozenSet[str]) -> Tuple[Any, np.ndarray]:
+        """
+        Returns (faiss.IDSelectorBatch, selected vector positions) for a set of sources.
+        """
+        with self._lock:
+            cached = self._selectors.get(sources)
+            if cached is not None:
+                return cached
+
+            arrays = [self.positions[s] for s in sources if s in self.positions]
+            ids = np.sort(np.concatenate(arrays)) if arrays else np.empty(0, dtype=np.int64)
+            faiss = dependable_faiss_import()
+            entry = (faiss.IDSelectorBatch(ids), ids)
+
+            if len(self._selectors) >= self.MAX_SELECTORS:
+                self._selectors.clear()
+            self._selectors[sources] = entry
+            return entry
+
+
+_selectors: "weakref.WeakKeyDictionary[FAISS, _SourceSelectors]" = weakref.WeakKeyDictionary()
+_selectors_lock = threading.Lock()
+
+
+def _source_selectors(vectorstore: FAISS) -> _SourceSelectors:
+    with _selectors_lock:
+        sel = _selectors.get(vectorstore)
+        if sel is None or sel.fingerprint != index_fingerprint(vectorstore):
+            sel = _SourceSelectors(vectorstore)
+            _selectors[vectorstore] = sel
+        return sel
+
+
+def normalize_source_filter(source_filter: SourceFilter) -> Optional[FrozenSet[str]]:
+    """
+    Accepts one source name or a collection of them; returns casefolded names (None = no filter).
+    """
+    if not source_filter:
+        return None
+    if isinstance(source_filter, str):
+        return frozenset([source_filter.casefold()])
+    return frozenset(str(s).casefold() for s in source_filter)
+
+
+def search_positions(
+    vectorstore: FAISS,
+    vectors: np.ndarray,
+    k: int,
+    sources: Optional[FrozenSet[str]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (distances, FAISS positions) of the top-k vectors per query row, like Index.search,
+    restricted to `sources` if given. `vectors` must already be normalized if the store is.
+
+    On HNSW/IVF indexes, small filters are scanned exactly instead of through the graph/lists,
+    which could miss most of a narrow filter's vectors.
+    """
+    index = vectorstore.index
+    # A ShardedIndex (rag.shards) scatters the search over its shards, each searched by this function.
+    search_shards = getattr(index, "search_shards", None)
+    if search_shards is not None:
+        return search_shards(vectors, k, sources)
+
+    if sources is None:
+        return index.search(vectors, k)
+
+    selector, ids = _source_selectors(vectorstore).selector(sources)
+    if len(ids) == 0:
+        return np.empty((len(vectors), 0), dtype=np.float32), np.empty((len(vectors), 0), dtype=np.int64)
+    if is_approximate(index) and len(ids) <= DEFAULT_ANN_EXACT_FILTER_MAX:
+        return exact_subset_search(index, vectors, ids, k)
+    params = search_parameters(index, selector)
+    return index.search(vectors, min(k, len(ids)), params=params)
+
+
+def retrieve_batch_with_scores_by_vectors(
+    embeddings: Sequence[Sequence[float]],
+    vectorstore: FAISS,
+    k: int = 5,
+    source_filter: SourceFilter = None,
+) -> List[List[Tuple[Document, float]]]:
+    """
+    Top-K search for many already embedded queries as one FAISS matrix query.
+
+    Returns one result list per query, in input order. If source_filter is provided,
+    the scan is restricted to the vectors of those sources (true top-k within the filter).
+    """
+    if len(embeddings) == 0:
+        return []
+
+    faiss = dependable_faiss_import()
+    vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(vectors)
+
+    scores, indices = search_positions(vectorstore, vectors, k, normalize_source_filter(source_filter))
+
+    results: List[List[Tuple[Document, float]]] = []
+    for row_scores, row_indices in zip(scores, indices):
+        docs_and_scores: List[Tuple[Document, float]] = []
+        for score, i in zip(row_scores, row_indices):
+            if i == -1:
+                continue
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(i)])
+            if isinstance(doc, Document):
+                docs_and_scores.append((doc, float(score)))
+
+        docs_and_scores.sort(key=lambda x: x[1])
+        results.append(docs_and_scores[:k])
+    return results
+
+
+def retrieve_with_scores_by_vector(
+    embedding: List[float],
+    vectorstore: FAISS,
+    k: int = 5,
+    source_filter: SourceFilter = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Top-K search over FAISS for an already embedded query.
+
+    If source_filter is provided, the FAISS scan is restricted to the vectors of
+    those sources, so the result is the true top-k within the filter.
+    """
+    return retrieve_batch_with_scores_by_vectors([embedding], vectorstore, k=k, source_filter=source_filter)[0]
+
+
+def embed_queries(texts: Sequence[str], vectorstore: FAISS) -> List[List[float]]:
+    """
+    Embeds many retrieval queries, in one request when the embeddings client supports it.
+    """
+    fn = vectorstore.embedding_function
+    batched = getattr(fn, "embed_queries", None)
+    if batched is not None:
+        return batched(list(texts))
+    return [vectorstore._embed_query(t) for t in texts]
+
+
+def search_batch_by_vectors(
+    queries: Sequence[str],
+    embeddings: Sequence[Sequence[float]],
+    vectorstore: FAISS,
+    k: int = 5,
+    source_filter: SourceFilter = None,
+    mode: Optional[str] = None,
+) -> List[List[Tuple[Document, float]]]:
+    """
+    Batched search_by_vector: one FAISS matrix search, then per-query BM25 fusion in hybrid mode.
+    """
+    if (mode or DEFAULT_RETRIEVAL_MODE) != "hybrid":
+        return retrieve_batch_with_scores_by_vectors(embeddings, vectorstore, k=k, source_filter=source_filter)
+
+    found = retrieve_batch_with_scores_by_vectors(
+        embeddings,
+        vectorstore,
+        k=max(k, DEFAULT_HYBRID_CANDIDATES),
+        source_filter=source_filter,
+    )
+    return [
+        fuse_lexical(q, e, hits, vectorstore, k=k, source_filter=source_filter)
+        for q, e, hits in zip(queries, embeddings, found)
+    ]
+
+
+def retrieve_batch_with_scores(
+    questions: Sequence[str],
+    vectorstore: FAISS,
+    k: int = 5,
+    source_filter: SourceFilter = None,
+    mode: Optional[str] = None,
+) -> List[List[Tuple[Document, float]]]:
+    """
+    Batched retrieve_with_scores: questions without a decisive keyword match share
+    one embedding request and one FAISS matrix search.
+    """
+    results: List[Optional[List[Tuple[Document, float]]]] = [
+        lexical_fast_path(q, vectorstore, k=k, source_filter=source_filter, mode=mode) for q in questions
+    ]
+    todo = [i for i, r in enumerate(results) if r is None]
+    if todo:
+        queries = [questions[i] for i in todo]
+        embeddings = embed_queries(queries, vectorstore)
+        found = search_batch_by_vectors(queries, embeddings, vectorstore, k=k, source_filter=source_filter, mode=mode)
+        for i, hits in zip(todo, found):
+            results[i] = hits
+    return [r or [] for r in results]
+
+
+def lexical_fast_path(
+    query: str,
+    vectorstore: FAISS,
+    k: int = 5,
+    source_filter: SourceFilter = None,
+    mode: Optional[str] = None,
+) -> Optional[List[Tuple[Document, float]]]:
+    """
+    Keyword-only retrieval that skips the query embedding, or None when it is not decisive.
+
+    Decisive means: a short keyword-like query whose terms are all rare in the corpus,
+    chunks that contain every term, and a top BM25 score clearly above any partial match.
+    Only full matches are returned, with distance 0.0: there is no query vector to measure
+    a real one, so they pass any relevance gate. Hence opt-in (DEFAULT_LEXICAL_FAST_PATH).
+    """
+    if (mode or DEFAULT_RETRIEVAL_MODE) != "hybrid" or not DEFAULT_LEXICAL_FAST_PATH:
+        return None
+
+    index = lexical_state(vectorstore).index
+    terms = index.query_terms(query)
+    if not terms or len(terms) > DEFAULT_FAST_PATH_MAX_TERMS:
+        return None
+    for term in terms:
+        df = index.document_frequency(term)
+        if df == 0 or df > DEFAULT_FAST_PATH_MAX_DF * len(index):
+            return None
+
+    hits, n_terms = index.search(query, max(k, DEFAULT_HYBRID_CANDIDATES), normalize_source_filter(source_filter))
+    full = [h for h in hits if h[2] == n_terms]
+    partial = [h for h in hits if h[2] < n_terms]
+    if not full:
+        return None
+    if partial and full[0][1] < DEFAULT_FAST_PATH_MARGIN * partial[0][1]:
+        return None
+
+    docs_and_scores: List[Tuple[Document, float]] = []
+    for pos, _, _ in full[:k]:
+        doc = vectorstore.docstore.search(index.doc_ids[pos])
+        if isinstance(doc, Document):
+            docs_and_scores.append((doc, 0.0))
+    return docs_and_scores or None
+
+
+def _distances(vectorstore: FAISS, embedding: Sequence[float], positions: np.ndarray) -> Optional[np.ndarray]:
+    """
+    The distances FAISS would report between the query and the vectors at `positions`.
+    """
+    faiss = dependable_faiss_import()
+    query = np.asarray([embedding], dtype=np.float32)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(query)
+    try:
+        vectors = vectorstore.index.reconstruct_batch(positions)
+    except RuntimeError:
+        return None
+    if vectorstore.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        return vectors @ query[0]
+    return ((vectors - query[0]) ** 2).sum(axis=1)
+
+
+def fuse_lexical(
+    query: str,
+    embedding: Sequence[float],
+    vector_hits: List[Tuple[Document, float]],
+    vectorstore: FAISS,
+    k: int = 5,
+    source_filter: SourceFilter = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Reciprocal rank fusion of vector hits with BM25 hits for the same query.
+
+    RRF decides which k chunks are returned; they are then ordered by their vector
+    distance (computed for lexical-only hits), so the distance gate works unchanged.
+    """
+    state = lexical_state(vectorstore)
+    index = state.index
+    lexical, _ = index.search(query, max(k, DEFAULT_HYBRID_CANDIDATES), normalize_source_filter(source_filter))
+    if not lexical:
+        return vector_hits[:k]
+
+    # Keyed by docstore id, and lexical-only Documents are built only if they make the
+    # top k (a CompactDocstore builds a new Document per lookup). Documents without an
+    # id (old pickled indexes) are matched by identity instead.
+    by_id = all(doc.id for doc, _ in vector_hits)
+    fused: Dict[Any, float] = {}
+    candidates: Dict[Any, Tuple[Optional[Document], Optional[float]]] = {}
+    for rank, (doc, score) in enumerate(vector_hits):
+        key = doc.id if by_id else id(doc)
+        fused[key] = 1.0 / (DEFAULT_RRF_K + rank + 1)
+        candidates[key] = (doc, score)
+
+    lexical_only: Dict[Any, Tuple[str, int]] = {}
+    for rank, (pos, _, _) in enumerate(lexical):
+        doc_id = index.doc_ids[pos]
+        key: Any = doc_id
+        if not by_id:
+            doc = vectorstore.docstore.search(doc_id)
+            if not isinstance(doc, Document):
+                continue
+            key = id(doc)
+        fused[key] = fused.get(key, 0.0) + 1.0 / (DEFAULT_RRF_K + rank + 1)
+        if key not in candidates:
+            candidates[key] = (None if by_id else doc, None)
+            lexical_only[key] = (doc_id, int(state.faiss_positions[pos]))
+
+    top = sorted(fused, key=lambda key: -fused[key])[:k]
+    need = []
+    for key in top:
+        if key not in lexical_only or lexical_only[key][1] < 0:
+            continue
+        doc = candidates[key][0]
+        if doc is None:
+            doc = vectorstore.docstore.search(lexical_only[key][0])
+            if not isinstance(doc, Document):
+                continue
+            candidates[key] = (doc, None)
+        need.append((key, lexical_only[key][1]))
+
+    distances = _distances(vectorstore, embedding, np.asarray([p for _, p in need], dtype=np.int64)) if need else None
+    if distances is not None:
+        for (key, _), dist in zip(need, distances):
+            candidates[key] = (candidates[key][0], float(dist))
+
+    docs_and_scores = [
+        (doc, dist) for doc, dist in (candidates[key] for key in top) if doc is not None and dist is not None
+    ]
+    docs_and_scores.sort(key=lambda x: x[1])
+    return docs_and_scores
+
+
+def search_by_vector(
+    query: str,
+    embedding: List[float],
+    vectorstore: FAISS,
+    k: int = 5,
+    source_filter: SourceFilter = None,
+    mode: Optional[str] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Vector search for an embedded query; in hybrid mode fused with BM25 ranks.
+    """
+    if (mode or DEFAULT_RETRIEVAL_MODE) != "hybrid":
+        return retrieve_with_scores_by_vector(embedding, vectorstore, k=k, source_filter=source_filter)
+
+    hits = retrieve_with_scores_by_vector(
+        embedding,
+        vectorstore,
+        k=max(k, DEFAULT_HYBRID_CANDIDATES),
+        source_filter=source_filter,
+    )
+    return fuse_lexical(query, embedding, hits, vectorstore, k=k, source_filter=source_filter)
+
+
 def retrieve_with_scores(
     question: str,
     vectorstore: FAISS,
     k: int = 5,
-    source_filter: Optional[str] = None,
-    oversample_k: int = 5,
+    source_filter: SourceFilter = None,
+    mode: Optional[str] = None,
 ) -> List[Tuple[Document, float]]:
     """
     Top-K search over FAISS.
 
     Note: FAISS returns distance scores (lower = more similar).
-    If source_filter is provided, we oversample then filter by metadata["source"].
+    source_filter may be a single source name or a collection of source names.
+    `mode` is "vector" or "hybrid" (default: DEFAULT_RETRIEVAL_MODE). In hybrid mode
+    a decisive keyword match may be answered from the BM25 index without embedding the question.
     """
-    k_fetch = max(k * oversample_k, k)
+    fast = lexical_fast_path(question, vectorstore, k=k, source_filter=source_filter, mode=mode)
+    if fast is not None:
+        return fast
 
-    docs_and_scores: List[Tuple[Document, float]] = (
-        vectorstore.similarity_search_with_score(question, k=k_fetch)
-    )
+    embedding = vectorstore._embed_query(question)
+    return search_by_vector(question, embedding, vectorstore, k=k, source_filter=source_filter, mode=mode)
 
-    if source_filter:
-        sf = source_filter.casefold()
-        docs_and_scores = [
-            (d, s)
-            for (d, s) in docs_and_scores
-            if str(d.metadata.get("source", "")).casefold() == sf
-        ]
 
-    docs_and_scores.sort(key=lambda x: x[1])
-    return docs_and_scores[:k]
+async def aretrieve_with_scores(
+    question: str,
+    vectorstore: FAISS,
+    k: int = 5,
+    source_filter: SourceFilter = None,
+    mode: Optional[str] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Async variant of retrieve_with_scores: the query embedding is awaited,
+    the (in-process) FAISS search itself runs inline.
+    """
+    fast = lexical_fast_path(question, vectorstore, k=k, source_filter=source_filter, mode=mode)
+    if fast is not None:
+        return fast
+
+    embedding = await vectorstore._aembed_query(question)
+    return search_by_vector(question, embedding, vectorstore, k=k, source_filter=source_filter, mode=mode)
+
+
+def default_max_distance(vectorstore: FAISS) -> float:
+    """
+    Relevance gate for the vectorstore's embeddings: their own `max_distance` when the
+    backend is calibrated differently (e.g. hashing), else DEFAULT_MAX_DISTANCE.
+    """
+    value = getattr(getattr(vectorstore, "embedding_function", None), "max_distance", None)
+    return float(value) if value is not None else DEFAULT_MAX_DISTANCE
 
 
 def gate_and_select_contexts(
     docs_and_scores: List[Tuple[Document, float]],
     max_distance: float,
     max_contexts: int = 5,
+    injection_policy: str = DEFAULT_INJECTION_POLICY,
 ) -> List[Document]:
     """
     Applies a relevance gate to retrieved documents to prevent hallucinations.
 
     If the best similarity score exceeds the maximum allowed distance, no context is returned,
-    forcing a safe "not in documents" response.
+    forcing a safe "not in documents" response. With injection_policy="drop", chunks flagged
+    at ingest are skipped (the next relevant chunk takes their place).
 
     Returns:
         A list of documents whose scores are within the relevance threshold.
@@ -78,6 +540,8 @@ def gate_and_select_contexts(
 
     contexts: List[Document] = []
     for d, s in docs_and_scores:
+        if injection_policy == "drop" and is_flagged(d):
+            continue
         if s <= max_distance:
             contexts.append(d)
         if len(contexts) >= max_contexts:
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from rag.config import DEFAULT_REWRITE_MEMO_MAX_ENTRIES
+
+_WORD = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+# Words that only make sense with the previous turns in view.
+_REFERENCES = frozenset({
+    "it", "its", "it's", "itself",
+    "they", "them", "their", "theirs", "themselves", "they're",
+    "he", "him", "his", "she", "her", "hers",
+    "this", "these", "those", "one", "ones",
+    "former", "latter", "aforementioned", "above", "previous", "previously",
+    "earlier", "same", "such", "else", "further", "more", "other", "another",
+})
+# "that" is a back reference after these ("what is that", "why does that matter"),
+# but a relative pronoun after a noun ("models that predict readmission").
+_THAT_AFTER = frozenset({
+    "is", "was", "are", "were", "be", "does", "do", "did", "about", "of", "for", "in",
+    "on", "with", "from", "by", "to", "explain", "mean", "means", "like", "than",
+    "what", "why", "how", "when", "where", "which", "who", "and", "but", "or",
+})
+# Openers of elliptical follow-ups ("and for children?", "what about costs?").
+_OPENERS = (
+    ("and",), ("but",), ("so",), ("or",), ("also",), ("then",),
+    ("what", "about"), ("how", "about"), ("why", "not"), ("how", "so"),
+    ("tell", "me", "more"), ("go", "on"), ("can", "you", "elaborate"),
+)
+# Shorter questions are usually fragments of the previous turn ("why?", "how much?").
+_MIN_STANDALONE_WORDS = 3
+# Up to this length, "the ..." usually points at something named in the previous turn
+# ("what are the benefits?", "what data does the model need?").
+_MAX_DEFINITE_FOLLOWUP_WORDS = 7
+
+
+def needs_rewrite(question: str) -> bool:
+    """
+    True when a follow-up question refers back to the conversation (pronouns,
+    demonstratives, "the latter", elliptical openers, one- or two-word fragments),
+    or a short question says "the ..." without naming its subject, so it must be
+    rewritten with the chat history before retrieval.
+
+    Errs towards True: a needless rewrite only costs an LLM call, a skipped one
+    can retrieve the wrong chunks.
+    """
+    words = _WORD.findall((question or "").lower())
+    if len(words) < _MIN_STANDALONE_WORDS:
+        return True
+    if any(tuple(words[:len(o)]) == o for o in _OPENERS):
+        return True
+
+    if len(words) <= _MAX_DEFINITE_FOLLOWUP_WORDS and "the" in words:
+        return True
+
+    for i, w in enumerate(words):
+        if w in _REFERENCES:
+            return True
+        if w == "that" and (i == 0 or i == len(words) - 1 or words[i - 1] in _THAT_AFTER):
+            return True
+    return False
+
+
+def _key(memory_text: str, question: str) -> Tuple[str, str]:
+    return " ".join((memory_text or "").split()), " ".join((question or "").lower().split())
+
+
+class RewriteMemo:
+    """
+    Thread-safe LRU of accepted rewrites per (chat memory, question), both
+    whitespace-normalized, so a repeated follow-up skips the rewrite LLM call.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_REWRITE_MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, memory_text: str, question: str) -> Optional[str]:
+        key = _key(memory_text, question)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, memory_text: str, question: str, rewritten: str) -> None:
+        if self.max_entries <= 0:
+            return
+        key = _key(memory_text, question)
+        with self._lock:
+            self._entries[key] = rewritten
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_memo: Optional[RewriteMemo] = None
+_memo_lock = threading.Lock()
+
+
+def get_rewrite_memo() -> RewriteMemo:
+    """
+    Process-wide rewrite memo shared by every session.
+    """
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            _memo = RewriteMemo()
+        return _memo
@@ -0,0 +1,434 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from rag.batch import question_entry, result_record
+from rag.clients import get_client_registry
+from rag.config import (
+    DEFAULT_BATCH_CONCURRENCY,
+    DEFAULT_INDEX_DIR,
+    DEFAULT_LLM_MODEL,
+    DEFAULT_MAX_CONTEXTS,
+    DEFAULT_PDF_DIR,
+    DEFAULT_SERVER_CONCURRENCY,
+    DEFAULT_SERVER_HOST,
+    DEFAULT_SERVER_MAX_BATCH,
+    DEFAULT_SERVER_MAX_BODY_BYTES,
+    DEFAULT_SERVER_MAX_QUEUE,
+    DEFAULT_SERVER_PORT,
+    DEFAULT_SERVER_TIMEOUT_SECONDS,
+    DEFAULT_TOP_K,
+)
+from rag.metrics import get_metrics, prometheus_text
+from rag.qa_chain import answer_question_async, answer_questions
+from rag.shards import shard_stats
+from rag.warmup import IndexWarmup
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Index built with the stub server's n-gram embeddings; kept apart from the real index.
+STUB_INDEX_DIR = "data/processed/stub_index"
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+async def read_body(receive: Receive, limit: int) -> bytes:
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            raise HTTPError(413, f"request body larger than {limit} bytes")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_response(
+    send: Send,
+    status: int,
+    body: bytes,
+    content_type: str = "application/json",
+    headers: Sequence[Tuple[bytes, bytes]] = (),
+) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type.encode("latin-1")),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send: Send, status: int, payload: Any, headers: Sequence[Tuple[bytes, bytes]] = ()) -> None:
+    await send_response(send, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), headers=headers)
+
+
+def _field(body: Dict[str, Any], name: str, kind: Any, default: Any) -> Any:
+    value = body.get(name, default)
+    if value is default:
+        return value
+    # bool is an int subclass; it is never a valid count or distance here.
+    if not isinstance(value, kind) or (isinstance(value, bool) and kind is not bool):
+        raise HTTPError(400, f"'{name}' has the wrong type")
+    return value
+
+
+def _source_filter(body: Dict[str, Any]) -> Optional[List[str]]:
+    value = body.get("source_filter")
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return value
+    raise HTTPError(400, "'source_filter' must be a string or a list of strings")
+
+
+def retrieval_args(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Retrieval options shared by /ask and /batch, validated (defaults from rag.config).
+    """
+    args = {
+        "k": _field(body, "k", int, DEFAULT_TOP_K),
+        # None: the relevance gate of the index's embedding backend.
+        "max_distance": _field(body, "max_distance", (int, float), None),
+        "max_contexts": _field(body, "max_contexts", int, DEFAULT_MAX_CONTEXTS),
+        "source_filter": _source_filter(body),
+        "use_cache": _field(body, "use_cache", bool, True),
+    }
+    if not 1 <= args["k"] <= 100 or not 1 <= args["max_contexts"] <= 100:
+        raise HTTPError(400, "'k' and 'max_contexts' must be between 1 and 100")
+    return args
+
+
+class RAGServer:
+    """
+    ASGI application answering questions over one shared vectorstore.
+
+    POST /ask     {"question", "memory"?, "source_filter"?, "k"?, "max_distance"?, "max_contexts"?, "use_cache"?}
+    POST /batch   {"questions": [string | {"question", "id"?, "memory"?}], ...same options}
+    GET  /health  200 once the index is loaded, 503 before (for load balancer readiness checks)
+    GET  /stats   JSON: server, pipeline metrics, recent latencies, HTTP client pool, corpus,
+                  per-shard size and search latency (sharded index)
+    GET  /metrics Prometheus text
+
+    At most `concurrency` requests are answered at once and `max_queue` more may wait for
+    a slot; beyond that requests are rejected with 503 + Retry-After. A request that takes
+    longer than `timeout` seconds (waiting included) gets 504. /ask runs on the event loop
+    (async pipeline); /batch runs answer_questions on a thread and keeps its slot until
+    that thread finishes, even after a timeout.
+    """
+
+    def __init__(
+        self,
+        warmup: IndexWarmup,
+        concurrency: int = DEFAULT_SERVER_CONCURRENCY,
+        max_queue: int = DEFAULT_SERVER_MAX_QUEUE,
+        timeout: float = DEFAULT_SERVER_TIMEOUT_SECONDS,
+        max_batch: int = DEFAULT_SERVER_MAX_BATCH,
+        max_body_bytes: int = DEFAULT_SERVER_MAX_BODY_BYTES,
+        batch_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        model: str = DEFAULT_LLM_MODEL,
+        wait_for_index: bool = False,
+    ):
+        self.warmup = warmup
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.max_body_bytes = max_body_bytes
+        self.batch_concurrency = batch_concurrency
+        self.model = model
+        self.wait_for_index = wait_for_index
+
+        self.in_flight = 0
+        self.queued = 0
+        self.counters = {"requests": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="rag-batch")
+        self._routes: Dict[str, Dict[str, Callable[[Receive, Send], Awaitable[None]]]] = {
+            "/ask": {"POST": self._ask},
+            "/batch": {"POST": self._batch},
+            "/health": {"GET": self._health},
+            "/stats": {"GET": self._stats},
+            "/metrics": {"GET": self._metrics},
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        methods = self._routes.get(scope["path"])
+        try:
+            if methods is None:
+                raise HTTPError(404, f"unknown path {scope['path']}")
+            handler = methods.get(scope["method"])
+            if handler is None:
+                raise HTTPError(405, f"use {', '.join(methods)} for {scope['path']}")
+            await handler(receive, send)
+        except HTTPError as exc:
+            headers = [(b"retry-after", str(exc.retry_after).encode())] if exc.retry_after else []
+            await send_json(send, exc.status, {"error": exc.message}, headers=headers)
+        except Exception as exc:
+            self.counters["errors"] += 1
+            await send_json(send, 500, {"error": f"{type(exc).__name__}: {exc}"})
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.warmup.start()
+                if self.wait_for_index:
+                    await asyncio.get_running_loop().run_in_executor(None, self.warmup.wait)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                await get_client_registry().aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _acquire(self) -> None:
+        """
+        Waits for a worker slot, or rejects the request when the wait queue is full.
+        """
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.counters["rejected"] += 1
+            raise HTTPError(503, "server busy", retry_after=1)
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def _with_timeout(self, work: Awaitable[Any]) -> Any:
+        try:
+            return await asyncio.wait_for(work, self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise HTTPError(504, f"no answer within {self.timeout:g}s") from None
+
+    def _vectorstore(self) -> Any:
+        vs = self.warmup.vectorstore
+        if vs is None:
+            status = self.warmup.status()
+            raise HTTPError(503, f"index not ready ({status.state})", retry_after=1)
+        return vs
+
+    async def _json_body(self, receive: Receive) -> Dict[str, Any]:
+        raw = await read_body(receive, self.max_body_bytes)
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            raise HTTPError(400, "request body is not valid JSON") from None
+        if not isinstance(body, dict):
+            raise HTTPError(400, "request body must be a JSON object")
+        return body
+
+    async def _ask(self, receive: Receive, send: Send) -> None:
+        body = await self._json_body(receive)
+        question = body.get("question")
+        if not isinstance(question, str) or not question.strip():
+            raise HTTPError(400, "'question' must be a non-empty string")
+        memory = _field(body, "memory", str, "")
+        args = retrieval_args(body)
+        vectorstore = self._vectorstore()
+        self.counters["requests"] += 1
+
+        async def answer() -> Any:
+            await self._acquire()
+            try:
+                return await answer_question_async(
+                    question, vectorstore, model=self.model, memory_text=memory, **args
+                )
+            finally:
+                self._release()
+
+        result = await self._with_timeout(answer())
+        await send_json(send, 200, {
+            "answer": result.answer,
+            "citations": result.citations,
+            "timings": result.timings.as_dict() if result.timings is not None else None,
+        })
+
+    async def _batch(self, receive: Receive, send: Send) -> None:
+        body = await self._json_body(receive)
+        records = body.get("questions")
+        if not isinstance(records, list) or not records:
+            raise HTTPError(400, "'questions' must be a non-empty list")
+        if len(records) > self.max_batch:
+            raise HTTPError(413, f"at most {self.max_batch} questions per batch")
+        try:
+            entries = [question_entry(r, i) for i, r in enumerate(records)]
+        except ValueError as exc:
+            raise HTTPError(400, f"questions: {exc}") from None
+        args = retrieval_args(body)
+        vectorstore = self._vectorstore()
+        self.counters["requests"] += 1
+
+        run = partial(
+            answer_questions,
+            [q for _, q, _ in entries],
+            vectorstore,
+            model=self.model,
+            memory_texts=[m for _, _, m in entries],
+            max_concurrency=self.batch_concurrency,
+            **args,
+        )
+
+        async def answer() -> Any:
+            await self._acquire()
+            try:
+                future = asyncio.get_running_loop().run_in_executor(self._pool, run)
+            except BaseException:
+                self._release()
+                raise
+            # The thread cannot be cancelled: its slot is freed when it finishes.
+            future.add_done_callback(lambda _: self._release())
+            return await asyncio.shield(future)
+
+        items = await self._with_timeout(answer())
+        await send_json(send, 200, {
+            "results": [result_record(item_id, item) for (item_id, _, _), item in zip(entries, items)],
+        })
+
+    async def _health(self, receive: Receive, send: Send) -> None:
+        status = self.warmup.status()
+        await send_json(send, 200 if status.ready else 503, {
+            "status": status.state,
+            "message": status.message,
+            "error": status.error,
+            "elapsed_s": round(status.elapsed, 3),
+            "files_done": status.files_done,
+            "files_total": status.files_total,
+        })
+
+    def server_stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            **self.counters,
+        }
+
+    async def _stats(self, receive: Receive, send: Send) -> None:
+        metrics = get_metrics()
+        corpus = self.warmup.corpus()
+        await send_json(send, 200, {
+            "server": self.server_stats(),
+            "index": {
+                "status": self.warmup.status().state,
+                "documents": len(corpus["documents"]),
+                "pages": corpus["pages"],
+                "chunks": corpus["chunks"],
+            },
+            "metrics": metrics.stats(),
+            "latency": metrics.recent_breakdown(),
+            "clients": get_client_registry().stats(),
+            "shards": shard_stats(self.warmup.vectorstore),
+        })
+
+    async def _metrics(self, receive: Receive, send: Send) -> None:
+        stats = self.server_stats()
+        lines = [prometheus_text(get_metrics()).rstrip("\n")]
+        for name, kind, help_text in (
+            ("in_flight", "gauge", "Requests being answered."),
+            ("queued", "gauge", "Requests waiting for a worker slot."),
+            ("requests", "counter", "/ask and /batch requests received."),
+            ("rejected", "counter", "Requests rejected because the queue was full."),
+            ("timeouts", "counter", "Requests that hit the request timeout."),
+            ("errors", "counter", "Requests that failed with an internal error."),
+        ):
+            metric = f"rag_server_{name}" + ("_total" if kind == "counter" else "")
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}", f"{metric} {stats[name]}"]
+        await send_response(send, 200, ("\n".join(lines) + "\n").encode("utf-8"), content_type="text/plain; version=0.0.4")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m rag.server",
+        description="Serve the RAG pipeline over HTTP (ask/batch/health/stats).",
+    )
+    parser.add_argument("--host", default=DEFAULT_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVER_PORT)
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    parser.add_argument("--index-dir", help=f"default: {DEFAULT_INDEX_DIR} ({STUB_INDEX_DIR} with --stub)")
+    parser.add_argument("--model", default=DEFAULT_LLM_MODEL)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_SERVER_CONCURRENCY)
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_SERVER_MAX_QUEUE)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_SERVER_TIMEOUT_SECONDS)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_SERVER_MAX_BATCH)
+    parser.add_argument("--batch-concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY)
+    parser.add_argument("--wait", action="store_true", help="load the index before accepting connections")
+    parser.add_argument("--stub", action="store_true", help="use a local stub embedding/chat server (offline)")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="stub response latency in seconds")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    from dotenv import load_dotenv
+    from rag.vectorstore import get_vectorstore
+
+    load_dotenv()
+    index_dir = args.index_dir or (STUB_INDEX_DIR if args.stub else DEFAULT_INDEX_DIR)
+    loader = partial(get_vectorstore, pdf_dir=args.pdf_dir, index_dir=index_dir)
+
+    stub = None
+    if args.stub:
+        from rag.clients import RegistryEmbeddings, configure_clients
+        from rag.stubs import StubOpenAIServer
+
+        stub = StubOpenAIServer(latency_seconds=args.stub_latency).start()
+        configure_clients(base_url=stub.base_url, api_key="stub", tokenize_embeddings=False)
+        # Uncached, and recorded in the manifest under a model name of its own (stub indexes
+        # built with the earlier random 64-d vectors are reported as mismatched, not searched).
+        loader = partial(loader, embeddings=RegistryEmbeddings("stub-hashing-ngram"))
+
+    app = RAGServer(
+        IndexWarmup(loader=loader, index_dir=index_dir),
+        concurrency=args.concurrency,
+        max_queue=args.max_queue,
+        timeout=args.timeout,
+        max_batch=args.max_batch,
+        batch_concurrency=args.batch_concurrency,
+        model=args.model,
+        wait_for_index=args.wait,
+    )
+    try:
+        uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+    finally:
+        if stub is not None:
+            stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,589 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from rag.ann import IndexSpec, configure_search
+from rag.config import (
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_EMBED_BATCH_SIZE,
+    DEFAULT_EMBED_CONCURRENCY,
+    DEFAULT_INDEX_DIR,
+    DEFAULT_INDEX_MMAP,
+    DEFAULT_INDEX_SHARDS,
+    DEFAULT_INGEST_WORKERS,
+    DEFAULT_METRICS_RECENT,
+    DEFAULT_PDF_DIR,
+    DEFAULT_SHARD_BUILD_WORKERS,
+    DEFAULT_SHARD_BY,
+    DEFAULT_SHARD_SEARCH_WORKERS,
+)
+from rag.embeddings import embedding_info, get_cached_embeddings
+from rag.ingest import IngestResult, IngestStats
+from rag.lexical import load_or_build_lexical_index
+from rag.loaders import list_pdfs
+from rag.manifest import diff_corpus, load_manifest, new_manifest, save_manifest
+from rag.retriever import search_positions
+from rag.vectorstore import LEGACY_PICKLE, SHARDS_DIR, build_vectorstore, load_index
+
+SHARD_MODES = ("hash", "source")
+
+
+def shard_of(source: str, count: int, by: str = DEFAULT_SHARD_BY) -> str:
+    """
+    Name of the shard holding a PDF. Whole files go to one shard, so a changed PDF
+    touches one shard and a source filter only needs the shards of its sources.
+
+    - by="hash": one of `count` shards, from a stable hash of the file name.
+    - by="source": a shard of its own, named after the file.
+    """
+    if by not in SHARD_MODES:
+        raise ValueError(f"Unknown shard mode {by!r}; expected one of {SHARD_MODES}")
+    digest = hashlib.blake2b(source.encode("utf-8"), digest_size=8).hexdigest()
+    if by == "source":
+        stem = re.sub(r"[^\w.-]+", "_", Path(source).stem)[:48]
+        return f"{stem}-{digest[:8]}"
+    return f"shard-{int(digest, 16) % max(1, count):03d}"
+
+
+def assign_shards(names: Iterable[str], count: int, by: str = DEFAULT_SHARD_BY) -> Dict[str, List[str]]:
+    """
+    Shard name -> the file names it holds (shards without files are left out).
+    """
+    groups: Dict[str, List[str]] = {}
+    for name in sorted(names):
+        groups.setdefault(shard_of(name, count, by), []).append(name)
+    return groups
+
+
+class ShardedDocstore(Docstore):
+    """
+    Read-only view over the docstores of several shards (chunk ids are unique across them).
+    """
+
+    def __init__(self, docstores: Sequence[Docstore], owner: Dict[str, int]):
+        self.docstores = list(docstores)
+        self._owner = owner
+
+    def __len__(self) -> int:
+        return len(self._owner)
+
+    def search(self, search: str) -> Union[str, Document]:
+        shard = self._owner.get(search)
+        if shard is None:
+            return f"ID {search} not found."
+        return self.docstores[shard].search(search)
+
+    def source(self, doc_id: str) -> Optional[str]:
+        shard = self._owner.get(doc_id)
+        if shard is None:
+            return None
+        docstore = self.docstores[shard]
+        source_of = getattr(docstore, "source", None)
+        if source_of is not None:
+            return source_of(doc_id)
+        doc = docstore.search(doc_id)
+        if not isinstance(doc, Document) or doc.metadata.get("source") is None:
+            return None
+        return str(doc.metadata["source"])
+
+
+_search_pool: Optional[ThreadPoolExecutor] = None
+_search_pool_lock = threading.Lock()
+
+
+def get_shard_search_pool() -> ThreadPoolExecutor:
+    """
+    Process-wide thread pool for shard searches, shared by every sharded index (so a
+    reloaded or rebuilt index leaves no pool behind).
+    """
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=DEFAULT_SHARD_SEARCH_WORKERS, thread_name_prefix="rag-shard")
+        return _search_pool
+
+
+class ShardedIndex:
+    """
+    Read-only stand-in for a FAISS index over several shard vectorstores.
+
+    Global position = shard offset + position within the shard. Searches run on every
+    shard that can match (all, or those holding a filtered source) concurrently on `pool`
+    (default: the shared shard search pool; FAISS releases the GIL), each through
+    retriever.search_positions, and the per-shard top-k lists are merged into the exact
+    global top-k: every global top-k vector is in its own shard's top-k, and distances
+    are the shards' own.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        shards: Sequence[FAISS],
+        sources: Sequence[FrozenSet[str]],
+        pool: Optional[ThreadPoolExecutor] = None,
+    ):
+        if not shards:
+            raise ValueError("A sharded index needs at least one shard")
+        self.names = list(names)
+        self.shards = list(shards)
+        self.sources = list(sources)
+        self.offsets = np.cumsum([0] + [s.index.ntotal for s in self.shards]).astype(np.int64)
+        self.ntotal = int(self.offsets[-1])
+        self.d = self.shards[0].index.d
+        self.metric_type = self.shards[0].index.metric_type
+        self.is_trained = True
+
+        self._pool = pool
+        self._searches = [0] * len(self.shards)
+        self._seconds = [0.0] * len(self.shards)
+        self._recent: List[Deque[float]] = [deque(maxlen=DEFAULT_METRICS_RECENT) for _ in self.shards]
+        self._lock = threading.Lock()
+
+    def _search_one(self, shard: int, vectors: np.ndarray, k: int, sources: Optional[FrozenSet[str]]):
+        start = time.perf_counter()
+        scores, positions = search_positions(self.shards[shard], vectors, k, sources)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._searches[shard] += 1
+            self._seconds[shard] += elapsed
+            self._recent[shard].append(elapsed)
+        return scores, np.where(positions >= 0, positions + self.offsets[shard], -1)
+
+    def search_shards(
+        self,
+        vectors: np.ndarray,
+        k: int,
+        sources: Optional[FrozenSet[str]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (distances, global positions) of the top-k per query row, best first.
+        """
+        targets = [i for i, s in enumerate(self.sources) if sources is None or s & sources]
+        if not targets:
+            return np.empty((len(vectors), 0), dtype=np.float32), np.empty((len(vectors), 0), dtype=np.int64)
+        if len(targets) == 1:
+            parts = [self._search_one(targets[0], vectors, k, sources)]
+        else:
+            pool = self._pool or get_shard_search_pool()
+            futures = [pool.submit(self._search_one, i, vectors, k, sources) for i in targets]
+            parts = [f.result() for f in futures]
+
+        scores = np.hstack([p[0] for p in parts]).astype(np.float32, copy=False)
+        positions = np.hstack([p[1] for p in parts])
+        faiss = dependable_faiss_import()
+        # Inner product: larger is better. Empty slots (-1) sort last either way.
+        key = -scores if self.metric_type == faiss.METRIC_INNER_PRODUCT else scores.copy()
+        key[positions < 0] = np.inf
+        order = np.argsort(key, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(positions, order, axis=1)
+
+    def search(self, x: np.ndarray, k: int, params: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        if params is not None:
+            raise ValueError("Filter sharded searches by source (search_shards), not with FAISS search parameters")
+        return self.search_shards(np.asarray(x, dtype=np.float32), k)
+
+    def reconstruct_batch(self, positions: Any) -> np.ndarray:
+        positions = np.asarray(positions, dtype=np.int64)
+        out = np.empty((len(positions), self.d), dtype=np.float32)
+        shard_of_position = np.searchsorted(self.offsets, positions, side="right") - 1
+        for shard in np.unique(shard_of_position):
+            mask = shard_of_position == shard
+            out[mask] = self.shards[shard].index.reconstruct_batch(positions[mask] - self.offsets[shard])
+        return out
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        return self.reconstruct_batch([position])[0]
+
+    def reconstruct_n(self, start: int, n: int) -> np.ndarray:
+        return self.reconstruct_batch(np.arange(start, start + n))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-shard size and search latency (mean over all searches, percentiles over recent ones).
+        """
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for i, name in enumerate(self.names):
+                recent = sorted(self._recent[i])
+
+                def pct(q: float) -> Optional[float]:
+                    return round(recent[min(len(recent) - 1, int(q * len(recent)))] * 1000, 3) if recent else None
+
+                out[name] = {
+                    "vectors": int(self.offsets[i + 1] - self.offsets[i]),
+                    "searches": self._searches[i],
+                    "mean_ms": round(self._seconds[i] / self._searches[i] * 1000, 3) if self._searches[i] else None,
+                    "p50_ms": pct(0.5),
+                    "p95_ms": pct(0.95),
+                    "max_ms": round(recent[-1] * 1000, 3) if recent else None,
+                }
+        return out
+
+
+def shard_stats(vectorstore: Optional[FAISS]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    ShardedIndex.stats() of a sharded vectorstore, else None.
+    """
+    index = getattr(vectorstore, "index", None)
+    return index.stats() if isinstance(index, ShardedIndex) else None
+
+
+def assemble(
+    names: Sequence[str],
+    shards: Sequence[FAISS],
+    sources: Sequence[Iterable[str]],
+    embeddings: Embeddings,
+    pool: Optional[ThreadPoolExecutor] = None,
+) -> FAISS:
+    """
+    One FAISS vectorstore over the shards, usable everywhere a single index is (search,
+    source filters, hybrid fusion, answer cache) except for adding or deleting chunks.
+    """
+    index = ShardedIndex(names, shards, [frozenset(str(s).casefold() for s in src) for src in sources], pool)
+    index_to_docstore_id: Dict[int, str] = {}
+    owner: Dict[str, int] = {}
+    for i, shard in enumerate(shards):
+        offset = int(index.offsets[i])
+        for pos, doc_id in shard.index_to_docstore_id.items():
+            index_to_docstore_id[offset + pos] = doc_id
+            owner[doc_id] = i
+    return FAISS(embeddings, index, ShardedDocstore([s.docstore for s in shards], owner), index_to_docstore_id)
+
+
+def is_sharded(index_dir: str) -> bool:
+    return bool(((load_manifest(index_dir) or {}).get("shards") or {}).get("names"))
+
+
+def shard_dir(index_dir: str, name: str) -> str:
+    return str(Path(index_dir) / SHARDS_DIR / name)
+
+
+def _sum_stats(parts: Iterable[IngestStats], total_files: int) -> IngestStats:
+    total = IngestStats(total_files=total_files, workers=0)
+    for stats in parts:
+        for f in fields(IngestStats):
+            if f.name not in ("total_files", "wall_seconds"):
+                setattr(total, f.name, getattr(total, f.name) + getattr(stats, f.name))
+    total.workers = max(1, total.workers)
+    return total
+
+
+class _MergedProgress:
+    """
+    Reports the running total of shards built in parallel to one progress callback.
+    """
+
+    def __init__(self, progress: Optional[Callable[[IngestStats], None]], total_files: int):
+        self.progress = progress
+        self.total_files = total_files
+        self._parts: Dict[str, IngestStats] = {}
+        self._lock = threading.Lock()
+
+    def for_shard(self, name: str) -> Optional[Callable[[IngestStats], None]]:
+        if self.progress is None:
+            return None
+
+        def report(stats: IngestStats) -> None:
+            with self._lock:
+                self._parts[name] = stats
+                self.progress(_sum_stats(self._parts.values(), self.total_files))
+
+        return report
+
+
+def _build_shards(
+    groups: Dict[str, List[Path]],
+    index_dir: str,
+    embeddings: Embeddings,
+    index_spec: IndexSpec,
+    chunk_size: int,
+    chunk_overlap: int,
+    workers: int,
+    batch_size: int,
+    build_workers: int,
+    progress: Optional[Callable[[IngestStats], None]],
+    embed_concurrency: int,
+) -> Dict[str, IngestResult]:
+    """
+    Builds and saves each shard from its PDFs, `build_workers` shards at a time;
+    the PDF-parsing workers and embedding requests are split between the shards built at once.
+    """
+    parallel = max(1, min(build_workers, len(groups)))
+    merged = _MergedProgress(progress, sum(len(paths) for paths in groups.values()))
+
+    def build(name: str) -> IngestResult:
+        return build_vectorstore(
+            index_dir=shard_dir(index_dir, name),
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            workers=max(1, workers // parallel),
+            batch_size=batch_size,
+            embeddings=embeddings,
+            index_spec=index_spec,
+            progress=merged.for_shard(name),
+            paths=groups[name],
+            lexical=False,
+            embed_concurrency=max(1, embed_concurrency // parallel),
+        )
+
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="rag-shard-build") as pool:
+        return dict(zip(groups, pool.map(build, groups)))
+
+
+def _load_shards(index_dir: str, names: Sequence[str], embeddings: Embeddings, mmap: bool) -> List[FAISS]:
+    def load(name: str) -> FAISS:
+        vs = load_index(shard_dir(index_dir, name), embeddings, mmap=mmap)
+        configure_search(vs.index, IndexSpec())
+        return vs
+
+    with ThreadPoolExecutor(max_workers=max(1, min(DEFAULT_SHARD_BUILD_WORKERS, len(names)))) as pool:
+        return list(pool.map(load, names))
+
+
+def _save_layout(
+    index_dir: str,
+    manifest: Dict[str, Any],
+    names: List[str],
+    stale: Iterable[str],
+) -> None:
+    """
+    Saves the top-level manifest and removes shard directories (and a single index) it no longer lists.
+    """
+    path = Path(index_dir)
+    for name in set(stale) - set(names):
+        shutil.rmtree(shard_dir(index_dir, name), ignore_errors=True)
+    for superseded in ("index.faiss", "docstore.npz", LEGACY_PICKLE):
+        (path / superseded).unlink(missing_ok=True)
+    manifest["shards"]["names"] = names
+    save_manifest(index_dir, manifest)
+
+
+def build_sharded(
+    pdf_dir: str = DEFAULT_PDF_DIR,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    workers: int = DEFAULT_INGEST_WORKERS,
+    batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+    embeddings: Optional[Embeddings] = None,
+    index_spec: Optional[IndexSpec] = None,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    shards: int = DEFAULT_INDEX_SHARDS,
+    shard_by: str = DEFAULT_SHARD_BY,
+    build_workers: int = DEFAULT_SHARD_BUILD_WORKERS,
+    embed_concurrency: int = DEFAULT_EMBED_CONCURRENCY,
+) -> IngestResult:
+    """
+    Builds a sharded index from every PDF in `pdf_dir`: one saved index per shard under
+    `index_dir/shards/`, built in parallel, plus a top-level manifest listing every file
+    and the shard layout, and one BM25 index over all shards.
+    """
+    embeddings = embeddings or get_cached_embeddings()
+    index_spec = index_spec or IndexSpec()
+    start = time.perf_counter()
+
+    paths = {p.name: p for p in list_pdfs(pdf_dir)}
+    groups = {
+        name: [paths[f] for f in files]
+        for name, files in assign_shards(paths, max(1, shards), shard_by).items()
+    }
+    built = _build_shards(
+        groups, index_dir, embeddings, index_spec, chunk_size, chunk_overlap,
+        workers, batch_size, build_workers, progress, embed_concurrency,
+    )
+
+    manifest = new_manifest(embeddings.model, chunk_size, chunk_overlap)
+    manifest["index"] = index_spec.as_dict()
+    manifest["shards"] = {"by": shard_by, "count": max(1, shards)}
+    names = sorted(name for name, r in built.items() if r.vectorstore is not None)
+    if names:
+        manifest["embeddings"] = embedding_info(embeddings, built[names[0]].vectorstore.index.d)
+    for r in built.values():
+        manifest["files"].update(r.files)
+    existing = Path(index_dir) / SHARDS_DIR
+    _save_layout(index_dir, manifest, names, [p.name for p in existing.iterdir() if p.is_dir()])
+
+    stats = _sum_stats((r.stats for r in built.values()), len(paths))
+    stats.wall_seconds = time.perf_counter() - start
+    result = IngestResult(vectorstore=None, files=manifest["files"], stats=stats,
+                          shards={name: r.stats for name, r in built.items()})
+    if names:
+        vs = assemble(
+            names,
+            [built[n].vectorstore for n in names],
+            [built[n].files for n in names],
+            embeddings,
+        )
+        load_or_build_lexical_index(vs, index_dir, rebuild=True)
+        result.vectorstore = vs
+    return result
+
+
+def load_sharded(
+    index_dir: str = DEFAULT_INDEX_DIR,
+    embeddings: Optional[Embeddings] = None,
+    mmap: bool = DEFAULT_INDEX_MMAP,
+) -> Optional[FAISS]:
+    """
+    Loads every shard of a saved sharded index (in parallel) into one vectorstore.
+    """
+    embeddings = embeddings or get_cached_embeddings()
+    manifest = load_manifest(index_dir) or {}
+    names: List[str] = (manifest.get("shards") or {}).get("names") or []
+    if not names:
+        return None
+
+    layout = manifest["shards"]
+    by_shard = assign_shards(manifest.get("files", {}), layout.get("count", 1), layout.get("by", DEFAULT_SHARD_BY))
+    vs = assemble(names, _load_shards(index_dir, names, embeddings, mmap), [by_shard.get(n, ()) for n in names], embeddings)
+    load_or_build_lexical_index(vs, index_dir)
+    return vs
+
+
+def rebuild_shards(
+    names: Iterable[str],
+    pdf_dir: str = DEFAULT_PDF_DIR,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    workers: int = DEFAULT_INGEST_WORKERS,
+    batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+    embeddings: Optional[Embeddings] = None,
+    index_spec: Optional[IndexSpec] = None,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    build_workers: int = DEFAULT_SHARD_BUILD_WORKERS,
+    vectorstore: Optional[FAISS] = None,
+    mmap: bool = DEFAULT_INDEX_MMAP,
+    embed_concurrency: int = DEFAULT_EMBED_CONCURRENCY,
+) -> IngestResult:
+    """
+    Re-indexes the named shards from the PDFs now in `pdf_dir` that belong to them,
+    leaving the other shards' files untouched; shards left without PDFs are removed.
+
+    The other shards are reused from `vectorstore` (a loaded sharded index) when given,
+    else loaded from disk. Embeddings of unchanged chunks come from the embedding cache.
+    `index_spec` defaults to the saved one; all shards must share it.
+    """
+    manifest = load_manifest(index_dir)
+    if not (manifest or {}).get("shards"):
+        raise ValueError(f"{index_dir} is not a sharded index")
+    saved_spec = IndexSpec.from_dict(manifest.get("index"))
+    if index_spec is not None and index_spec != saved_spec:
+        raise ValueError("Changing the index type of a sharded index needs a full rebuild")
+    embeddings = embeddings or get_cached_embeddings()
+    index_spec = saved_spec
+    start = time.perf_counter()
+
+    layout = manifest["shards"]
+    count, by = layout.get("count", 1), layout.get("by", DEFAULT_SHARD_BY)
+    targets: Set[str] = set(names)
+    paths = {p.name: p for p in list_pdfs(pdf_dir) if shard_of(p.name, count, by) in targets}
+    groups = {name: [paths[f] for f in files] for name, files in assign_shards(paths, count, by).items()}
+    built = _build_shards(
+        groups, index_dir, embeddings, index_spec, chunk_size, chunk_overlap,
+        workers, batch_size, build_workers, progress, embed_concurrency,
+    )
+
+    files = {f: e for f, e in manifest.get("files", {}).items() if shard_of(f, count, by) not in targets}
+    for r in built.values():
+        files.update(r.files)
+    manifest["files"] = files
+    manifest["index"] = index_spec.as_dict()
+    kept = [n for n in layout.get("names", []) if n not in targets]
+    names_now = sorted(kept + [n for n, r in built.items() if r.vectorstore is not None])
+    _save_layout(index_dir, manifest, names_now, targets)
+
+    stats = _sum_stats((r.stats for r in built.values()), len(paths))
+    stats.wall_seconds = time.perf_counter() - start
+    result = IngestResult(vectorstore=None, files=files, stats=stats,
+                          shards={name: r.stats for name, r in built.items()})
+    if not names_now:
+        return result
+
+    loaded: Dict[str, FAISS] = {}
+    if isinstance(getattr(vectorstore, "index", None), ShardedIndex):
+        loaded = {n: s for n, s in zip(vectorstore.index.names, vectorstore.index.shards) if n in kept}
+    missing = [n for n in kept if n not in loaded]
+    loaded.update(zip(missing, _load_shards(index_dir, missing, embeddings, mmap)))
+    loaded.update({n: r.vectorstore for n, r in built.items() if r.vectorstore is not None})
+
+    by_shard = assign_shards(files, count, by)
+    vs = assemble(names_now, [loaded[n] for n in names_now], [by_shard.get(n, ()) for n in names_now], embeddings)
+    load_or_build_lexical_index(vs, index_dir, rebuild=True)
+    result.vectorstore = vs
+    return result
+
+
+def update_sharded(
+    pdf_dir: str = DEFAULT_PDF_DIR,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    workers: int = DEFAULT_INGEST_WORKERS,
+    batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+    embeddings: Optional[Embeddings] = None,
+    index_spec: Optional[IndexSpec] = None,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    mmap: bool = DEFAULT_INDEX_MMAP,
+    embed_concurrency: int = DEFAULT_EMBED_CONCURRENCY,
+) -> IngestResult:
+    """
+    Rebuilds only the shards holding PDFs added, changed or removed since the last build.
+
+    Falls back to a full sharded build (same layout) when the chunking/embedding settings
+    or the index type differ from the ones the index was built with.
+    """
+    embeddings = embeddings or get_cached_embeddings()
+    manifest = load_manifest(index_dir) or {}
+    layout = manifest.get("shards") or {}
+    saved_spec = IndexSpec.from_dict(manifest.get("index"))
+    index_spec = index_spec or saved_spec
+    args = dict(
+        pdf_dir=pdf_dir,
+        index_dir=index_dir,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        workers=workers,
+        batch_size=batch_size,
+        embeddings=embeddings,
+        index_spec=index_spec,
+        progress=progress,
+        embed_concurrency=embed_concurrency,
+    )
+    if (
+        manifest.get("embedding_model") != embeddings.model
+        or manifest.get("chunk_size") != chunk_size
+        or manifest.get("chunk_overlap") != chunk_overlap
+        or saved_spec != index_spec
+    ):
+        return build_sharded(
+            shards=layout.get("count", max(1, DEFAULT_INDEX_SHARDS)),
+            shard_by=layout.get("by", DEFAULT_SHARD_BY),
+            **args,
+        )
+
+    diff = diff_corpus(manifest, list_pdfs(pdf_dir))
+    if diff.is_empty:
+        save_manifest(index_dir, manifest)
+        return IngestResult(vectorstore=load_sharded(index_dir, embeddings, mmap=mmap))
+
+    count, by = layout.get("count", 1), layout.get("by", DEFAULT_SHARD_BY)
+    changed = [p.name for p in diff.added + diff.changed] + diff.removed
+    return rebuild_shards({shard_of(name, count, by) for name in changed}, mmap=mmap, **args)
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import base64
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rag.config import DEFAULT_HASHING_EMBEDDING_DIM, NO_ANSWER
+from rag.local_embeddings import HashingNgramEmbeddings
+
+
+def default_reply(messages: Sequence[Dict[str, Any]]) -> str:
+    """
+    Canned chat behaviour: rewrite prompts echo the current question, answer prompts
+    return the first sentence of the CONTEXT (or NO_ANSWER when there is none).
+    """
+    prompt = str(messages[-1].get("content", "")) if messages else ""
+
+    if "Standalone retrieval query:" in prompt:
+        after = prompt.split("CURRENT QUESTION:", 1)[-1]
+        return after.split("Standalone retrieval query:", 1)[0].strip()
+
+    if "CONTEXT:" in prompt:
+        context = prompt.split("CONTEXT:", 1)[1].split("INSTRUCTIONS:", 1)[0].strip()
+        sentence = context.split(". ", 1)[0].strip()
+        return (sentence + ".") if sentence else NO_ANSWER
+
+    return NO_ANSWER
+
+
+def lognormal_latency(median_seconds: float, p99_seconds: float, seed: Optional[int] = None) -> Callable[[], float]:
+    """
+    Sampler of log-normally distributed latencies with the given median and 99th percentile
+    (a long right tail, like hosted model endpoints). p99 <= median gives a fixed latency.
+    """
+    rng = random.Random(seed)
+    mu = math.log(max(median_seconds, 1e-9))
+    # 2.326 = z-score of the 99th percentile.
+    sigma = math.log(p99_seconds / median_seconds) / 2.326 if p99_seconds > median_seconds > 0 else 0.0
+
+    def sample() -> float:
+        return rng.lognormvariate(mu, sigma) if median_seconds > 0 else 0.0
+
+    return sample
+
+
+class StubOpenAIServer:
+    """
+    Local OpenAI-compatible HTTP server for tests and offline runs.
+
+    Serves POST /v1/embeddings and POST /v1/chat/completions (including SSE streaming)
+    with deterministic responses and an optional fixed latency. Point the client registry
+    at it with configure_clients(base_url=server.base_url, api_key="stub", tokenize_embeddings=False).
+
+    `latency` overrides the fixed latency with a sampler called per request with the endpoint
+    ("embeddings" or "chat"), e.g. lognormal_latency per endpoint. Embeddings come from `embed`
+    (default: HashingNgramEmbeddings of `dim`), so retrieval and the relevance gate are meaningful.
+
+    Failure injection: a random `rate_limit_rate` of requests, and every request beyond
+    `max_in_flight` concurrent ones (0 = no limit), get 429 with Retry-After `retry_after`
+    at once; a random `error_rate` get 500 after the latency.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        dim: int = DEFAULT_HASHING_EMBEDDING_DIM,
+        latency_seconds: float = 0.0,
+        reply: Callable[[Sequence[Dict[str, Any]]], str] = default_reply,
+        latency: Optional[Callable[[str], float]] = None,
+        embed: Optional[Callable[[str], List[float]]] = None,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        max_in_flight: int = 0,
+        retry_after: float = 0.05,
+        seed: Optional[int] = None,
+    ):
+        self.dim = dim
+        self.latency_seconds = latency_seconds
+        self.reply = reply
+        self.latency = latency
+        self.embed = embed or HashingNgramEmbeddings(dim).embed_query
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _exit(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def _fault(self) -> Optional[int]:
+        """
+        Status code of the injected failure for the current request, if any.
+        """
+        with self._lock:
+            if (self.max_in_flight and self.in_flight > self.max_in_flight) or (
+                self._random.random() < self.rate_limit_rate
+            ):
+                self.rate_limited += 1
+                return 429
+            if self._random.random() < self.error_rate:
+                self.errors += 1
+                return 500
+        return None
+
+    def _delay(self, path: str) -> float:
+        if self.latency is None:
+            return self.latency_seconds
+        return self.latency("embeddings" if path.endswith("/embeddings") else "chat")
+
+    def embeddings_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body.get("input")
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        data = []
+        for i, item in enumerate(inputs or []):
+            # Token id lists (clients with tokenize_embeddings) are embedded as their JSON text.
+            vec = self.embed(item if isinstance(item, str) else json.dumps(item))
+            if body.get("encoding_format") == "base64":
+                emb: Any = base64.b64encode(np.asarray(vec, dtype=np.float32).tobytes()).decode("ascii")
+            else:
+                emb = vec
+            data.append({"object": "embedding", "index": i, "embedding": emb})
+
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    def chat_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.reply(body.get("messages", []))},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def chat_stream_events(self, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        text = self.reply(body.get("messages", []))
+        words = text.split(" ")
+        pieces = [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+        def event(delta: Dict[str, Any], finish: Optional[str] = None) -> Dict[str, Any]:
+            return {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+
+        events = [event({"role": "assistant", "content": ""})]
+        events.extend(event({"content": p}) for p in pieces)
+        events.append(event({}, finish="stop"))
+        return events
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; without TCP_NODELAY keep-alive calls stall on Nagle.
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send_json(
+                self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None
+            ) -> None:
+                raw = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_POST(self) -> None:
+                stub._enter()
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    fault = stub._fault()
+                    if fault == 429:
+                        self._send_json(
+                            429,
+                            {"error": {"message": "Rate limit reached (stub)", "type": "requests"}},
+                            {"Retry-After": str(stub.retry_after)},
+                        )
+                        return
+                    delay = stub._delay(self.path)
+                    if delay > 0:
+                        time.sleep(delay)
+
+                    if fault == 500:
+                        self._send_json(500, {"error": {"message": "Injected failure (stub)", "type": "server_error"}})
+                    elif self.path.endswith("/embeddings"):
+                        self._send_json(200, stub.embeddings_response(body))
+                    elif self.path.endswith("/chat/completions") and body.get("stream"):
+                        self.send_response(200)
+                        self.send_header("Content-Type", "text/event-stream")
+                        self.send_header("Connection", "close")
+                        self.end_headers()
+                        for ev in stub.chat_stream_events(body):
+                            self.wfile.write(f"data: {json.dumps(ev)}\n\n".encode("utf-8"))
+                        self.wfile.write(b"data: [DONE]\n\n")
+                        self.close_connection = True
+                    elif self.path.endswith("/chat/completions"):
+                        self._send_json(200, stub.chat_response(body))
+                    else:
+                        self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                finally:
+                    stub._exit()
+
+        return Handler
@@ -1,36 +1,360 @@
 from __future__ import annotations
 
+import os
+import shutil
 from pathlib import Path
-from typing import Optional
+from typing import Callable, List, Optional
 
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from langchain_core.embeddings import Embeddings
 
-from rag.config import DEFAULT_INDEX_DIR, DEFAULT_PDF_DIR
-from rag.loaders import load_pdfs
-from rag.chunking import chunk_documents
-from rag.embeddings import get_embeddings
+from rag.config import (
+    DEFAULT_INDEX_DIR,
+    DEFAULT_PDF_DIR,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_EMBED_BATCH_SIZE,
+    DEFAULT_EMBED_CONCURRENCY,
+    DEFAULT_INGEST_WORKERS,
+    DEFAULT_INDEX_MMAP,
+    DEFAULT_INDEX_SHARDS,
+)
+from rag.ann import IndexSpec, configure_search, convert_vectorstore
+from rag.docstore import load_docstore, save_docstore
+from rag.loaders import list_pdfs
+from rag.embeddings import EmbeddingCheckpoint, check_embeddings, embedding_info, get_cached_embeddings
+from rag.ingest import IngestResult, IngestStats, ingest_pdfs
+from rag.lexical import load_or_build_lexical_index
+from rag.manifest import diff_corpus, load_manifest, new_manifest, save_manifest
+
+
+LEGACY_PICKLE = "index.pkl"
+# Subdirectory of a sharded index holding one saved index per shard.
+SHARDS_DIR = "shards"
+# Vectors embedded by a build or update that has not been saved yet (see EmbeddingCheckpoint).
+CHECKPOINT_FILE = "embedding_checkpoint.sqlite3"
+
+
+def index_exists(index_dir: str) -> bool:
+    """
+    True if `index_dir` holds a saved index: a single FAISS index, or a sharded one
+    (see rag.shards) whose shards are all saved.
+    """
+    path = Path(index_dir)
+    if (path / "index.faiss").exists():
+        return True
+    names = ((load_manifest(index_dir) or {}).get("shards") or {}).get("names")
+    return bool(names) and all((path / SHARDS_DIR / n / "index.faiss").exists() for n in names)
+
+
+def save_index(vectorstore: FAISS, index_dir: str) -> None:
+    """
+    Saves the FAISS index and the chunks (as a compact docstore.npz instead of index.pkl).
+
+    Each file is written next to its target and renamed into place: faiss rewrites
+    index.faiss in place, which would break processes that have it memory-mapped.
+    """
+    path = Path(index_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    faiss = dependable_faiss_import()
+
+    tmp = path / "index.faiss.tmp"
+    faiss.write_index(vectorstore.index, str(tmp))
+    os.replace(tmp, path / "index.faiss")
+
+    save_docstore(vectorstore.docstore, vectorstore.index_to_docstore_id, index_dir)
+    # Superseded pickle from before the compact docstore.
+    (path / LEGACY_PICKLE).unlink(missing_ok=True)
+
+
+def _readahead(path: Path) -> None:
+    """
+    Asks the kernel to start reading the file into the page cache in the background,
+    so the first searches on a memory-mapped index do not fault in pages one by one.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def load_index(index_dir: str, embeddings: Embeddings, mmap: bool = False) -> FAISS:
+    """
+    Loads a saved index. With mmap=True the FAISS vectors are memory-mapped read-only
+    instead of copied, so processes on one host share them through the page cache and
+    the FAISS load time no longer grows with the index size.
+
+    A memory-mapped index must not be modified: adding to it aborts the process.
+    The chunk text blob of the docstore is memory-mapped the same way.
+
+    Indexes saved before the compact docstore existed are read from index.pkl
+    (a pickle, so only for index directories written by this project).
+
+    Raises EmbeddingMismatchError if the manifest says the index was built with
+    other embeddings (backend, model or dimension) than `embeddings`.
+    """
+    faiss = dependable_faiss_import()
+    io_flags = 0
+    if mmap:
+        io_flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+        _readahead(Path(index_dir) / "index.faiss")
+
+    loaded = load_docstore(index_dir, mmap=mmap)
+    if loaded is None:
+        vs = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True, io_flags=io_flags)
+    else:
+        docstore, index_to_docstore_id = loaded
+        index = faiss.read_index(str(Path(index_dir) / "index.faiss"), io_flags)
+        vs = FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    manifest = load_manifest(index_dir)
+    if manifest is not None:
+        check_embeddings(manifest, embeddings, vs.index.d, index_dir)
+    return vs
+
+
+def _migrate_legacy_docstore(vectorstore: FAISS, index_dir: str) -> None:
+    """
+    Rewrites an index.pkl docstore in the compact format, so later loads skip the pickle.
+    """
+    if not (Path(index_dir) / LEGACY_PICKLE).exists():
+        return
+    save_docstore(vectorstore.docstore, vectorstore.index_to_docstore_id, index_dir)
+    (Path(index_dir) / LEGACY_PICKLE).unlink(missing_ok=True)
+
+
+def _ingest_checkpointed(paths: List[Path], embeddings: Embeddings, index_dir: str, **kwargs) -> IngestResult:
+    """
+    ingest_pdfs with the embedding checkpoint of `index_dir`: an interrupted run leaves it
+    behind and the next one resumes from it; the caller deletes it once the index is saved.
+    """
+    checkpoint = EmbeddingCheckpoint(str(Path(index_dir) / CHECKPOINT_FILE), embeddings.model)
+    try:
+        return ingest_pdfs(paths, embeddings, checkpoint=checkpoint, **kwargs)
+    finally:
+        checkpoint.close()
+
+
+def _drop_checkpoint(index_dir: str) -> None:
+    (Path(index_dir) / CHECKPOINT_FILE).unlink(missing_ok=True)
+
+
+def build_vectorstore(
+    pdf_dir: str = DEFAULT_PDF_DIR,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    workers: int = DEFAULT_INGEST_WORKERS,
+    batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+    embeddings: Optional[Embeddings] = None,
+    index_spec: Optional[IndexSpec] = None,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    paths: Optional[List[Path]] = None,
+    lexical: bool = True,
+    embed_concurrency: int = DEFAULT_EMBED_CONCURRENCY,
+) -> IngestResult:
+    """
+    Builds the index from every PDF in `pdf_dir` (or only `paths`) and saves it with its manifest.
+
+    Vectors are ingested into a flat index, which is then converted to `index_spec`
+    (default: the configured index type; IVF is trained on the full corpus here).
+    lexical=False skips the BM25 index (shards share one built over all of them).
+    A build that fails part-way keeps its embedded vectors in `index_dir`; the next
+    build or update there resumes from them.
+    """
+    embeddings = embeddings or get_cached_embeddings()
+    index_spec = index_spec or IndexSpec()
+
+    result = _ingest_checkpointed(
+        list_pdfs(pdf_dir) if paths is None else paths,
+        embeddings,
+        index_dir,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        workers=workers,
+        batch_size=batch_size,
+        progress=progress,
+        embed_concurrency=embed_concurrency,
+    )
+    if result.vectorstore is None:
+        _drop_checkpoint(index_dir)
+        return result
+
+    convert_vectorstore(result.vectorstore, index_spec)
+    save_index(result.vectorstore, index_dir)
+    # Shards of a sharded index this one replaces.
+    shutil.rmtree(Path(index_dir) / SHARDS_DIR, ignore_errors=True)
+    if lexical:
+        load_or_build_lexical_index(result.vectorstore, index_dir, rebuild=True)
+
+    manifest = new_manifest(embeddings.model, chunk_size, chunk_overlap)
+    manifest["embeddings"] = embedding_info(embeddings, result.vectorstore.index.d)
+    manifest["index"] = index_spec.as_dict()
+    manifest["files"] = result.files
+    save_manifest(index_dir, manifest)
+    _drop_checkpoint(index_dir)
+    return result
+
+
+def update_vectorstore(
+    pdf_dir: str = DEFAULT_PDF_DIR,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    workers: int = DEFAULT_INGEST_WORKERS,
+    batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+    embeddings: Optional[Embeddings] = None,
+    index_spec: Optional[IndexSpec] = None,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    embed_concurrency: int = DEFAULT_EMBED_CONCURRENCY,
+) -> IngestResult:
+    """
+    Applies only the corpus changes recorded against the manifest to the saved index.
+
+    Falls back to a full build when there is no saved index or usable manifest,
+    or when the chunking/embedding settings differ from the ones the index was built with.
+    HNSW cannot remove vectors, so changes are applied on a flat copy of the stored vectors
+    and the approximate index is rebuilt from it (no re-embedding); a changed index type
+    is applied the same way. `index_spec` defaults to the saved one.
+    """
+    embeddings = embeddings or get_cached_embeddings()
+    build_args = dict(
+        pdf_dir=pdf_dir,
+        index_dir=index_dir,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        workers=workers,
+        batch_size=batch_size,
+        embeddings=embeddings,
+        index_spec=index_spec,
+        progress=progress,
+        embed_concurrency=embed_concurrency,
+    )
+
+    manifest = load_manifest(index_dir)
+    if (
+        not index_exists(index_dir)
+        or manifest is None
+        or manifest.get("embedding_model") != embeddings.model
+        or manifest.get("chunk_size") != chunk_size
+        or manifest.get("chunk_overlap") != chunk_overlap
+    ):
+        return build_vectorstore(**build_args)
+
+    vs = load_index(index_dir, embeddings)
+    saved_spec = IndexSpec.from_dict(manifest.get("index"))
+    index_spec = index_spec or saved_spec
+    diff = diff_corpus(manifest, list_pdfs(pdf_dir))
+    if diff.is_empty:
+        if saved_spec != index_spec:
+            convert_vectorstore(vs, index_spec)
+            save_index(vs, index_dir)
+        else:
+            configure_search(vs.index, index_spec)
+        load_or_build_lexical_index(vs, index_dir)
+        manifest["index"] = index_spec.as_dict()
+        save_manifest(index_dir, manifest)
+        return IngestResult(vectorstore=vs)
+
+    convert_vectorstore(vs, IndexSpec(type="flat"))
+    files = manifest["files"]
+    stale_ids: List[str] = []
+    for name in diff.removed + [p.name for p in diff.changed]:
+        stale_ids.extend(files.pop(name)["chunk_ids"])
+    if stale_ids:
+        vs.delete(stale_ids)
+
+    result = _ingest_checkpointed(
+        diff.added + diff.changed,
+        embeddings,
+        index_dir,
+        vectorstore=vs,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        workers=workers,
+        batch_size=batch_size,
+        progress=progress,
+        embed_concurrency=embed_concurrency,
+    )
+    files.update(result.files)
+
+    convert_vectorstore(vs, index_spec)
+    manifest["embeddings"] = embedding_info(embeddings, vs.index.d)
+    manifest["index"] = index_spec.as_dict()
+    save_index(vs, index_dir)
+    load_or_build_lexical_index(vs, index_dir, rebuild=True)
+    save_manifest(index_dir, manifest)
+    _drop_checkpoint(index_dir)
+    result.vectorstore = vs
+    return result
 
 
 def get_vectorstore(
     rebuild: bool = False,
     pdf_dir: str = DEFAULT_PDF_DIR,
     index_dir: str = DEFAULT_INDEX_DIR,
-    chunk_size: int = 900,
-    chunk_overlap: int = 120,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    update: bool = False,
+    mmap: bool = DEFAULT_INDEX_MMAP,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    embeddings: Optional[Embeddings] = None,
+    shards: int = DEFAULT_INDEX_SHARDS,
 ) -> Optional[FAISS]:
-    embeddings = get_embeddings()
-    index_path = Path(index_dir)
+    """
+    Loads the saved FAISS index, or builds it from the PDFs when missing.
+    The BM25 lexical index saved next to it is attached (and rebuilt if missing or stale).
+    The index type is the one it was built with (recorded in the manifest); the configured
+    HNSW efSearch / IVF nprobe are applied on load.
+
+    - mmap=True: memory-map the saved FAISS vectors read-only (see load_index);
+      builds and updates always work on a private copy.
+
+    - rebuild=True: re-parse and re-index every PDF.
+    - update=True: re-index only PDFs added or changed since the last build
+      (per the manifest saved next to the index) and drop removed ones.
+
+    - shards=N > 0: build a missing or rebuilt index as N shards (see rag.shards).
+      A saved sharded index is loaded (and updated shard by shard) whatever `shards` is.
+
+    `progress` receives the ingest stats while PDFs are (re-)indexed.
+    `embeddings` defaults to the cached OpenAI embeddings.
+    """
+    # rag.shards builds on this module.
+    from rag.shards import build_sharded, is_sharded, load_sharded, update_sharded
+
+    embeddings = embeddings or get_cached_embeddings()
+    args = dict(
+        pdf_dir=pdf_dir,
+        index_dir=index_dir,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        embeddings=embeddings,
+        progress=progress,
+    )
 
-    if index_path.exists() and not rebuild:
-        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+    if rebuild or not index_exists(index_dir):
+        if shards > 0:
+            return build_sharded(shards=shards, **args).vectorstore
+        return build_vectorstore(**args).vectorstore
 
-    docs = load_pdfs(pdf_dir)
-    if not docs:
-        return None
+    if is_sharded(index_dir):
+        if update:
+            return update_sharded(**args).vectorstore
+        return load_sharded(index_dir, embeddings, mmap=mmap)
 
-    chunks = chunk_documents(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if update:
+        return update_vectorstore(**args).vectorstore
 
-    vs = FAISS.from_documents(chunks, embeddings)
-    index_path.mkdir(parents=True, exist_ok=True)
-    vs.save_local(index_dir)
-    return vs
\ No newline at end of file
+    vs = load_index(index_dir, embeddings, mmap=mmap)
+    _migrate_legacy_docstore(vs, index_dir)
+    configure_search(vs.index, IndexSpec())
+    load_or_build_lexical_index(vs, index_dir)
+    return vs
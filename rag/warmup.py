@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+
+from rag.config import DEFAULT_INDEX_DIR
+from rag.ingest import IngestStats
+from rag.manifest import corpus_summary, load_manifest
+from rag.vectorstore import get_vectorstore, index_exists
+
+# Warm-up states, in order; "failed" can follow any of the running ones.
+IDLE, LOADING, BUILDING, READY, FAILED = "idle", "loading", "building", "ready", "failed"
+
+
+@dataclass(frozen=True)
+class WarmupStatus:
+    """
+    Snapshot of the background index warm-up.
+
+    `files_done` / `files_total` count PDFs while the index is being built
+    (both 0 while an existing index is loaded).
+    """
+    state: str = IDLE
+    message: str = "Not started"
+    files_done: int = 0
+    files_total: int = 0
+    chunks: int = 0
+    error: Optional[str] = None
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    @property
+    def running(self) -> bool:
+        return self.state in (LOADING, BUILDING)
+
+    @property
+    def progress(self) -> Optional[float]:
+        """
+        Fraction of PDFs indexed during a build, else None.
+        """
+        if self.state != BUILDING or not self.files_total:
+            return None
+        return min(1.0, self.files_done / self.files_total)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+
+class IndexWarmup:
+    """
+    Loads the saved index (or builds it from the PDFs when there is none) on a daemon
+    thread, so a server can start answering requests (with a "not ready" reply) at once.
+
+    `loader` is called with a `progress` keyword argument (see get_vectorstore).
+    """
+
+    def __init__(
+        self,
+        loader: Callable[..., Optional[FAISS]] = get_vectorstore,
+        index_dir: str = DEFAULT_INDEX_DIR,
+    ):
+        self.loader = loader
+        self.index_dir = index_dir
+        self._status = WarmupStatus()
+        self._vectorstore: Optional[FAISS] = None
+        self._corpus: Optional[Tuple[Optional[float], Dict[str, Any]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Starts the warm-up unless it is running or done; restarts it after a failure.
+        """
+        with self._lock:
+            if self._status.running or self._status.ready:
+                return
+            building = not index_exists(self.index_dir)
+            self._status = WarmupStatus(
+                state=BUILDING if building else LOADING,
+                message="Building the index from the PDFs" if building else "Loading the index",
+                started=time.monotonic(),
+            )
+            self._done.clear()
+            self._thread = threading.Thread(target=self._run, name="index-warmup", daemon=True)
+            self._thread.start()
+
+    def _set(self, **changes: Any) -> None:
+        with self._lock:
+            self._status = replace(self._status, **changes)
+
+    def _progress(self, stats: IngestStats) -> None:
+        self._set(
+            state=BUILDING,
+            message="Building the index from the PDFs",
+            files_done=stats.files,
+            files_total=stats.total_files,
+            chunks=stats.chunks,
+        )
+
+    def _run(self) -> None:
+        vs, error = None, None
+        try:
+            vs = self.loader(progress=self._progress)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+
+        if vs is not None:
+            state, message = READY, "Index ready"
+        else:
+            state, message = FAILED, "Index warm-up failed" if error else "No PDFs to index"
+        with self._lock:
+            self._vectorstore = vs
+            self._status = replace(self._status, state=state, message=message, error=error, finished=time.monotonic())
+        self._done.set()
+
+    def status(self) -> WarmupStatus:
+        with self._lock:
+            return self._status
+
+    @property
+    def vectorstore(self) -> Optional[FAISS]:
+        """
+        The loaded vectorstore, or None until the warm-up has finished.
+        """
+        with self._lock:
+            return self._vectorstore
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[FAISS]:
+        """
+        Blocks until the warm-up has finished (or `timeout` passes); returns the vectorstore.
+        """
+        self._done.wait(timeout)
+        return self.vectorstore
+
+    def corpus(self) -> Dict[str, Any]:
+        """
+        Knowledge base stats from the saved manifest (re-read only after the warm-up
+        has finished, so repeated calls do not touch the filesystem).
+        """
+        with self._lock:
+            finished = self._status.finished
+            if self._corpus is not None and self._corpus[0] == finished:
+                return self._corpus[1]
+        summary = corpus_summary(load_manifest(self.index_dir))
+        with self._lock:
+            self._corpus = (finished, summary)
+        return summary
+
+
+_warmup: Optional[IndexWarmup] = None
+_warmup_lock = threading.Lock()
+
+
+def get_index_warmup() -> IndexWarmup:
+    """
+    Process-wide warm-up of the default index (not started until start() is called).
+    """
+    global _warmup
+    with _warmup_lock:
+        if _warmup is None:
+            _warmup = IndexWarmup()
+        return _warmup
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import List
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from langchain_community.vectorstores import FAISS  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+
+from rag.clients import RegistryEmbeddings, configure_clients  # noqa: E402
+from rag.local_embeddings import HashingNgramEmbeddings  # noqa: E402
+from rag.stubs import StubOpenAIServer  # noqa: E402
+
+TOPICS = (
+    "Discharge planning reduces readmission risk for elderly patients after surgery.",
+    "Operating room scheduling balances surgeon availability against block time utilization.",
+    "Prior authorization delays treatment when payers require manual review of claims.",
+    "Interoperability standards such as HL7 FHIR let hospitals exchange patient records.",
+    "Clinical decision support alerts suffer from alert fatigue when they fire too often.",
+)
+
+
+class CountingEmbeddings(HashingNgramEmbeddings):
+    """
+    Local embeddings that count every embedding call.
+    """
+
+    def __init__(self, dim: int = 256):
+        super().__init__(dim=dim)
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return super().embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+def corpus() -> List[Document]:
+    """
+    40 chunks over 5 topics in 4 PDFs, plus one chunk on a rare drug name.
+    """
+    docs = [
+        Document(
+            page_content=f"{TOPICS[i % len(TOPICS)]} Section {i} reviews the evidence.",
+            metadata={"source": f"review_{i % 4}.pdf", "page": i},
+        )
+        for i in range(40)
+    ]
+    docs.append(Document(
+        page_content="Onasemnogene abeparvovec is a gene therapy for spinal muscular atrophy.",
+        metadata={"source": "review_0.pdf", "page": 40},
+    ))
+    return docs
+
+
+@pytest.fixture
+def stub_server():
+    """
+    Stub OpenAI server with the client registry pointed at it for the test.
+    """
+    with StubOpenAIServer() as server:
+        configure_clients(base_url=server.base_url, api_key="stub", tokenize_embeddings=False)
+        try:
+            yield server
+        finally:
+            configure_clients()
+
+
+@pytest.fixture
+def stub_store(stub_server):
+    """
+    corpus() indexed with the stub server's embeddings.
+    """
+    return FAISS.from_documents(corpus(), RegistryEmbeddings("stub-embedding"))
+
+
+@pytest.fixture
+def counting_store():
+    embeddings = CountingEmbeddings()
+    docs = corpus()
+    vs = FAISS.from_documents(docs, embeddings)
+    embeddings.calls = 0
+    return vs, embeddings
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from langchain_community.vectorstores import FAISS
+
+from rag.answer_cache import AnswerCache
+from rag.local_embeddings import HashingNgramEmbeddings
+from rag.qa_chain import RAGResult
+from rag.retriever import index_fingerprint, index_version
+
+
+def _store(texts):
+    return FAISS.from_texts(texts, HashingNgramEmbeddings(dim=64))
+
+
+def test_two_index_versions_do_not_flush_each_other():
+    cache = AnswerCache(max_entries=16)
+    cache.store("v1", "scope", "What is triage?", RAGResult("one", ["a.pdf p.1"]))
+    cache.store("v2", "scope", "What is triage?", RAGResult("two", ["b.pdf p.1"]))
+
+    for _ in range(3):
+        assert cache.lookup("v1", "scope", "what is  TRIAGE?").answer == "one"
+        assert cache.lookup("v2", "scope", "What is triage?").answer == "two"
+    assert cache.stats()["index_versions"] == 2
+    assert cache.stats()["exact_hits"] == 6
+
+
+def test_old_versions_age_out_of_the_lru():
+    cache = AnswerCache(max_entries=2)
+    cache.store("v1", "scope", "q1", RAGResult("a", []))
+    cache.store("v2", "scope", "q2", RAGResult("b", []))
+    cache.store("v2", "scope", "q3", RAGResult("c", []))
+
+    assert cache.lookup("v1", "scope", "q1") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_index_version_follows_contents_not_object_ids():
+    vs = _store(["alpha text", "beta text"])
+    before = index_version(vs)
+    assert index_version(vs) == before
+
+    fingerprint = index_fingerprint(vs)
+    ids = list(vs.index_to_docstore_id.values())
+    vs.delete([ids[0]])
+    vs.add_texts(["gamma text"])
+    # Same length as before, and the replaced mapping may have been collected.
+    assert len(vs.index_to_docstore_id) == fingerprint.size
+    assert index_fingerprint(vs) != fingerprint
+    assert index_version(vs) != before
+
+
+def test_each_store_gets_its_own_version():
+    a = _store(["alpha text"])
+    b = _store(["alpha text"])
+    assert index_version(a) != index_version(b)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import openai
+import pytest
+
+from rag.clients import ClientRegistry, ConcurrencyLimiter, RetryBudget
+from rag.stubs import StubOpenAIServer
+
+
+def test_async_waiters_are_woken_by_release_from_another_thread():
+    limiter = ConcurrencyLimiter(1)
+    limiter.acquire()
+
+    async def main():
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        threading.Timer(0.05, limiter.release).start()
+        await asyncio.wait_for(waiter, timeout=2)
+
+    asyncio.run(main())
+    stats = limiter.stats()
+    assert stats["in_flight"] == 1
+    assert stats["waits"] == 1
+
+
+def test_cancelled_async_waiter_passes_its_slot_on():
+    limiter = ConcurrencyLimiter(1)
+    limiter.acquire()
+
+    async def main():
+        first = asyncio.ensure_future(limiter.aacquire())
+        second = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0.01)
+        limiter.release()
+        first.cancel()
+        await asyncio.wait_for(second, timeout=2)
+        assert first.cancelled()
+
+    asyncio.run(main())
+    assert limiter.stats()["in_flight"] == 1
+
+
+def test_threads_and_coroutines_share_the_limit():
+    limiter = ConcurrencyLimiter(2)
+    peak = []
+
+    def worker():
+        for _ in range(20):
+            limiter.acquire()
+            peak.append(limiter.in_flight)
+            limiter.release()
+
+    async def coroutine_worker():
+        for _ in range(20):
+            await limiter.aacquire()
+            peak.append(limiter.in_flight)
+            await asyncio.sleep(0)
+            limiter.release()
+
+    async def main():
+        await asyncio.wait_for(asyncio.gather(*(coroutine_worker() for _ in range(3))), timeout=10)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    asyncio.run(main())
+    for t in threads:
+        t.join()
+    assert max(peak) <= 2
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_retry_budget_caps_retries_to_a_fraction_of_traffic():
+    budget = RetryBudget(ratio=0.2, min_retries=2)
+    spent = 0
+    for _ in range(50):
+        budget.deposit()
+        while budget.try_spend():
+            spent += 1
+    # Reserve of 2 plus 0.2 per request.
+    assert spent <= 2 + 0.2 * 50
+    assert budget.stats()["denied"] > 0
+
+
+def test_transport_retries_stay_within_the_budget_during_an_outage():
+    with StubOpenAIServer(rate_limit_rate=1.0, retry_after=0.001, seed=0) as server:
+        registry = ClientRegistry(
+            base_url=server.base_url, api_key="stub", tokenize_embeddings=False, max_retries=3,
+        )
+        try:
+            requests = 30
+            for _ in range(requests):
+                with pytest.raises(openai.RateLimitError):
+                    registry.embeddings("stub-embedding").embed_query("triage")
+            stats = registry.stats()["retry_budget"]
+            # Without the budget every request would be sent 1 + max_retries times.
+            assert server.requests <= requests + registry.budget.capacity + 0.2 * requests
+            assert stats["denied"] > 0
+        finally:
+            registry.close()
+
+
+def test_build_clients_do_not_retry_and_have_their_own_limit():
+    with StubOpenAIServer(rate_limit_rate=1.0, retry_after=0.001, seed=0) as server:
+        registry = ClientRegistry(
+            base_url=server.base_url, api_key="stub", tokenize_embeddings=False, max_retries=3,
+            build_concurrency=2,
+        )
+        try:
+            for _ in range(5):
+                with pytest.raises(openai.RateLimitError):
+                    registry.embeddings("stub-embedding", build=True).embed_documents(["triage"])
+            stats = registry.stats()
+            assert server.requests == 5
+            assert stats["build_pool"]["acquired"] == 5
+            assert stats["build_pool"]["limit"] == 2
+            assert stats["pool"]["acquired"] == 0
+            assert stats["retry_budget"]["denied"] == 0
+        finally:
+            registry.close()
+
+
+def test_close_closes_async_clients_of_idle_loops():
+    with StubOpenAIServer() as server:
+        registry = ClientRegistry(base_url=server.base_url, api_key="stub", tokenize_embeddings=False)
+        loop = asyncio.new_event_loop()
+        try:
+            async def embed():
+                await registry.embeddings("stub-embedding").aembed_query("triage")
+                return registry._async_clients[asyncio.get_running_loop()]
+
+            client = loop.run_until_complete(embed())
+            registry.close()
+            assert client.is_closed
+            assert len(registry._async_clients) == 0
+        finally:
+            loop.close()
+
+
+def test_aclose_closes_the_running_loops_client():
+    with StubOpenAIServer() as server:
+        registry = ClientRegistry(base_url=server.base_url, api_key="stub", tokenize_embeddings=False)
+
+        async def main():
+            await registry.embeddings("stub-embedding").aembed_query("triage")
+            client = registry._async_clients[asyncio.get_running_loop()]
+            await registry.aclose()
+            return client
+
+        try:
+            assert asyncio.run(main()).is_closed
+        finally:
+            registry.close()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from langchain_core.documents import Document
+
+from rag.context import merge_adjacent, pack_contexts, strip_overlap
+from rag.guardrails import INJECTION_FLAG
+from rag.metrics import count_tokens
+
+MODEL = "gpt-4o-mini"
+
+
+def chunk(text, page=1, index=0, source="a.pdf", **extra):
+    return Document(page_content=text, metadata={"source": source, "page": page, "chunk_index": index, **extra})
+
+
+def test_strip_overlap_keeps_the_shared_text_once():
+    a = "Discharge planning starts at admission. Nurses review the medication list daily."
+    b = "Nurses review the medication list daily. Follow-up calls happen within a week."
+    assert strip_overlap(a, b) == (
+        "Discharge planning starts at admission. Nurses review the medication list daily."
+        " Follow-up calls happen within a week."
+    )
+
+
+def test_strip_overlap_joins_unrelated_text_with_a_space():
+    assert strip_overlap("First chunk of the page.", "Second chunk of the page.") == (
+        "First chunk of the page. Second chunk of the page."
+    )
+
+
+def test_merge_adjacent_joins_consecutive_chunks_of_a_page():
+    contexts = [
+        chunk("Chunk two text on discharge planning and follow-up.", index=2),
+        chunk("Other page.", page=2, index=3),
+        chunk("Chunk one text, which precedes chunk two on the page.", index=1, **{INJECTION_FLAG: True}),
+        chunk("Other source.", source="b.pdf", index=3),
+    ]
+    merged, merged_away = merge_adjacent(contexts)
+
+    assert merged_away == 1
+    assert [d.page_content for d in merged] == [
+        "Chunk one text, which precedes chunk two on the page. Chunk two text on discharge planning and follow-up.",
+        "Other page.",
+        "Other source.",
+    ]
+    # The run takes the best-ranked member's place and the first chunk's metadata.
+    assert merged[0].metadata["chunk_index"] == 1
+    assert merged[0].metadata[INJECTION_FLAG] is True
+
+
+def test_merge_adjacent_leaves_gaps_and_unpositioned_chunks_alone():
+    contexts = [chunk("one", index=1), chunk("three", index=3), Document(page_content="loose", metadata={})]
+    merged, merged_away = merge_adjacent(contexts)
+    assert merged_away == 0
+    assert [d.page_content for d in merged] == ["one", "three", "loose"]
+
+
+def test_pack_truncates_the_best_context_to_the_budget():
+    best = chunk(" ".join(f"word{i}" for i in range(400)))
+    second = chunk("Prior authorization delays treatment when payers require manual review.", page=2)
+    packed = pack_contexts([best, second], token_budget=50, model=MODEL)
+
+    assert packed.truncated
+    assert len(packed.contexts) == 1
+    assert packed.contexts[0].page_content.startswith("word0 word1")
+    assert count_tokens(packed.contexts[0].page_content, MODEL) <= 50
+    assert packed.tokens_after <= 50
+    assert packed.dropped == 1
+
+
+def test_pack_skips_a_context_that_does_not_fit_and_keeps_smaller_ones():
+    first = chunk("Discharge planning reduces readmission risk for elderly patients.", page=1)
+    large = chunk(" ".join(["Operating room scheduling"] * 40), page=2)
+    small = chunk("Prior authorization delays treatment.", page=3)
+    budget = count_tokens(first.page_content, MODEL) + count_tokens(small.page_content, MODEL)
+
+    packed = pack_contexts([first, large, small], token_budget=budget, model=MODEL)
+    assert [d.page_content for d in packed.contexts] == [first.page_content, small.page_content]
+    assert packed.dropped == 1
+    assert not packed.truncated
+    assert packed.tokens_saved == count_tokens(large.page_content, MODEL)
+
+
+def test_pack_without_budget_keeps_everything():
+    contexts = [chunk("one", page=1), chunk("two", page=2)]
+    packed = pack_contexts(contexts, token_budget=None, model=MODEL)
+    assert [d.page_content for d in packed.contexts] == ["one", "two"]
+    assert packed.dropped == 0
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import threading
+from typing import List
+
+import pytest
+
+from rag.clients import RegistryEmbeddings, configure_clients, get_client_registry
+from rag.embeddings import EmbeddingCheckpoint, EmbeddingJob, EmbeddingJobStats
+from rag.local_embeddings import HashingNgramEmbeddings
+from rag.stubs import StubOpenAIServer
+
+MODEL = "stub-embedding"
+EMBEDDER = HashingNgramEmbeddings()
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class RecordingStub(StubOpenAIServer):
+    """
+    Stub server that records every text it returned a vector for.
+    """
+
+    def __init__(self, **kwargs):
+        self.embedded: List[str] = []
+        self._embedded_lock = threading.Lock()
+        super().__init__(embed=self._record, **kwargs)
+
+    def _record(self, text: str) -> List[float]:
+        with self._embedded_lock:
+            self.embedded.append(text)
+        return EMBEDDER.embed_query(text)
+
+
+@pytest.fixture
+def flaky_server():
+    with RecordingStub(error_rate=0.1, rate_limit_rate=0.1, retry_after=0.001, seed=0) as server:
+        # Default retry settings, as for a real build.
+        configure_clients(base_url=server.base_url, api_key="stub", tokenize_embeddings=False)
+        try:
+            yield server
+        finally:
+            configure_clients()
+
+
+def test_job_owns_the_retries(flaky_server):
+    texts = [f"chunk {i} on discharge planning" for i in range(200)]
+    job = EmbeddingJob(RegistryEmbeddings(MODEL), batch_size=10, concurrency=4)
+
+    vectors = job.run(texts)
+
+    assert vectors == EMBEDDER.embed_documents(texts)
+    assert flaky_server.rate_limited + flaky_server.errors > 0
+    # Every request the server saw was sent by the job: none were retried in the transport.
+    assert flaky_server.requests == job.stats.requests
+    assert job.stats.retries == flaky_server.rate_limited + flaky_server.errors
+    assert get_client_registry().stats()["pool"]["acquired"] == 0
+
+
+def test_resume_embeds_only_the_missing_batches(flaky_server, tmp_path):
+    texts = [f"chunk {i} on discharge planning" for i in range(200)]
+    path = str(tmp_path / "checkpoint.sqlite3")
+
+    def interrupt(stats: EmbeddingJobStats) -> None:
+        if stats.embedded >= len(texts) // 2:
+            raise _Interrupted()
+
+    checkpoint = EmbeddingCheckpoint(path, MODEL)
+    first = EmbeddingJob(RegistryEmbeddings(MODEL), batch_size=10, concurrency=4, checkpoint=checkpoint,
+                         progress=interrupt)
+    with pytest.raises(_Interrupted):
+        first.run(texts)
+    saved = set(t for t, v in zip(texts, checkpoint.get_many(texts)) if v is not None)
+    checkpoint.close()
+    assert len(texts) // 2 <= len(saved) < len(texts)
+
+    flaky_server.embedded.clear()
+    checkpoint = EmbeddingCheckpoint(path, MODEL)
+    second = EmbeddingJob(RegistryEmbeddings(MODEL), batch_size=10, concurrency=4, checkpoint=checkpoint)
+    try:
+        vectors = second.run(texts)
+    finally:
+        checkpoint.close()
+
+    assert vectors == EMBEDDER.embed_documents(texts)
+    assert second.stats.resumed == len(saved)
+    assert sorted(flaky_server.embedded) == sorted(set(texts) - saved)
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from rag.embeddings import get_cached_embeddings
+
+
+def test_cached_embeddings_share_one_cache_per_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = get_cached_embeddings("model-a", cache_path=path, backend="openai")
+    second = get_cached_embeddings("model-b", cache_path=path, backend="openai")
+    other = get_cached_embeddings("model-a", cache_path=str(tmp_path / "other.sqlite3"), backend="openai")
+
+    assert first.cache is second.cache
+    assert other.cache is not first.cache
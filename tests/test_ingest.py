@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import shutil
+import threading
+from pathlib import Path
+
+import pytest
+
+from rag.ann import IndexSpec
+from rag.config import DEFAULT_SHARD_SEARCH_WORKERS
+from rag.ingest import main
+from rag.local_embeddings import HashingNgramEmbeddings
+from rag.loaders import list_pdfs
+from rag.manifest import diff_corpus, load_manifest
+from rag.shards import build_sharded, get_shard_search_pool, load_sharded
+from rag.vectorstore import build_vectorstore, load_index, update_vectorstore
+
+RAW_DOCS = Path(__file__).resolve().parent.parent / "data" / "raw_docs"
+
+
+@pytest.fixture
+def pdf_dir(tmp_path):
+    """
+    The two smallest PDFs of the corpus.
+    """
+    pdfs = sorted(RAW_DOCS.glob("*.pdf"), key=lambda p: p.stat().st_size)[:2]
+    if len(pdfs) < 2:
+        pytest.skip("needs two PDFs in data/raw_docs")
+    folder = tmp_path / "pdfs"
+    folder.mkdir()
+    for pdf in pdfs:
+        shutil.copy(pdf, folder / pdf.name)
+    return folder
+
+
+@pytest.fixture
+def spare_pdf():
+    """
+    The third smallest PDF, not in `pdf_dir`.
+    """
+    pdfs = sorted(RAW_DOCS.glob("*.pdf"), key=lambda p: p.stat().st_size)
+    if len(pdfs) < 3:
+        pytest.skip("needs three PDFs in data/raw_docs")
+    return pdfs[2]
+
+
+def assert_consistent(vs, index_dir, names):
+    manifest = load_manifest(str(index_dir))
+    ids = [doc_id for entry in manifest["files"].values() for doc_id in entry["chunk_ids"]]
+    assert sorted(manifest["files"]) == sorted(names)
+    assert vs.index.ntotal == len(vs.index_to_docstore_id) == len(vs.docstore) == len(ids)
+    assert sorted(vs.index_to_docstore_id.values()) == sorted(ids)
+    assert {vs.docstore.search(doc_id).metadata["source"] for doc_id in ids} == set(names)
+
+
+def update(pdf_dir, index_dir, *extra):
+    main([
+        "--update", "--pdf-dir", str(pdf_dir), "--index-dir", str(index_dir),
+        "--embedding-backend", "hashing", "--workers", "1", *extra,
+    ])
+    return load_manifest(str(index_dir))["index"]["type"]
+
+
+def test_diff_corpus(pdf_dir, spare_pdf, tmp_path):
+    index_dir = tmp_path / "index"
+    build_vectorstore(
+        pdf_dir=str(pdf_dir), index_dir=str(index_dir), workers=1, embeddings=HashingNgramEmbeddings(),
+    )
+    kept, removed = sorted(p.name for p in pdf_dir.iterdir())
+    manifest = load_manifest(str(index_dir))
+    assert diff_corpus(manifest, list_pdfs(str(pdf_dir))).is_empty
+
+    (pdf_dir / removed).unlink()
+    shutil.copy(spare_pdf, pdf_dir / spare_pdf.name)
+    diff = diff_corpus(manifest, list_pdfs(str(pdf_dir)))
+    assert diff.added == [pdf_dir / spare_pdf.name]
+    assert (diff.changed, diff.removed, diff.unchanged) == ([], [removed], [kept])
+
+    shutil.copy(spare_pdf, pdf_dir / kept)
+    diff = diff_corpus(manifest, list_pdfs(str(pdf_dir)))
+    assert diff.changed == [pdf_dir / kept]
+
+
+def test_update_removes_and_adds_pdfs(pdf_dir, spare_pdf, tmp_path):
+    index_dir = tmp_path / "index"
+    embeddings = HashingNgramEmbeddings()
+    built = build_vectorstore(
+        pdf_dir=str(pdf_dir), index_dir=str(index_dir), workers=1, embeddings=embeddings,
+    )
+    kept, removed = sorted(p.name for p in pdf_dir.iterdir())
+    kept_ids = load_manifest(str(index_dir))["files"][kept]["chunk_ids"]
+    assert_consistent(built.vectorstore, index_dir, [kept, removed])
+
+    (pdf_dir / removed).unlink()
+    shutil.copy(spare_pdf, pdf_dir / spare_pdf.name)
+    result = update_vectorstore(
+        pdf_dir=str(pdf_dir), index_dir=str(index_dir), workers=1, embeddings=embeddings,
+    )
+
+    assert result.stats.files == 1
+    assert load_manifest(str(index_dir))["files"][kept]["chunk_ids"] == kept_ids
+    assert_consistent(result.vectorstore, index_dir, [kept, spare_pdf.name])
+    assert_consistent(load_index(str(index_dir), embeddings), index_dir, [kept, spare_pdf.name])
+
+
+def test_update_with_new_chunking_rebuilds(pdf_dir, tmp_path):
+    index_dir = tmp_path / "index"
+    embeddings = HashingNgramEmbeddings()
+    build_vectorstore(
+        pdf_dir=str(pdf_dir), index_dir=str(index_dir), workers=1, embeddings=embeddings,
+    )
+    before = load_manifest(str(index_dir))
+
+    result = update_vectorstore(
+        pdf_dir=str(pdf_dir), index_dir=str(index_dir), workers=1, embeddings=embeddings,
+        chunk_size=before["chunk_size"] // 2,
+    )
+
+    after = load_manifest(str(index_dir))
+    assert result.stats.files == 2
+    assert after["chunk_size"] == before["chunk_size"] // 2
+    assert sum(len(e["chunk_ids"]) for e in after["files"].values()) > sum(
+        len(e["chunk_ids"]) for e in before["files"].values()
+    )
+    assert_consistent(result.vectorstore, index_dir, list(before["files"]))
+
+
+def test_update_keeps_the_saved_index_type(pdf_dir, tmp_path):
+    index_dir = tmp_path / "index"
+    build_vectorstore(
+        pdf_dir=str(pdf_dir), index_dir=str(index_dir), workers=1,
+        embeddings=HashingNgramEmbeddings(), index_spec=IndexSpec(type="hnsw"),
+    )
+
+    assert update(pdf_dir, index_dir) == "hnsw"
+    (pdf_dir / sorted(p.name for p in pdf_dir.iterdir())[0]).unlink()
+    assert update(pdf_dir, index_dir) == "hnsw"
+    assert update(pdf_dir, index_dir, "--index-type", "flat") == "flat"
+
+
+def test_update_keeps_the_saved_index_type_of_shards(pdf_dir, tmp_path):
+    index_dir = tmp_path / "index"
+    build_sharded(
+        pdf_dir=str(pdf_dir), index_dir=str(index_dir), shards=2, shard_by="source", workers=1,
+        embeddings=HashingNgramEmbeddings(), index_spec=IndexSpec(type="hnsw"),
+    )
+
+    assert update(pdf_dir, index_dir) == "hnsw"
+
+
+def test_sharded_indexes_share_one_search_pool(pdf_dir, tmp_path):
+    index_dir = tmp_path / "index"
+    embeddings = HashingNgramEmbeddings()
+    build_sharded(
+        pdf_dir=str(pdf_dir), index_dir=str(index_dir), shards=2, shard_by="source", workers=1,
+        embeddings=embeddings,
+    )
+    query = embeddings.embed_query("clinical decision support")
+
+    for _ in range(5):
+        vs = load_sharded(str(index_dir), embeddings)
+        assert len(vs.similarity_search_by_vector(query, k=3)) == 3
+        assert vs.index._pool is None
+    shard_threads = [t for t in threading.enumerate() if t.name.startswith("rag-shard")]
+    assert 0 < len(shard_threads) <= DEFAULT_SHARD_SEARCH_WORKERS
+    assert get_shard_search_pool() is get_shard_search_pool()
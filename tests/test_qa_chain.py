@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from rag.answer_cache import get_answer_cache
+from rag.clients import configure_clients
+from rag.config import NO_ANSWER
+from rag.qa_chain import RAGResult, answer_question, answer_question_async, answer_question_stream
+from rag.stubs import StubOpenAIServer, default_reply
+
+QUESTION = "How does discharge planning affect readmission risk?"
+
+
+@pytest.fixture(autouse=True)
+def fast_path_on(monkeypatch):
+    monkeypatch.setattr("rag.retriever.DEFAULT_RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr("rag.retriever.DEFAULT_LEXICAL_FAST_PATH", True)
+    get_answer_cache().clear()
+    yield
+    get_answer_cache().clear()
+
+
+def test_fast_path_answer_makes_no_embedding_call_with_the_cache(stub_server, counting_store):
+    vs, embeddings = counting_store
+
+    # A regular question first, so the cache scope has entries to near-duplicate match against.
+    answer_question("How does discharge planning affect readmission risk?", vs)
+    before = embeddings.calls
+
+    first = answer_question("onasemnogene", vs)
+    assert first.timings.lexical_fast_path
+    assert first.answer != NO_ANSWER
+    assert embeddings.calls == before
+
+    again = answer_question("Onasemnogene", vs)
+    assert again.timings.cache_hit
+    assert again.answer == first.answer
+    assert embeddings.calls == before
+
+
+def test_fast_path_answer_makes_no_embedding_call_streaming_and_async(stub_server, counting_store):
+    vs, embeddings = counting_store
+    answer_question("How does discharge planning affect readmission risk?", vs)
+    before = embeddings.calls
+
+    *_, streamed = answer_question_stream("onasemnogene", vs)
+    assert streamed.timings.lexical_fast_path
+    assert embeddings.calls == before
+
+    get_answer_cache().clear()
+    answer_question("How does discharge planning affect readmission risk?", vs)
+    before = embeddings.calls
+    result = asyncio.run(answer_question_async("onasemnogene", vs))
+    assert result.timings.lexical_fast_path
+    assert embeddings.calls == before
+
+
+def test_embedded_questions_still_match_near_duplicates(stub_server, counting_store):
+    vs, _ = counting_store
+    first = answer_question("How does discharge planning affect readmission risk?", vs)
+    again = answer_question("How does discharge planning affect the readmission risk?", vs)
+    assert again.timings.cache_hit
+    assert again.answer == first.answer
+
+
+def test_async_reuses_the_speculative_search_for_padded_questions(stub_server, counting_store):
+    vs, embeddings = counting_store
+    memory = "User: What is discharge planning?\nAssistant: Planning a patient's move out of hospital."
+
+    # The stub echoes the question as the rewrite, so the speculative raw search is the search.
+    result = asyncio.run(answer_question_async(
+        "  what about its readmission risk?  ", vs, memory_text=memory, use_cache=False,
+    ))
+    assert not result.timings.rewrite_skipped
+    assert embeddings.calls == 1
+
+
+@pytest.fixture
+def answer_reply():
+    """
+    Stub server whose answer LLM replies with the text set in the returned dict.
+    """
+    reply = {"text": ""}
+
+    def respond(messages):
+        if "CONTEXT:" in str(messages[-1].get("content", "")):
+            return reply["text"]
+        return default_reply(messages)
+
+    with StubOpenAIServer(reply=respond) as server:
+        configure_clients(base_url=server.base_url, api_key="stub", tokenize_embeddings=False)
+        try:
+            yield reply
+        finally:
+            configure_clients()
+
+
+def stream(question, vs):
+    *deltas, final = answer_question_stream(question, vs, use_cache=False)
+    assert isinstance(final, RAGResult)
+    return deltas, final
+
+
+def test_stream_never_yields_a_no_answer_reply(answer_reply, counting_store):
+    vs, _ = counting_store
+    answer_reply["text"] = NO_ANSWER
+
+    deltas, final = stream(QUESTION, vs)
+    assert deltas == []
+    assert final.answer == NO_ANSWER
+
+
+@pytest.mark.parametrize("text", [
+    "Discharge planning lowers readmission risk for elderly patients after surgery.",
+    # Shares its first words with NO_ANSWER, so it is held back until it diverges.
+    "It is reported that discharge planning lowers readmission risk.",
+])
+def test_stream_yields_the_deltas_of_a_normal_reply(answer_reply, counting_store, text):
+    vs, _ = counting_store
+    answer_reply["text"] = text
+
+    deltas, final = stream(QUESTION, vs)
+    assert len(deltas) > 1
+    assert "".join(deltas) == text
+    assert final.answer == text
+    assert final.citations
+
+
+def test_stream_of_a_reply_starting_with_no_answer_ends_as_no_answer(answer_reply, counting_store):
+    vs, _ = counting_store
+    answer_reply["text"] = NO_ANSWER + " However, section 3 discusses discharge planning in detail."
+
+    deltas, final = stream(QUESTION, vs)
+    assert deltas == []
+    assert final.answer == NO_ANSWER
+    assert final.citations == []
+
+
+class FailingChat:
+    def invoke(self, messages):
+        raise ConnectionError("chat model down")
+
+
+def test_failed_llm_calls_are_counted(stub_server, counting_store, monkeypatch):
+    vs, _ = counting_store
+    monkeypatch.setattr("rag.qa_chain.get_chat_model", lambda *args, **kwargs: FailingChat())
+    memory = "User: What is discharge planning?\nAssistant: Planning a patient's move out of hospital."
+
+    result = answer_question("And what about its readmission risk?", vs, memory_text=memory, use_cache=False)
+
+    assert result.answer == NO_ANSWER
+    # The rewrite falls back to the question; the answer call fails as well.
+    assert result.timings.llm_calls == 2
+    assert result.timings.llm_errors == 2
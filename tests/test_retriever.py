@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from rag.local_embeddings import HashingNgramEmbeddings
+from rag.retriever import lexical_fast_path, retrieve_with_scores
+
+
+def test_fast_path_is_off_by_default(counting_store):
+    vs, embeddings = counting_store
+    assert lexical_fast_path("onasemnogene", vs) is None
+
+    hits = retrieve_with_scores("onasemnogene", vs, k=3)
+    assert embeddings.calls == 1
+    assert "Onasemnogene" in hits[0][0].page_content
+
+
+def test_hybrid_hits_carry_real_vector_distances(counting_store):
+    vs, embeddings = counting_store
+    query = np.asarray(embeddings.embed_query("onasemnogene"), dtype=np.float32)
+
+    hits = retrieve_with_scores("onasemnogene", vs, k=3, mode="hybrid")
+    doc, distance = hits[0]
+    vector = np.asarray(embeddings.embed_query(doc.page_content), dtype=np.float32)
+    assert distance > 0.0
+    assert abs(distance - float(np.sum((query - vector) ** 2))) < 1e-4
+
+
+def test_stub_server_embeddings_retrieve_by_topic(stub_store):
+    max_distance = HashingNgramEmbeddings().max_distance
+
+    hits = retrieve_with_scores("gene therapy onasemnogene", stub_store, k=1, mode="vector")
+    assert "Onasemnogene" in hits[0][0].page_content
+    assert hits[0][1] <= max_distance
+    hits = retrieve_with_scores("how is operating room block time scheduled", stub_store, k=4, mode="vector")
+    assert all(doc.page_content.startswith("Operating room scheduling") for doc, _ in hits)
+
+
+def test_default_mode_is_vector_only(counting_store):
+    vs, embeddings = counting_store
+    query = embeddings.embed_query("readmission after surgery")
+    expected = vs.similarity_search_with_score_by_vector(query, k=5)
+
+    hits = retrieve_with_scores("readmission after surgery", vs, k=5)
+    assert [d.page_content for d, _ in hits] == [d.page_content for d, _ in expected]
+    assert hits[0][1] == pytest.approx(expected[0][1], abs=1e-5)
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from rag.qa_chain import RAGResult
+from rag.server import RAGServer
+from rag.warmup import LOADING, READY, WarmupStatus
+
+
+class FakeWarmup:
+    """
+    IndexWarmup stand-in: a fixed state and vectorstore, nothing loaded.
+    """
+
+    def __init__(self, vectorstore: Any = None, state: str = READY):
+        self._vectorstore = vectorstore
+        self._state = state
+
+    def start(self) -> None:
+        pass
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        return self._vectorstore
+
+    def status(self) -> WarmupStatus:
+        return WarmupStatus(state=self._state, message=self._state)
+
+    @property
+    def vectorstore(self) -> Any:
+        return self._vectorstore if self._state == READY else None
+
+    def corpus(self) -> Dict[str, Any]:
+        return {"documents": [], "pages": 0, "chunks": 0}
+
+
+async def request(
+    app: RAGServer, method: str, path: str, body: Any = None, chunks: Optional[List[bytes]] = None,
+) -> Tuple[int, Dict[str, str], Any]:
+    """
+    Drives one HTTP request through the ASGI app; returns (status, headers, decoded body).
+    """
+    if chunks is None:
+        chunks = [json.dumps(body).encode("utf-8") if body is not None else b""]
+    messages = [
+        {"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)
+    ]
+    sent: List[Dict[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        sent.append(message)
+
+    await app({"type": "http", "method": method, "path": path}, receive, send)
+    start, payload = sent[0], sent[1]["body"]
+    headers = {k.decode(): v.decode() for k, v in start["headers"]}
+    if headers["content-type"].startswith("application/json"):
+        return start["status"], headers, json.loads(payload)
+    return start["status"], headers, payload.decode("utf-8")
+
+
+def run(coro: Any) -> Any:
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def blocking_answer(monkeypatch):
+    """
+    Replaces the pipeline with one that waits until the test releases it.
+    """
+    gate: Dict[str, asyncio.Event] = {}
+
+    async def answer(question: str, vectorstore: Any, **kwargs: Any) -> RAGResult:
+        await gate["release"].wait()
+        return RAGResult(answer=f"answer to {question}", citations=["a.pdf p.1"])
+
+    monkeypatch.setattr("rag.server.answer_question_async", answer)
+    return gate
+
+
+def test_health_reports_readiness():
+    status, _, body = run(request(RAGServer(FakeWarmup(state=LOADING)), "GET", "/health"))
+    assert status == 503
+    assert body["status"] == LOADING
+
+    status, _, body = run(request(RAGServer(FakeWarmup(object())), "GET", "/health"))
+    assert status == 200
+    assert body["status"] == READY
+
+
+def test_ask_before_the_index_is_ready_asks_to_retry():
+    status, headers, body = run(request(RAGServer(FakeWarmup(state=LOADING)), "POST", "/ask", {"question": "q"}))
+    assert status == 503
+    assert headers["retry-after"] == "1"
+    assert "not ready" in body["error"]
+
+
+@pytest.mark.parametrize("payload, message", [
+    ({"question": ""}, "'question'"),
+    ({"question": 42}, "'question'"),
+    ({"question": "q", "k": "5"}, "'k'"),
+    ({"question": "q", "k": True}, "'k'"),
+    ({"question": "q", "k": 0}, "between 1 and 100"),
+    ({"question": "q", "max_distance": "far"}, "'max_distance'"),
+    ({"question": "q", "source_filter": ["a.pdf", 3]}, "'source_filter'"),
+    ({"question": "q", "memory": ["Q: a"]}, "'memory'"),
+    ({"question": "q", "use_cache": "yes"}, "'use_cache'"),
+    (["q"], "JSON object"),
+])
+def test_ask_validates_field_types(payload, message):
+    status, _, body = run(request(RAGServer(FakeWarmup(object())), "POST", "/ask", payload))
+    assert status == 400
+    assert message in body["error"]
+
+
+def test_invalid_json_and_batch_validation():
+    app = RAGServer(FakeWarmup(object()), max_batch=2)
+    status, _, body = run(request(app, "POST", "/ask", chunks=[b"{not json"]))
+    assert status == 400 and "not valid JSON" in body["error"]
+
+    status, _, _ = run(request(app, "POST", "/batch", {"questions": []}))
+    assert status == 400
+    status, _, _ = run(request(app, "POST", "/batch", {"questions": ["a", "b", "c"]}))
+    assert status == 413
+    status, _, body = run(request(app, "POST", "/batch", {"questions": [{"id": 1}]}))
+    assert status == 400 and body["error"].startswith("questions:")
+
+
+def test_body_size_limit_applies_across_chunks():
+    app = RAGServer(FakeWarmup(object()), max_body_bytes=64)
+    status, _, body = run(request(app, "POST", "/ask", chunks=[b'{"question": "', b"x" * 40, b"x" * 40, b'"}']))
+    assert status == 413
+    assert "64 bytes" in body["error"]
+
+
+def test_routing_errors():
+    app = RAGServer(FakeWarmup(object()))
+    assert run(request(app, "GET", "/nope"))[0] == 404
+    assert run(request(app, "GET", "/ask"))[0] == 405
+
+
+def test_full_queue_is_rejected_with_retry_after(blocking_answer):
+    app = RAGServer(FakeWarmup(object()), concurrency=1, max_queue=1, timeout=5)
+
+    async def main():
+        blocking_answer["release"] = asyncio.Event()
+        first = asyncio.ensure_future(request(app, "POST", "/ask", {"question": "one"}))
+        second = asyncio.ensure_future(request(app, "POST", "/ask", {"question": "two"}))
+        await asyncio.sleep(0.05)
+        assert (app.in_flight, app.queued) == (1, 1)
+
+        rejected = await request(app, "POST", "/ask", {"question": "three"})
+        blocking_answer["release"].set()
+        return rejected, await first, await second
+
+    rejected, first, second = run(main())
+    status, headers, body = rejected
+    assert status == 503
+    assert headers["retry-after"] == "1"
+    assert body["error"] == "server busy"
+    assert first[0] == second[0] == 200
+    assert second[2]["answer"] == "answer to two"
+    assert app.counters["rejected"] == 1
+    assert (app.in_flight, app.queued) == (0, 0)
+
+
+def test_slow_answer_times_out_and_frees_its_slot(blocking_answer):
+    app = RAGServer(FakeWarmup(object()), concurrency=1, max_queue=0, timeout=0.05)
+
+    async def main():
+        blocking_answer["release"] = asyncio.Event()
+        return await request(app, "POST", "/ask", {"question": "slow"})
+
+    status, _, body = run(main())
+    assert status == 504
+    assert "0.05s" in body["error"]
+    assert app.counters["timeouts"] == 1
+    assert app.in_flight == 0
+
+
+def test_ask_end_to_end_against_the_stub(stub_server, counting_store):
+    vs, _ = counting_store
+    app = RAGServer(FakeWarmup(vs))
+    status, _, body = run(request(app, "POST", "/ask", {
+        "question": "How does discharge planning affect readmission risk?",
+        "source_filter": "review_0.pdf",
+        "use_cache": False,
+    }))
+    assert status == 200
+    assert body["citations"]
+    assert all(c.startswith("review_0.pdf") for c in body["citations"])
+
+    status, _, text = run(request(app, "GET", "/metrics"))
+    assert status == 200
+    assert "rag_server_requests_total 1" in text